@@ -423,6 +423,41 @@ def get_persons_from_recids(recids, return_alt_names=False,
     return (rec_2_pid, pid_2_data)
 
 
+def get_canonical_names_by_recid_range(recid1, recid2):
+    '''
+    Returns the canonical names of the persons associated to the
+    records from recid1 to recid2, looked up for the whole range at
+    once.  As in get_persons_from_recids, persons that do not have a
+    canonical name yet get one first.
+    @param recid1: first record of the range
+    @type recid1: int
+    @param recid2: last record of the range
+    @type recid2: int
+    @return: {recid: [canonical names]}
+    @rtype: dict
+    '''
+    query = ("SELECT DISTINCT p.bibrec, p.personid, d.data "
+             "FROM aidPERSONIDPAPERS AS p LEFT JOIN aidPERSONIDDATA AS d "
+             "ON d.personid = p.personid AND d.tag = 'canonical_name' "
+             "WHERE p.bibrec BETWEEN %s AND %s "
+             "and p.flag > -2")
+    res = run_sql(query, (recid1, recid2))
+
+    pids_without_canonical_name = set(row[1] for row in res if row[2] is None)
+    if pids_without_canonical_name:
+        update_personID_canonical_names(list(pids_without_canonical_name))
+        res = run_sql(query, (recid1, recid2))
+
+    rec_2_names = dict()
+    for rec, _pid, canonical_name in res:
+        if canonical_name:
+            names = rec_2_names.setdefault(rec, [])
+            if canonical_name not in names:
+                names.append(canonical_name)
+
+    return rec_2_names
+
+
 def get_person_db_names_count(pid, sort_by_count=True):
     '''
     Returns the set of name strings and count associated to a person id.
@@ -61,14 +61,16 @@ def bibclassify_daemon():
         help_specific_usage="  -i, --recid\t\tkeywords are extracted from "
         "this record\n"
         "  -c, --collection\t\tkeywords are extracted from this collection\n"
-        "  -k, --taxonomy\t\tkeywords are based on that reference",
+        "  -k, --taxonomy\t\tkeywords are based on that reference\n"
+        "      --parallel=N\t\tanalyze the records in N processes (1)",
         version="Invenio BibClassify v%s" % bconfig.VERSION,
         specific_params=("i:c:k:f",
             [
              "recid=",
              "collection=",
              "taxonomy=",
-             "force"
+             "force",
+             "parallel="
             ]),
         task_submit_elaborate_specific_parameter_fnc=
             _task_submit_elaborate_specific_parameter,
@@ -219,6 +221,16 @@ def _task_submit_elaborate_specific_parameter(key, value, opts, args):
         bibtask.task_set_option("taxonomy", value)
     elif key in ("-f", "--force"):
         bibtask.task_set_option("force", True)
+    elif key in ("--parallel",):
+        try:
+            value = int(value)
+        except ValueError:
+            value = 0
+        if value < 1:
+            bibtask.write_message("ERROR: The value specified for --parallel "
+                "must be a positive integer.", stream=sys.stderr, verbose=0)
+            return False
+        bibtask.task_set_option("parallel", value)
     else:
         return False
 
@@ -315,6 +327,10 @@ def _analyze_documents(records, taxonomy_name, collection,
                        output_limit=bconfig.CFG_BIBCLASSIFY_DEFAULT_OUTPUT_NUMBER):
     """For each collection, parse the documents attached to the records
     in collection with the corresponding taxonomy_name.
+    When the 'parallel' task option asks for more than one process, the
+    records are analyzed by a pool of worker processes forked after the
+    taxonomy has been loaded, so that they share it; this process
+    gathers their MARCXML output and updates the progress.
     @var records: list of recids to process
     @var taxonomy_name: str, name of the taxonomy, e.g. HEP
     @var collection: str, collection name
@@ -329,58 +345,109 @@ def _analyze_documents(records, taxonomy_name, collection,
             collection, stream=sys.stderr, verbose=2)
         return False
 
+    records = list(records)
+    nb_processes = bibtask.task_get_option('parallel') or 1
+    pool = None
+    if nb_processes > 1 and len(records) > 1:
+        import multiprocessing
+        bibclassify_engine.load_taxonomy(taxonomy_name)
+        pool = multiprocessing.Pool(nb_processes)
+        bibtask.write_message('INFO: Analyzing %d records in %d processes.' %
+            (len(records), nb_processes), stream=sys.stderr, verbose=3)
+
     # Process records:
     output = []
-    for record in records:
-        bibdocfiles = BibRecDocs(record).list_latest_files() # TODO: why this doesn't call list_all_files() ?
-        keywords = {}
-        akws = {}
-        acro = {}
-        single_keywords = composite_keywords = author_keywords = acronyms = None
-
-
-        for doc in bibdocfiles:
-            # Get the keywords for all PDF documents contained in the record.
-            if bibclassify_text_extractor.is_pdf(doc.get_full_path()):
-                bibtask.write_message('INFO: Generating keywords for record %d.' %
-                    record, stream=sys.stderr, verbose=3)
-                fulltext = doc.get_path()
-
-                single_keywords, composite_keywords, author_keywords, acronyms = \
-                    bibclassify_engine.get_keywords_from_local_file(fulltext,
-                    taxonomy_name, with_author_keywords=True, output_mode="raw",
-                    output_limit=output_limit, match_mode='partial')
+    try:
+        # treat records in batches, so that only the output of a bounded
+        # number of records is computed ahead of the progress:
+        batch_size = max(2 * nb_processes, 1)
+        for batch_start in range(0, len(records), batch_size):
+            batch = records[batch_start:batch_start + batch_size]
+            if pool is not None:
+                batch_output = pool.map_async(_analyze_record_in_worker,
+                    [(record, taxonomy_name, output_limit)
+                     for record in batch]).get()
             else:
-                bibtask.write_message('WARNING: BibClassify does not know how to process \
-                    doc: %s (type: %s) -- ignoring it.' %
-                    (doc.fullpath, doc.doctype), stream=sys.stderr, verbose=3)
-
-            if single_keywords or composite_keywords:
-                cleaned_single = bibclassify_engine.clean_before_output(single_keywords)
-                cleaned_composite = bibclassify_engine.clean_before_output(composite_keywords)
-                # merge the groups into one
-                keywords.update(cleaned_single)
-                keywords.update(cleaned_composite)
-            acro.update(acronyms)
-            akws.update(author_keywords)
-
-        if len(keywords):
-            output.append('<record>')
-            output.append('<controlfield tag="001">%s</controlfield>' % record)
-            output.append(bibclassify_engine._output_marc(keywords.items(), (), akws, acro,
-                                                      spires=bconfig.CFG_SPIRES_FORMAT))
-            output.append('</record>')
-        else:
-            bibtask.write_message('WARNING: No keywords found for record %d.' %
-                    record, stream=sys.stderr, verbose=0)
+                batch_output = [None] * len(batch)
+            for record, record_output in zip(batch, batch_output):
+                if pool is None:
+                    record_output = _analyze_record(record, taxonomy_name,
+                                                    output_limit)
+                if record_output:
+                    output.append(record_output)
+
+                _INDEX += 1
+
+                bibtask.task_update_progress('Done %d out of %d.' % (_INDEX, _RECIDS_NUMBER))
+                bibtask.task_sleep_now_if_required(can_stop_too=False)
+    except:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+        raise
+    if pool is not None:
+        pool.close()
+        pool.join()
 
-        _INDEX += 1
+    return '\n'.join(output)
 
-        bibtask.task_update_progress('Done %d out of %d.' % (_INDEX, _RECIDS_NUMBER))
-        bibtask.task_sleep_now_if_required(can_stop_too=False)
+def _analyze_record(record, taxonomy_name, output_limit):
+    """Extracts the keywords of the PDF documents of a record.
+    @var record: int, recid
+    @var taxonomy_name: str, name of the taxonomy, e.g. HEP
+    @var output_limit: int, max number of keywords to extract
+    @return: str, marcxml record of the keywords, or '' if none was found
+    """
+    bibdocfiles = BibRecDocs(record).list_latest_files() # TODO: why this doesn't call list_all_files() ?
+    keywords = {}
+    akws = {}
+    acro = {}
+    single_keywords = composite_keywords = author_keywords = acronyms = None
+
+
+    for doc in bibdocfiles:
+        # Get the keywords for all PDF documents contained in the record.
+        if bibclassify_text_extractor.is_pdf(doc.get_full_path()):
+            bibtask.write_message('INFO: Generating keywords for record %d.' %
+                record, stream=sys.stderr, verbose=3)
+            fulltext = doc.get_path()
+
+            single_keywords, composite_keywords, author_keywords, acronyms = \
+                bibclassify_engine.get_keywords_from_local_file(fulltext,
+                taxonomy_name, with_author_keywords=True, output_mode="raw",
+                output_limit=output_limit, match_mode='partial')
+        else:
+            bibtask.write_message('WARNING: BibClassify does not know how to process \
+                doc: %s (type: %s) -- ignoring it.' %
+                (doc.fullpath, doc.doctype), stream=sys.stderr, verbose=3)
+
+        if single_keywords or composite_keywords:
+            cleaned_single = bibclassify_engine.clean_before_output(single_keywords)
+            cleaned_composite = bibclassify_engine.clean_before_output(composite_keywords)
+            # merge the groups into one
+            keywords.update(cleaned_single)
+            keywords.update(cleaned_composite)
+        acro.update(acronyms)
+        akws.update(author_keywords)
+
+    if not len(keywords):
+        bibtask.write_message('WARNING: No keywords found for record %d.' %
+                record, stream=sys.stderr, verbose=0)
+        return ''
 
+    output = []
+    output.append('<record>')
+    output.append('<controlfield tag="001">%s</controlfield>' % record)
+    output.append(bibclassify_engine._output_marc(keywords.items(), (), akws, acro,
+                                              spires=bconfig.CFG_SPIRES_FORMAT))
+    output.append('</record>')
     return '\n'.join(output)
 
+def _analyze_record_in_worker(args):
+    """Runs _analyze_record on the tuple of its arguments ARGS. Run by
+    the worker processes of _analyze_documents()."""
+    return _analyze_record(*args)
+
 def _task_submit_check_options():
     """Required by bibtask. Checks the options."""
     recids = bibtask.task_get_option('recids')
@@ -169,15 +169,8 @@ def get_keywords_from_text(text_lines, taxonomy_name, output_mode="text",
     """
 
     start_time = time.time()
-    cache = reader.get_cache(taxonomy_name)
-    if not cache:
-        reader.set_cache(taxonomy_name, reader.get_regular_expressions(taxonomy_name,
-                rebuild=rebuild_cache, no_cache=no_cache))
-        cache = reader.get_cache(taxonomy_name)
-
-
-    _skw = cache[0]
-    _ckw = cache[1]
+    _skw, _ckw = load_taxonomy(taxonomy_name, rebuild_cache=rebuild_cache,
+                               no_cache=no_cache)
 
     text_lines = normalizer.cut_references(text_lines)
     fulltext = normalizer.normalize_fulltext("\n".join(text_lines))
@@ -222,6 +215,23 @@ def get_keywords_from_text(text_lines, taxonomy_name, output_mode="text",
 
 
 
+def load_taxonomy(taxonomy_name, rebuild_cache=False, no_cache=False):
+    """Loads the compiled taxonomy in the memory of the process, if it is
+    not there yet, together with the matcher of its single keywords.
+    Processes forked afterwards (e.g. by the daemon) share them.
+    @var taxonomy_name: string, name of the taxonomy
+    @keyword rebuild_cache: boolean
+    @keyword no_cache: boolean, means loaded definitions will not be saved
+    @return: (single keywords, composite keywords)
+    """
+    cache = reader.get_cache(taxonomy_name)
+    if not cache:
+        reader.set_cache(taxonomy_name, reader.get_regular_expressions(taxonomy_name,
+                rebuild=rebuild_cache, no_cache=no_cache))
+        cache = reader.get_cache(taxonomy_name)
+    keyworder.get_single_keywords_matcher(cache[0])
+    return cache[0], cache[1]
+
 def extract_single_keywords(skw_db, fulltext):
     """Find single keywords in the fulltext
     @var skw_db: list of KeywordToken objects
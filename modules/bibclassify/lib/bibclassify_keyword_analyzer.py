@@ -40,11 +40,28 @@ import time
 import bibclassify_config as bconfig
 log = bconfig.get_logger("bibclassify.keyword_analyzer")
 
+# Find the literal parts of the single keywords with the string matcher
+# shared with the other Invenio tools; standalone, simply search for
+# them one by one.
+try:
+    from stringmatcher import build_string_matcher, find_strings
+except ImportError:
+    def build_string_matcher(strings):
+        """Returns the strings to search for, without automaton."""
+        return list(strings)
+
+    def find_strings(text, matcher):
+        """Returns the positions of the strings present in the text."""
+        return [position for position, string in enumerate(matcher)
+                if string and string in text]
+
 _MAXIMUM_SEPARATOR_LENGTH = max([len(_separator)
     for _separator in bconfig.CFG_BIBCLASSIFY_VALID_SEPARATORS])
 
+# Inline flags of a regex pattern, e.g. (?i)
+_inline_flags = re.compile(r"\(\?[iLmsux]")
+
 
-# XXX - rebuild this whole thing
 def get_single_keywords(skw_db, fulltext):
     """Find single keywords in the fulltext
     @var skw_db: list of KeywordToken objects
@@ -56,37 +73,29 @@ def get_single_keywords(skw_db, fulltext):
     """
     timer_start = time.clock()
 
-    # single keyword -> [spans]
+    # (span, single keyword) of every match, in the order of the
+    # keywords and of their regular expressions. Only the regular
+    # expressions whose literal part is present in the text are run.
     records = []
+    for single_keyword, regex in _get_skw_candidates(skw_db, fulltext):
+        for match in regex.finditer(fulltext):
+            # Modify the right index to put it on the last letter
+            # of the word.
+            span = (match.span()[0], match.span()[1] - 1)
+            records.append((span, single_keyword))
 
-    for single_keyword in skw_db.values():
-        for regex in single_keyword.regex:
-            for match in regex.finditer(fulltext):
-                # Modify the right index to put it on the last letter
-                # of the word.
-                span = (match.span()[0], match.span()[1] - 1)
-
-                # FIXME: expensive!!!
-                # Remove the previous records contained by this span
-                records = [record for record in records
-                                  if not _contains_span(span, record[0])]
-
-                add = True
-                for previous_record in records:
-                    if ((span, single_keyword) == previous_record or
-                        _contains_span(previous_record[0], span)):
-                        # Match is contained by a previous match.
-                        add = False
-                        break
-
-                if add:
-                    records.append((span, single_keyword))
-
-    # TODO - change to the requested format (I will return to it later)
+    # A match is dropped when it is contained by the span of another
+    # match (of any keyword).
+    contained_spans = _get_contained_spans([record[0] for record in records])
 
     # List of single_keywords: {spans: single keyword}
     single_keywords = {}
-    for span, single_keyword in records:
+    added_records = {}
+    for record in records:
+        if record[0] in contained_spans or record in added_records:
+            continue
+        added_records[record] = None
+        span, single_keyword = record
         single_keywords.setdefault(single_keyword, [[]])
         single_keywords[single_keyword][0].append(span)
 
@@ -339,3 +348,147 @@ def _span_overlapping(aspan, bspan):
             return
     return (min(aspan[0], bspan[0]), max(aspan[1], bspan[1]))
 
+
+def _get_contained_spans(spans):
+    """Returns the dictionary of the spans that are contained by another
+    of the spans (see _contains_span)."""
+    # Sorted by start, and by decreasing end for a same start, a span is
+    # contained by another one iff one of the spans before it ends at or
+    # after its end.
+    sorted_spans = dict.fromkeys(spans).keys()
+    sorted_spans.sort(key=lambda span: (span[0], -span[1]))
+    contained_spans = {}
+    max_end = -1
+    for span in sorted_spans:
+        if span[1] <= max_end:
+            contained_spans[span] = None
+        else:
+            max_end = span[1]
+    return contained_spans
+
+# Matcher of the single keywords of the last ontology used, as
+# (skw_db, matcher)
+_skw_matcher = (None, None)
+
+def _get_skw_candidates(skw_db, fulltext):
+    """Returns the list of (single keyword, regex) of skw_db, in order,
+    whose regex may match the fulltext: the regexes whose literal part
+    is found in the text by one pass of the matcher of the single
+    keywords, and the regexes without literal part."""
+    regexes, string_matcher, always_searched = \
+        get_single_keywords_matcher(skw_db)
+
+    indexes = find_strings(fulltext, string_matcher) + always_searched
+    indexes.sort()
+    return [regexes[index] for index in indexes]
+
+def get_single_keywords_matcher(skw_db):
+    """Returns the matcher of the single keywords of skw_db, built only
+    when the single keywords change. Processes forked after this call
+    share it."""
+    global _skw_matcher
+    if _skw_matcher[0] is not skw_db:
+        _skw_matcher = (skw_db, _build_skw_matcher(skw_db))
+    return _skw_matcher[1]
+
+def _build_skw_matcher(skw_db):
+    """Returns the matcher of the literal parts of the regexes of the
+    single keywords, as a tuple (list of the (single keyword, regex),
+    Aho-Corasick automaton of the literal parts, indexes of the regexes
+    that are always run)."""
+    regexes = []
+    literals = []
+    always_searched = []
+    for single_keyword in skw_db.values():
+        for regex in single_keyword.regex:
+            index = len(regexes)
+            regexes.append((single_keyword, regex))
+            literal = _get_regex_literal(regex)
+            if not literal:
+                always_searched.append(index)
+            literals.append(literal)
+
+    log.debug("Single keywords matcher: %d regexes, %d always run." %
+              (len(regexes), len(always_searched)))
+    return (regexes, build_string_matcher(literals), always_searched)
+
+def _get_regex_literal(regex):
+    """Returns the longest string that every match of the compiled regex
+    contains, as found in the top level of its pattern, or '' if there
+    is none."""
+    pattern = regex.pattern
+    if regex.flags & (re.IGNORECASE | re.VERBOSE) or \
+       _inline_flags.search(pattern):
+        return ''
+
+    literals = ['']
+    index = 0
+    while index < len(pattern):
+        char = pattern[index]
+        literal_char = None
+        if char == '\\':
+            if pattern[index + 1:index + 2].isalnum():
+                # Character class, anchor or backreference.
+                index += 2
+            else:
+                literal_char = pattern[index + 1:index + 2]
+                index += 2
+        elif char == '[':
+            index = _skip_class(pattern, index)
+        elif char == '(':
+            depth = 0
+            while index < len(pattern):
+                if pattern[index] == '\\':
+                    index += 1
+                elif pattern[index] == '[':
+                    index = _skip_class(pattern, index) - 1
+                elif pattern[index] == '(':
+                    depth += 1
+                elif pattern[index] == ')':
+                    depth -= 1
+                    if not depth:
+                        break
+                index += 1
+            index += 1
+        elif char == '|':
+            return ''
+        elif char in '.^$':
+            index += 1
+        else:
+            literal_char = char
+            index += 1
+
+        quantifier = pattern[index:index + 1]
+        if quantifier and quantifier in '?*+{':
+            if quantifier == '{':
+                index = pattern.find('}', index) + 1 or len(pattern)
+            else:
+                index += 1
+            if pattern[index:index + 1] == '?':
+                index += 1
+            if quantifier != '+':
+                # The atom is optional.
+                literal_char = None
+
+        if literal_char and ord(literal_char) < 128:
+            literals[-1] += literal_char
+            if quantifier and quantifier in '?*+{':
+                literals.append('')
+        elif literals[-1]:
+            literals.append('')
+
+    literals.sort(key=len)
+    return literals[-1]
+
+def _skip_class(pattern, index):
+    """Returns the index after the character class starting at index."""
+    index += 1
+    if pattern[index:index + 1] == '^':
+        index += 1
+    if pattern[index:index + 1] == ']':
+        index += 1
+    while index < len(pattern) and pattern[index] != ']':
+        if pattern[index] == '\\':
+            index += 1
+        index += 1
+    return index + 1
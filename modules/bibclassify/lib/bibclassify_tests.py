@@ -26,6 +26,7 @@ seconds) to run: they download files, process fulltexts, rebuild cache etc
 This module is STANDALONE SAFE
 """
 
+import re
 import sys
 
 import unittest
@@ -45,6 +46,7 @@ import config
 import bibclassify_engine
 import bibclassify_cli
 import bibclassify_ontology_reader
+import bibclassify_keyword_analyzer
 
 log = bconfig.get_logger("bibclassify.tests")
 
@@ -286,6 +288,141 @@ class BibClassifyTest(BibClassifyTestCase):
 
 
 
+class BibClassifyKeywordAnalyzerTest(unittest.TestCase):
+    """Test the matching of the single keywords in a text."""
+
+    def setUp(self):
+        """Initialize stuff"""
+        self.skw_db = {}
+        for label in ("gauge", "gauge boson", "boson", "Higgs boson",
+                      "Higgs"):
+            keyword = bibclassify_ontology_reader.KeywordToken(label)
+            self.skw_db[keyword.short_id] = keyword
+        yang_mills = bibclassify_ontology_reader.KeywordToken("yang-mills")
+        yang_mills.regex = bibclassify_ontology_reader._get_searchable_regex(
+            ["Yang-Mills"], [u"/Yang[-\\s]Mills theor\\w+/"])
+        self.skw_db[yang_mills.short_id] = yang_mills
+
+    def test_get_single_keywords(self):
+        """bibclassify - contained matches of single keywords are dropped"""
+        fulltext = " the gauge bosons and the Higgs boson; a gauge, a Higgs " \
+                   "and the Yang-Mills theory "
+        single_keywords = bibclassify_keyword_analyzer.get_single_keywords(
+            self.skw_db, fulltext)
+        spans = {}
+        for keyword, matches in single_keywords.items():
+            spans[keyword.concept] = matches[0]
+        self.assertEqual({"gauge boson": [(4, 17)],
+                          "Higgs boson": [(25, 37)],
+                          "gauge": [(40, 46)],
+                          "Higgs": [(49, 55)],
+                          "yang-mills": [(63, 81)]}, spans)
+
+    def test_get_single_keywords_without_match(self):
+        """bibclassify - no single keywords in a text"""
+        self.assertEqual({}, bibclassify_keyword_analyzer.get_single_keywords(
+            self.skw_db, " nothing to see here "))
+
+    def test_get_regex_literal(self):
+        """bibclassify - literal part of the regex of a keyword"""
+        get_regex_literal = bibclassify_keyword_analyzer._get_regex_literal
+        self.assertEqual("Mills theor", get_regex_literal(
+            re.compile(r"[^\w-]Yang[-\s]Mills theor\w+[^\w-]")))
+        self.assertEqual("ransformation", get_regex_literal(
+            re.compile(r"[^\w-][tT]ransformations?[^\w-]")))
+        self.assertEqual("Cambridge", get_regex_literal(
+            re.compile(r"[^\w-]Cambridge('?s)?[^\w-]")))
+        self.assertEqual("", get_regex_literal(re.compile(r"a|b")))
+        self.assertEqual("", get_regex_literal(re.compile(r"(?i)higgs")))
+
+
+class FakeBibRecDocs:
+    """Documents of a record, made of one PDF file named after the record."""
+
+    def __init__(self, recid):
+        self.recid = recid
+
+    def list_latest_files(self):
+        """Return the fake PDF file of the record"""
+        return [FakeBibDocFile(self.recid)]
+
+
+class FakeBibDocFile:
+    """PDF file of a record, which is never read."""
+
+    def __init__(self, recid):
+        self.path = '/fake/%d.pdf' % recid
+
+    def get_full_path(self):
+        return self.path
+
+    def get_path(self):
+        return self.path
+
+
+class BibClassifyDaemonTest(unittest.TestCase):
+    """Test analyzing the records by the daemon."""
+
+    labels = ("gauge", "boson", "Higgs")
+
+    def setUp(self):
+        """Replace the documents and their analysis by fake ones"""
+        self.saved = (bibclassify_daemon.BibRecDocs,
+                      bibclassify_daemon.bibclassify_text_extractor.is_pdf,
+                      bibclassify_engine.get_keywords_from_local_file,
+                      bibclassify_engine.load_taxonomy,
+                      bibclassify_daemon.bibtask.task_update_progress,
+                      bibclassify_daemon.bibtask.task_sleep_now_if_required,
+                      bibclassify_daemon.bibtask.task_get_option('parallel'),
+                      bibclassify_daemon._INDEX,
+                      bibclassify_daemon._RECIDS_NUMBER)
+        bibclassify_daemon.BibRecDocs = FakeBibRecDocs
+        bibclassify_daemon.bibclassify_text_extractor.is_pdf = lambda path: True
+        bibclassify_engine.get_keywords_from_local_file = self.get_keywords_from_local_file
+        bibclassify_engine.load_taxonomy = lambda taxonomy_name: None
+        bibclassify_daemon.bibtask.task_update_progress = lambda msg: None
+        bibclassify_daemon.bibtask.task_sleep_now_if_required = lambda can_stop_too: None
+
+    def tearDown(self):
+        """Restore the documents and their analysis"""
+        (bibclassify_daemon.BibRecDocs,
+         bibclassify_daemon.bibclassify_text_extractor.is_pdf,
+         bibclassify_engine.get_keywords_from_local_file,
+         bibclassify_engine.load_taxonomy,
+         bibclassify_daemon.bibtask.task_update_progress,
+         bibclassify_daemon.bibtask.task_sleep_now_if_required,
+         parallel,
+         bibclassify_daemon._INDEX,
+         bibclassify_daemon._RECIDS_NUMBER) = self.saved
+        bibclassify_daemon.bibtask.task_set_option('parallel', parallel)
+
+    def get_keywords_from_local_file(self, local_file, taxonomy_name, **kwargs):
+        """Find as many keywords in the fake file as its record id, modulo
+        4, says, so that records 4 and 8 have no keywords."""
+        recid = int(os.path.basename(local_file).split('.')[0])
+        single_keywords = {}
+        for label in self.labels[:recid % 4]:
+            keyword = bibclassify_ontology_reader.KeywordToken(label)
+            single_keywords[keyword] = [[(0, len(label))] * recid, []]
+        return single_keywords, {}, {}, {}
+
+    def analyze_documents(self, records, parallel):
+        """Analyze RECORDS in PARALLEL processes"""
+        bibclassify_daemon.bibtask.task_set_option('parallel', parallel)
+        bibclassify_daemon._INDEX = 0
+        bibclassify_daemon._RECIDS_NUMBER = len(records)
+        return bibclassify_daemon._analyze_documents(records, 'HEP', 'Articles')
+
+    def test_parallel_analysis(self):
+        """bibclassify - same daemon output with and without parallel"""
+        records = [5, 3, 8, 1, 4, 2, 7, 6]
+        output = self.analyze_documents(records, 1)
+        self.assertEqual(['5', '3', '1', '2', '7', '6'],
+                         re.findall(r'<controlfield tag="001">(\d+)</controlfield>', output))
+        self.assertEqual(output, self.analyze_documents(records, 2))
+        self.assertEqual(output, self.analyze_documents(records, 3))
+
+
 def suite(cls=BibClassifyTest):
     tests = []
     for x in sys.argv[1:]:
@@ -299,7 +436,10 @@ def suite(cls=BibClassifyTest):
 if 'custom' in sys.argv:
     TEST_SUITE = suite(BibClassifyTest)
 else:
-    TEST_SUITE = make_test_suite(BibClassifyTest)
+    TEST_SUITE = make_test_suite(BibClassifyTest,
+                                 BibClassifyKeywordAnalyzerTest)
+    if bibclassify_daemon is not None:
+        TEST_SUITE.addTest(make_test_suite(BibClassifyDaemonTest))
 
 
 if __name__ == '__main__':
@@ -38,8 +38,25 @@ import re
 import sys
 import tempfile
 import urllib2
+from cStringIO import StringIO
 import bibclassify_config as bconfig
 
+# Share the text extracted from the PDFs with the other Invenio tools,
+# when running inside Invenio.
+try:
+    from bibdocfile_text_cache import get_pdf_text
+except ImportError:
+    def get_pdf_text(path, checksum=None):
+        """Returns the canonical text of the PDF file, i.e. the output of
+        pdftotext as extracted by Invenio, without cache, or None if
+        pdftotext failed."""
+        cmd = "pdftotext -q -enc UTF-8 -eol unix %s -" % re.escape(path)
+        filestream = os.popen(cmd)
+        text = filestream.read()
+        if filestream.close() is not None:
+            return None
+        return text
+
 log = bconfig.get_logger("bibclassify.text_extractor")
 
 
@@ -57,8 +74,10 @@ def text_lines_from_local_file(document, remote=False):
         if is_pdf(document):
             if not executable_exists("pdftotext"):
                 log.error("pdftotext is not available on the system.")
-            cmd = "pdftotext -q -enc UTF-8 %s -" % re.escape(document)
-            filestream = os.popen(cmd)
+            # The text of the PDF is taken from the text cache, if it has
+            # already been extracted (by bibclassify or another tool).
+            text = get_pdf_text(document)
+            filestream = StringIO(text or "")
         else:
             filestream = open(document, "r")
     except IOError, ex1:
@@ -42,6 +42,7 @@ if sys.hexversion < 0x2040000:
 from invenio.bibrecord_config import CFG_MARC21_DTD, \
     CFG_BIBRECORD_WARNING_MSGS, CFG_BIBRECORD_DEFAULT_VERBOSE_LEVEL, \
     CFG_BIBRECORD_DEFAULT_CORRECT, CFG_BIBRECORD_PARSERS_AVAILABLE, \
+    CFG_BIBRECORD_STREAM_READ_SIZE, \
     InvenioBibRecordParserError, InvenioBibRecordFieldError
 from invenio.config import CFG_BIBUPLOAD_EXTERNAL_OAIID_TAG
 from invenio.textutils import encode_for_xml
@@ -113,6 +114,39 @@ def create_records(marcxml, verbose=CFG_BIBRECORD_DEFAULT_VERBOSE_LEVEL,
     return [create_record(record_xml, verbose=verbose, correct=correct,
             parser=parser, keep_singletons=keep_singletons) for record_xml in record_xmls]
 
+def create_records_iterator(marcxml_stream,
+    verbose=CFG_BIBRECORD_DEFAULT_VERBOSE_LEVEL,
+    correct=CFG_BIBRECORD_DEFAULT_CORRECT, parser='',
+    keep_singletons=CFG_BIBRECORD_KEEP_SINGLETONS,
+    read_size=CFG_BIBRECORD_STREAM_READ_SIZE):
+    """Iterator counterpart of create_records(): reads the MARCXML
+    description from the file-like object MARCXML_STREAM by blocks of
+    READ_SIZE bytes and yields the objects initiated by the function
+    create_record() one at a time, so that only the record being
+    parsed needs to be kept in memory."""
+    regex = re.compile('<record.*?>.*?</record>', re.DOTALL)
+    buf = ''
+    while True:
+        data = marcxml_stream.read(read_size)
+        buf += data
+        end = 0
+        for match in regex.finditer(buf):
+            end = match.end()
+            yield create_record(match.group(), verbose=verbose,
+                correct=correct, parser=parser,
+                keep_singletons=keep_singletons)
+        if not data:
+            break
+        if end:
+            buf = buf[end:]
+        else:
+            # no complete record yet: drop what cannot be part of one
+            start = buf.find('<record')
+            if start == -1:
+                buf = buf[-len('<record'):]
+            else:
+                buf = buf[start:]
+
 def create_record(marcxml, verbose=CFG_BIBRECORD_DEFAULT_VERBOSE_LEVEL,
     correct=CFG_BIBRECORD_DEFAULT_CORRECT, parser='',
     sort_fields_by_indicators=False,
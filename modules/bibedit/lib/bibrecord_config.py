@@ -48,6 +48,9 @@ CFG_BIBRECORD_DEFAULT_VERBOSE_LEVEL = 0
 # correction level to be used when creating records from XML: (0=no, 1=yes)
 CFG_BIBRECORD_DEFAULT_CORRECT = 0
 
+# number of bytes read at once from MARCXML streams:
+CFG_BIBRECORD_STREAM_READ_SIZE = 1048576
+
 # XML parsers available:
 CFG_BIBRECORD_PARSERS_AVAILABLE = ['pyrxp', '4suite', 'minidom']
 
@@ -22,6 +22,7 @@ The BibRecord test suite.
 """
 
 import unittest
+from cStringIO import StringIO
 
 from invenio.config import CFG_TMPDIR
 from invenio import bibrecord, bibrecord_config
@@ -120,6 +121,37 @@ class BibRecordSuccessTest(unittest.TestCase):
         record1 = bibrecord.create_records(xmltext)[0]
         self.assertEqual(record1, record)
 
+class BibRecordStreamingTest(unittest.TestCase):
+    """ bibrecord - streaming parsing test """
+
+    def test_demo_file_records_iterator(self):
+        """ bibrecord - create_records_iterator() on demo file"""
+        f = open(CFG_TMPDIR + '/demobibdata.xml', 'r')
+        xmltext = f.read()
+        f.close()
+        f = open(CFG_TMPDIR + '/demobibdata.xml', 'r')
+        recs = list(bibrecord.create_records_iterator(f))
+        f.close()
+        self.assertEqual(bibrecord.create_records(xmltext), recs)
+
+    def test_records_iterator_small_reads(self):
+        """ bibrecord - create_records_iterator() with records split across reads"""
+        xmltext = """<collection>
+        <record>
+        <controlfield tag="001">33</controlfield>
+        </record>
+        <record>
+        <controlfield tag="001">34</controlfield>
+        <datafield tag="041" ind1=" " ind2=" ">
+        <subfield code="a">eng</subfield>
+        </datafield>
+        </record>
+        </collection>"""
+        for read_size in (1, 5, 20, 1000):
+            recs = list(bibrecord.create_records_iterator(StringIO(xmltext),
+                                                          read_size=read_size))
+            self.assertEqual(bibrecord.create_records(xmltext), recs)
+
 class BibRecordParsersTest(unittest.TestCase):
     """ bibrecord - testing the creation of records with different parsers"""
 
@@ -1518,6 +1550,7 @@ class BibRecordNumCharRefTest(unittest.TestCase):
 
 TEST_SUITE = make_test_suite(
     BibRecordSuccessTest,
+    BibRecordStreamingTest,
     BibRecordParsersTest,
     BibRecordBadInputTreatmentTest,
     BibRecordGettingFieldValuesTest,
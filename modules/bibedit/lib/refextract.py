@@ -26,6 +26,7 @@ __revision__ = "$Id$"
 import sys, re
 import os, getopt
 from time import mktime, localtime, ctime
+from cStringIO import StringIO
 
 # make refextract runnable without requiring the full Invenio installation:
 try:
@@ -138,6 +139,47 @@ except ImportError:
         s = string.replace(s, '<', '&lt;')
         return s
 
+## Share the text extracted from the PDFs with the other Invenio tools,
+## when running inside Invenio:
+try:
+    from invenio.bibdocfile_text_cache import get_pdf_text
+except ImportError:
+    def get_pdf_text(path, checksum=None, raw=False):
+        """Return the canonical text of the PDF file, i.e. the output of
+           pdftotext as extracted by Invenio (in raw mode if raw is True),
+           without cache, or None if pdftotext failed."""
+        if raw:
+            text_representation = "-raw"
+        else:
+            text_representation = ""
+        cmd_pdftotext = """%(pdftotext)s %(rep)s -q -enc UTF-8 -eol unix '%(filepath)s' -""" \
+            % { 'pdftotext' : CFG_PATH_PDFTOTEXT,
+                'rep'       : text_representation,
+                'filepath'  : path.replace("'", "\\'")
+                }
+        ## open pipe to pdftotext:
+        pipe_pdftotext = os.popen("%s" % cmd_pdftotext, 'r')
+        ## read back results:
+        text = pipe_pdftotext.read()
+        ## close pipe to pdftotext:
+        if pipe_pdftotext.close() is not None:
+            return None
+        return text
+
+## Find the periodical titles with the string matcher shared with the
+## other Invenio tools; standalone, simply search for them one by one:
+try:
+    from invenio.stringmatcher import build_string_matcher, find_strings
+except ImportError:
+    def build_string_matcher(strings):
+        """Return the strings to search for, without automaton."""
+        return list(strings)
+
+    def find_strings(text, matcher):
+        """Return the positions of the strings present in the text."""
+        return [position for (position, string) in enumerate(matcher) \
+                if string and text.find(string) != -1]
+
 ## Try to get the bibtask functions, necessary when running refextract
 ## as a bibsched task. They won't be needed for standalone execution of
 ## Refextract however.
@@ -213,6 +255,9 @@ Command options:
   -n, --kb-report-number
                        Manually specify the location of a report number
                        knowledge-base file.
+  --parallel=N         Extract from the documents in N processes, sharing
+                       the knowledge bases; the records are still written
+                       in the order of the documents. (Default = 1)
 
 Standalone Refextract options:
   -f, --fulltext       A single pdf or text document (with appended record id)
@@ -222,6 +267,10 @@ Standalone Refextract options:
 ## Is refextract running standalone? (Default = yes)
 running_independently = True
 
+## Arguments of extract_references_from_job used by the worker processes
+## of a parallel extraction: (extract_top_section_metadata, knowledge_bases)
+_extraction_job_arguments = None
+
 ## Default write_message function will dump messages
 ## straight onto the specified stream
 ## If running as a bibtask, then write_message is overridden
@@ -2190,6 +2239,54 @@ def build_titles_knowledge_base(fpath):
     ## return the raw knowledge base:
     return (kb, standardised_titles, seek_phrases)
 
+def build_titles_matcher(periodical_title_search_keys):
+    """Compile the non-standard periodical titles into a single
+       Aho-Corasick automaton, so that the titles present in a reference
+       line can be found in one pass over the line, instead of trying
+       the search pattern of every title of the knowledge base in turn.
+       @param periodical_title_search_keys: (list) - the ordered list of
+        non-standard titles, as returned by build_titles_knowledge_base.
+       @return: (tuple) of 2 elements:
+                        + (tuple)      - the automaton of the titles,
+                                         built by build_string_matcher.
+                        + (list)       - the positions of the titles
+                                         that are always searched for
+                                         (see get_periodical_title_candidates).
+    """
+    titles = []
+    always_searched = []
+    for (position, title) in enumerate(periodical_title_search_keys):
+        if title.find(u"_") != -1:
+            ## this title could match the underscores that replace the
+            ## titles already found in the line:
+            always_searched.append(position)
+            titles.append(None)
+        else:
+            titles.append(title)
+    return (build_string_matcher(titles), always_searched)
+
+def get_periodical_title_candidates(line,
+                                    periodical_title_search_keys,
+                                    periodical_title_matcher):
+    """Return the titles that may be matched by their search pattern in
+       a reference line: the titles whose text is present in the line,
+       found in one pass over the line, and the titles containing
+       underscores.  Since identify_periodical_titles only replaces
+       characters of the line by underscores, these are the only titles
+       that can be matched, also after some titles have been replaced.
+       @param line: (string) - the working reference line.
+       @param periodical_title_search_keys: (list) - the ordered list of
+        non-standard titles.
+       @param periodical_title_matcher: (tuple) - the automaton built
+        from these titles by build_titles_matcher.
+       @return: (list) - the candidate titles, in the order of
+        periodical_title_search_keys.
+    """
+    (string_matcher, always_searched) = periodical_title_matcher
+    positions = find_strings(line, string_matcher) + always_searched
+    positions.sort()
+    return [periodical_title_search_keys[position] for position in positions]
+
 
 def get_affiliation_canonical_value(proposed_affil):
     """Given a proposed affiliation, look for a canonical form in the
@@ -2669,7 +2766,8 @@ def identify_and_tag_authors(line):
 
 def identify_periodical_titles(line,
                                periodical_title_search_kb,
-                               periodical_title_search_keys):
+                               periodical_title_search_keys,
+                               periodical_title_matcher=None):
     """Attempt to identify all periodical titles in a reference line.
        Titles will be identified, their information (location in line,
        length in line, and non-standardised version) will be recorded,
@@ -2682,6 +2780,9 @@ def identify_periodical_titles(line,
         standard periodical TITLEs to be searched for in the line. This
         list of titles has already been ordered and is used to force
         the order of searching.
+       @param periodical_title_matcher: (tuple) - the automaton built
+        from periodical_title_search_keys by build_titles_matcher. When
+        given, only the titles present in the line are searched for.
        @return: (tuple) containing 4 elements:
                         + (dictionary) - the lengths of all titles
                                          matched at each given index
@@ -2702,6 +2803,13 @@ def identify_periodical_titles(line,
     titles_count = {}             ## sum totals of each 'bad title found in
                                   ## line.
 
+    if periodical_title_matcher is not None:
+        ## skip the titles that cannot be found in the line:
+        periodical_title_search_keys = \
+              get_periodical_title_candidates(line,
+                                              periodical_title_search_keys,
+                                              periodical_title_matcher)
+
     ## Begin searching:
     for title in periodical_title_search_keys:
         ## search for all instances of the current periodical title
@@ -4349,7 +4457,8 @@ def create_marc_xml_reference_section(ref_sect,
                                       preprint_repnum_standardised_categs,
                                       periodical_title_search_kb,
                                       standardised_periodical_titles,
-                                      periodical_title_search_keys):
+                                      periodical_title_search_keys,
+                                      periodical_title_matcher=None):
     """Passed a complete reference section, process each line and attempt to
        ## identify and standardise individual citations within the line.
        @param ref_sect: (list) of strings - each string in the list is a
@@ -4369,6 +4478,8 @@ def create_marc_xml_reference_section(ref_sect,
         title.
        @param periodical_title_search_keys: (list) - ordered list of non-
         standard titles to search for.
+       @param periodical_title_matcher: (tuple) - the automaton built from
+        periodical_title_search_keys by build_titles_matcher, or None.
        @return: (tuple) of 6 components:
          ( list       -> of strings, each string is a MARC XML-ized reference
                          line.
@@ -4465,7 +4576,8 @@ def create_marc_xml_reference_section(ref_sect,
          line_titles_count) = \
                     identify_periodical_titles(working_line2,
                                                periodical_title_search_kb,
-                                               periodical_title_search_keys)
+                                               periodical_title_search_keys,
+                                               periodical_title_matcher)
 
         ## Add the count of 'bad titles' found in this line to the total
         ## for the reference section:
@@ -7224,9 +7336,13 @@ def _pdftotext_conversion_is_bad(txtlines):
         return 0
 
 def convert_PDF_to_plaintext(fpath, for_top_section):
-    """Take the path to a PDF file and run pdftotext for this file, capturing
-       the output.
+    """Take the path to a PDF file and get its text, as extracted by
+       pdftotext and shared with the other Invenio tools.
        @param fpath: (string) path to the PDF file
+       @param for_top_section: (boolean) get the text of pdftotext in its
+        default mode, keeping the page-breaks in the lines of text, as the
+        top section of the document is analysed; otherwise the text of
+        pdftotext in raw mode is used, as for the references.
        @return: (list) of unicode strings (contents of the PDF file translated
         into plaintext; each string is a line in the document.)
     """
@@ -7237,25 +7353,13 @@ def convert_PDF_to_plaintext(fpath, for_top_section):
     ## its own line because we rely upon this for trying to strip headers
     ## and footers, and for some other pattern matching.
     p_break_in_line = re.compile(unicode(r'^\s*?(\f)(?!$)(.*?)$'), re.UNICODE)
-    ## build pdftotext command:
-
-    if for_top_section:
-        text_representation = "" #FIXME -layout
-    else:
-        text_representation = "-raw"
-
-    cmd_pdftotext = """%(pdftotext)s %(rep)s -q -enc UTF-8 '%(filepath)s' -""" \
-        % { 'pdftotext' : CFG_PATH_PDFTOTEXT,
-            'rep'       : text_representation,
-            'filepath'  : fpath.replace("'", "\\'")
-            }
 
-    write_message("%s\n" % cmd_pdftotext, verbose=2)
-    ## open pipe to pdftotext:
-    pipe_pdftotext = os.popen("%s" % cmd_pdftotext, 'r')
-    ## read back results:
+    ## The text of the PDF is taken from the text cache, if it has
+    ## already been extracted (by refextract or another tool):
+    write_message("-----getting the text of %s\n" % fpath, verbose=2)
+    text = get_pdf_text(fpath, raw=not for_top_section) or ""
     count = 0
-    for docline in pipe_pdftotext:
+    for docline in StringIO(text):
         unicodeline = docline.decode("utf-8")
         ## Check for a page-break in this line:
         m_break_in_line = p_break_in_line.match(unicodeline)
@@ -7270,8 +7374,6 @@ def convert_PDF_to_plaintext(fpath, for_top_section):
             doclines.append(m_break_in_line.group(1))
             doclines.append(m_break_in_line.group(2))
             count += 2
-    ## close pipe to pdftotext:
-    pipe_pdftotext.close()
     write_message("-----convert_PDF_to_plaintext found: " \
                      "%s lines of text\n" % str(count), verbose=2)
 
@@ -7392,6 +7494,7 @@ def get_cli_options():
                  'authors'                    : 0,
                  'affiliations'               : 0,
                  'first_author'               : 0,
+                 'parallel'                   : 1,
                }
 
     try:
@@ -7410,7 +7513,8 @@ def get_cli_options():
                                            "kb-journal=",
                                            "kb-report-number=",
                                            "first_author",
-                                           "raw-authors",])
+                                           "raw-authors",
+                                           "parallel=",])
     except getopt.GetoptError, err:
         if err.opt in ("c", "collection", "i", "recid", "e", "extraction-job"):
             ## These are arguments designed to be used for the daemon mode only
@@ -7470,6 +7574,14 @@ def get_cli_options():
             cli_opts['affiliations'] = 1
         elif o[0] in ("--first_author"):
             cli_opts['first_author'] = 1
+        elif o[0] in ("--parallel",):
+            ## Number of processes extracting from the documents
+            try:
+                cli_opts['parallel'] = int(o[1])
+            except ValueError:
+                cli_opts['parallel'] = 0
+            if cli_opts['parallel'] < 1:
+                usage(wmsg="Error: --parallel must be a positive integer, not '%s'." % o[1])
 
     # What journal title format are we using?
     if cli_opts['verbosity'] > 0 and cli_opts['inspire']:
@@ -7621,6 +7733,187 @@ def sum_2_dictionaries(dicta, dictb):
             dict_out[key] = dictb[key]
     return dict_out
 
+def extract_references_from_job(extract_job, extract_top_section_metadata,
+                                knowledge_bases):
+    """Extract the references (or the authors/affiliations) of one
+       document and mark them up in MARC XML.
+       @param extract_job: (tuple) of 2 elements: the record id and the
+        path of the pdf/text document, as given by get_recids_and_filepaths.
+       @param extract_top_section_metadata: (boolean) extract authors or
+        affiliations instead of references.
+       @param knowledge_bases: (tuple) the journal titles knowledge base
+        (search kb, standardised titles, search keys, matcher) followed
+        by the report numbers knowledge base (search patterns,
+        standardised categories), as built by build_titles_knowledge_base,
+        build_titles_matcher and build_reportnum_knowledge_base; None when extracting authors or
+        affiliations.
+       @return: (tuple) of 4 elements: the overall extraction error
+        code (1 meaning that the document could not be read, in which
+        case the other elements are empty), the extracted lines, the
+        MARC XML record and the dictionary of counts of the
+        'bad titles' found in the references.
+    """
+    how_found_start = -1  ## flag to indicate how the reference start section was found (or not)
+    extract_error = 0  ## extraction was OK unless determined otherwise
+    ## reset the stats counters:
+    count_misc = count_title = count_reportnum = count_url = count_doi = count_auth_group = 0
+    record_titles_count = {}
+    recid = extract_job[0]
+    write_message("--- processing RecID: %s pdffile: %s; %s\n" \
+                     % (str(extract_job[0]), extract_job[1], ctime()), verbose=2)
+
+    ## 1. Get this document body as plaintext:
+    (docbody, extract_error) = \
+        get_plaintext_document_body(extract_job[1], \
+                                        extract_top_section_metadata)
+    if extract_error == 1:
+        ## Non-existent or unreadable pdf/text directory.
+        return (extract_error, [], "", record_titles_count)
+    if extract_error == 0 and len(docbody) == 0:
+        extract_error = 3
+    write_message("-----get_plaintext_document_body gave: " \
+                         "%s lines, overall error: %s\n" \
+                         % (str(len(docbody)), str(extract_error)), verbose=2)
+
+    if len(docbody) > 0:
+        ## the document body is not empty:
+        ## 2. If necessary, locate the reference section:
+        if cli_opts['treat_as_raw_section']:
+            ## don't search for sections in the document body:
+            ## treat entire input as relevant section:
+            extract_lines = docbody
+        else:
+            ## launch search for the relevant section in the document body
+            if extract_top_section_metadata:
+                (document_info, extract_error, author_type) = \
+                    extract_top_document_information_from_fulltext(docbody, first_author=cli_opts['first_author'])
+            else:
+                (extract_lines, extract_error, how_found_start) = \
+                    extract_references_from_fulltext(docbody)
+
+        ## I want references!
+        if not extract_top_section_metadata:
+            (title_search_kb, \
+             title_search_standardised_titles, \
+             title_search_keys, \
+             title_search_matcher, \
+             preprint_reportnum_sre, \
+             standardised_preprint_reportnum_categs) = knowledge_bases
+            if len(extract_lines) == 0 and extract_error == 0:
+                extract_error = 6
+                write_message("-----extract_references_from_fulltext " \
+                                 "gave len(reflines): %s overall error: " \
+                                 "%s\n" \
+                                 % (str(len(extract_lines)), str(extract_error)))
+                if cli_opts['verbosity'] >= 4:
+                    sys.stdout.write('-----reference lines extracted:\n%s\n\n' % extract_lines)
+
+            ## 3. Standardise the reference lines:
+            (processed_lines, count_misc, \
+             count_title, count_reportnum, \
+             count_url, count_doi, count_auth_group, \
+             record_titles_count) = \
+              create_marc_xml_reference_section(extract_lines,
+                                                preprint_repnum_search_kb=\
+                                                  preprint_reportnum_sre,
+                                                preprint_repnum_standardised_categs=\
+                                                  standardised_preprint_reportnum_categs,
+                                                periodical_title_search_kb=\
+                                                  title_search_kb,
+                                                standardised_periodical_titles=\
+                                                  title_search_standardised_titles,
+                                                periodical_title_search_keys=\
+                                                  title_search_keys,
+                                                periodical_title_matcher=\
+                                                  title_search_matcher)
+        ## I want authors/affiliations!
+        else:
+            ## Handle the xml processing separately, in the case that authors/
+            ## affiliations are being extracted
+            if cli_opts['authors']:
+                extract_lines = document_info['authors']
+                ## Associate authors with their affiliations if possible
+                out_lines = mark_up_authors_with_affiliations(extract_lines)
+            else:
+                extract_lines = document_info['affiliations']
+                ## Just the list of affiliations
+                out_lines = mark_up_affiliations(set([aff['line'] for aff in extract_lines]))
+
+            if not document_info and extract_error == 0:
+                extract_error = 6
+            elif extract_error == 2:
+                extract_lines = []
+
+            if cli_opts['verbosity'] >= 1:
+                sys.stdout.write("-----author/affiliation extraction " \
+                                     "gave len(extract_lines): %s overall error: " \
+                                     "%s\n" \
+                                     % (str(len(extract_lines)), str(extract_error)))
+
+            processed_lines = []
+            for first_auth_aff, l in out_lines:
+                (xml_line, \
+                 count_auth, \
+                 count_aff) = \
+                 convert_processed_auth_aff_line_to_marc_xml(l.replace('\n',''), \
+                                                                 first_auth_aff)
+                processed_lines.append(xml_line)
+
+    else:
+        ## document body is empty, therefore the reference section is empty:
+        extract_lines = []
+        processed_lines = []
+
+    ## If found ref section by a weaker method and only found misc/urls then junk it
+    ## studies show that such cases are ~ 100% rubbish. Also allowing only
+    ## urls found greatly increases the level of rubbish accepted..
+    if count_reportnum + count_title == 0 and how_found_start > 2:
+        count_misc = count_url = count_doi = count_auth_group = 0
+        processed_lines = []
+        if cli_opts['verbosity'] >= 1:
+            sys.stdout.write("-----Found ONLY miscellaneous/Urls so removed it how_found_start=  %d\n" % (how_found_start))
+    elif  count_reportnum + count_title  > 0 and how_found_start > 2:
+        if cli_opts['verbosity'] >= 1:
+            sys.stdout.write("-----Found journals/reports with how_found_start=  %d\n" % (how_found_start))
+
+    if extract_top_section_metadata:
+        out = display_auth_aff_xml_record(recid, \
+                                              processed_lines)
+    else:
+        ## Display the processed reference lines:
+        out = display_references_xml_record(extract_error, \
+                                                count_reportnum, \
+                                                count_title, \
+                                                count_url, \
+                                                count_doi, \
+                                                count_misc, \
+                                                count_auth_group, \
+                                                recid, \
+                                                processed_lines)
+
+        ## Compress mulitple 'm' subfields in a datafield
+        out = compress_subfields(out, CFG_REFEXTRACT_SUBFIELD_MISC)
+        ## Compress multiple 'h' subfields in a datafield
+        out = compress_subfields(out, CFG_REFEXTRACT_SUBFIELD_AUTH)
+
+        ## Filter the processed reference lines to remove junk
+        out = filter_processed_lines(out)  ## Be sure to call this BEFORE compress_subfields
+                                           ## since filter_processed_lines expects the
+                                           ## original xml format.
+
+    lines = out.split('\n')
+    write_message("-----display_xml_record gave: %s significant " \
+                     "lines of xml, overall error: %s\n" \
+                     % (str(len(lines) - 7), extract_error), verbose=2)
+    return (extract_error, extract_lines, out, record_titles_count)
+
+def _extract_references_from_job(extract_job):
+    """Run extract_references_from_job on EXTRACT_JOB with the options
+       and knowledge bases of the running extraction.  Run by the worker
+       processes of begin_extraction; the knowledge bases are not sent
+       to them, they inherit them when they are forked."""
+    return extract_references_from_job(extract_job, *_extraction_job_arguments)
+
 def begin_extraction(daemon_cli_options=None):
     """Starts the core extraction procedure. [Entry point from main]
        Only refextract_daemon calls this directly, from _task_run_core()
@@ -7629,7 +7922,7 @@ def begin_extraction(daemon_cli_options=None):
        called as a scheduled bibtask inside bibsched.
     """
 
-    global cli_opts, running_independently
+    global cli_opts, running_independently, _extraction_job_arguments
     ## Global 'running mode' dependent functions
     global write_message, task_update_progress, task_sleep_now_if_required
 
@@ -7669,6 +7962,7 @@ def begin_extraction(daemon_cli_options=None):
     extract_top_section_metadata = cli_opts['authors'] or cli_opts['affiliations']
 
     ## Don't parse the knowledge bases if authors/affiliations are being extracted
+    knowledge_bases = None
     if not extract_top_section_metadata:
         ## Read the journal titles knowledge base, creating the search
         ## patterns and replace terms. Check for user-specified journal kb.
@@ -7689,6 +7983,9 @@ def begin_extraction(daemon_cli_options=None):
          title_search_standardised_titles, \
          title_search_keys) = \
                    build_titles_knowledge_base(titles_kb_file)
+        ## Compile the titles into one automaton, to find them in a
+        ## single pass over each reference line:
+        title_search_matcher = build_titles_matcher(title_search_keys)
 
         ## Read the report numbers knowledge base, creating the search
         ## patterns and replace terms. Check for user-specified rep-no kb.
@@ -7706,210 +8003,115 @@ def begin_extraction(daemon_cli_options=None):
          standardised_preprint_reportnum_categs) = \
                    build_reportnum_knowledge_base(repno_kb_file)
 
+        knowledge_bases = (title_search_kb, \
+                           title_search_standardised_titles, \
+                           title_search_keys, \
+                           title_search_matcher, \
+                           preprint_reportnum_sre, \
+                           standardised_preprint_reportnum_categs)
+
     done_coltags = 0 ## flag to signal that the starting XML collection
                      ## tags have been output to either an xml file or stdout
 
-    for num, curitem in enumerate(extract_jobs):
-        ## Safe to sleep/stop the extraction here
-        task_sleep_now_if_required(can_stop_too=True)
-        ## Update the document extraction number
-        task_update_progress("Extracting from %d of %d" % (num+1, len(extract_jobs)))
-
-        how_found_start = -1  ## flag to indicate how the reference start section was found (or not)
-        extract_error = 0  ## extraction was OK unless determined otherwise
-        ## reset the stats counters:
-        count_misc = count_title = count_reportnum = count_url = count_doi = count_auth_group = 0
-        recid = curitem[0]
-        write_message("--- processing RecID: %s pdffile: %s; %s\n" \
-                         % (str(curitem[0]), curitem[1], ctime()), verbose=2)
-
-        ## 1. Get this document body as plaintext:
-        (docbody, extract_error) = \
-            get_plaintext_document_body(curitem[1], \
-                                            extract_top_section_metadata)
-        if extract_error == 1:
-            ## Non-existent or unreadable pdf/text directory.
-            write_message("***%s\n\n" % curitem[1], sys.stderr, verbose=0)
-            halt(msg="Error: Unable to open '%s' for extraction.\n" \
-                 % curitem[1], exit_code=1)
-        if extract_error == 0 and len(docbody) == 0:
-            extract_error = 3
-        write_message("-----get_plaintext_document_body gave: " \
-                             "%s lines, overall error: %s\n" \
-                             % (str(len(docbody)), str(extract_error)), verbose=2)
-
-        if not done_coltags:
-            ## Output opening XML collection tags:
-            ## Initialise output xml file if the relevant cli flag/arg exists
-            if cli_opts['xmlfile']:
-                try:
-                    ofilehdl = open(cli_opts['xmlfile'], 'w')
-                    ofilehdl.write("%s\n" \
-                                       % CFG_REFEXTRACT_XML_VERSION.encode("utf-8"))
-                    ofilehdl.write("%s\n" \
-                                       % CFG_REFEXTRACT_XML_COLLECTION_OPEN.encode("utf-8"))
-                    ofilehdl.flush()
-                except Exception, err:
-                    write_message("***%s\n%s\n" % (cli_opts['xmlfile'], err), \
-                                      sys.stderr, verbose=0)
-                    halt(err=IOError, msg="Error: Unable to write to '%s'" \
-                             % cli_opts['xmlfile'], exit_code=1)
+    ## Extract from the documents in several processes, if asked for:
+    nb_processes = cli_opts.get('parallel', 1) or 1
+    pool = None
+    if nb_processes > 1 and len(extract_jobs) > 1:
+        import multiprocessing
+        _extraction_job_arguments = (extract_top_section_metadata, knowledge_bases)
+        pool = multiprocessing.Pool(nb_processes)
+        write_message("--- extracting from %d documents in %d processes\n" \
+                      % (len(extract_jobs), nb_processes), verbose=2)
 
-            ## else, write the xml lines to the stdout
-            else:
-                sys.stdout.write("%s\n" \
-                                     % CFG_REFEXTRACT_XML_VERSION.encode("utf-8"))
-                sys.stdout.write("%s\n" \
-                                     % CFG_REFEXTRACT_XML_COLLECTION_OPEN.encode("utf-8"))
-            done_coltags = 1
-
-        if len(docbody) > 0:
-            ## the document body is not empty:
-            ## 2. If necessary, locate the reference section:
-            if cli_opts['treat_as_raw_section']:
-                ## don't search for sections in the document body:
-                ## treat entire input as relevant section:
-                extract_lines = docbody
+    try:
+        ## treat documents in batches, so that only the results of a
+        ## bounded number of documents are held in memory at once, and
+        ## write the records in the order of the documents:
+        batch_size = max(2 * nb_processes, 1)
+        for batch_start in range(0, len(extract_jobs), batch_size):
+            batch = extract_jobs[batch_start:batch_start + batch_size]
+            if pool is not None:
+                results = pool.map_async(_extract_references_from_job, batch).get()
             else:
-                ## launch search for the relevant section in the document body
-                if extract_top_section_metadata:
-                    (document_info, extract_error, author_type) = \
-                        extract_top_document_information_from_fulltext(docbody, first_author=cli_opts['first_author'])
-                else:
-                    (extract_lines, extract_error, how_found_start) = \
-                        extract_references_from_fulltext(docbody)
-
-            ## I want references!
-            if not extract_top_section_metadata:
-                if len(extract_lines) == 0 and extract_error == 0:
-                    extract_error = 6
-                    write_message("-----extract_references_from_fulltext " \
-                                     "gave len(reflines): %s overall error: " \
-                                     "%s\n" \
-                                     % (str(len(extract_lines)), str(extract_error)))
-                    if cli_opts['verbosity'] >= 4:
-                        sys.stdout.write('-----reference lines extracted:\n%s\n\n' % extract_lines)
-
-                ## 3. Standardise the reference lines:
-                (processed_lines, count_misc, \
-                 count_title, count_reportnum, \
-                 count_url, count_doi, count_auth_group, \
-                 record_titles_count) = \
-                  create_marc_xml_reference_section(extract_lines,
-                                                    preprint_repnum_search_kb=\
-                                                      preprint_reportnum_sre,
-                                                    preprint_repnum_standardised_categs=\
-                                                      standardised_preprint_reportnum_categs,
-                                                    periodical_title_search_kb=\
-                                                      title_search_kb,
-                                                    standardised_periodical_titles=\
-                                                      title_search_standardised_titles,
-                                                    periodical_title_search_keys=\
-                                                      title_search_keys)
-
-                ## Add the count of 'bad titles' found in this line to the total
-                ## for the reference section:
+                results = [None] * len(batch)
+            for num, curitem, result in zip(range(batch_start, batch_start + len(batch)), \
+                                            batch, results):
+                ## Safe to sleep/stop the extraction here
+                task_sleep_now_if_required(can_stop_too=True)
+                ## Update the document extraction number
+                task_update_progress("Extracting from %d of %d" % (num+1, len(extract_jobs)))
+
+                recid = curitem[0]
+                if result is None:
+                    result = extract_references_from_job(curitem, \
+                                                         extract_top_section_metadata, \
+                                                         knowledge_bases)
+                (extract_error, extract_lines, out, record_titles_count) = result
+                if extract_error == 1:
+                    ## Non-existent or unreadable pdf/text directory.
+                    write_message("***%s\n\n" % curitem[1], sys.stderr, verbose=0)
+                    halt(msg="Error: Unable to open '%s' for extraction.\n" \
+                         % curitem[1], exit_code=1)
+
+                if not done_coltags:
+                    ## Output opening XML collection tags:
+                    ## Initialise output xml file if the relevant cli flag/arg exists
+                    if cli_opts['xmlfile']:
+                        try:
+                            ofilehdl = open(cli_opts['xmlfile'], 'w')
+                            ofilehdl.write("%s\n" \
+                                               % CFG_REFEXTRACT_XML_VERSION.encode("utf-8"))
+                            ofilehdl.write("%s\n" \
+                                               % CFG_REFEXTRACT_XML_COLLECTION_OPEN.encode("utf-8"))
+                            ofilehdl.flush()
+                        except Exception, err:
+                            write_message("***%s\n%s\n" % (cli_opts['xmlfile'], err), \
+                                              sys.stderr, verbose=0)
+                            halt(err=IOError, msg="Error: Unable to write to '%s'" \
+                                     % cli_opts['xmlfile'], exit_code=1)
+
+                    ## else, write the xml lines to the stdout
+                    else:
+                        sys.stdout.write("%s\n" \
+                                             % CFG_REFEXTRACT_XML_VERSION.encode("utf-8"))
+                        sys.stdout.write("%s\n" \
+                                             % CFG_REFEXTRACT_XML_COLLECTION_OPEN.encode("utf-8"))
+                    done_coltags = 1
+
+                ## Add the count of 'bad titles' found in this document to the
+                ## total for the extraction job:
                 all_found_titles_count = \
                                        sum_2_dictionaries(all_found_titles_count, \
                                                           record_titles_count)
-            ## I want authors/affiliations!
-            else:
-                ## Handle the xml processing separately, in the case that authors/
-                ## affiliations are being extracted
-                if cli_opts['authors']:
-                    extract_lines = document_info['authors']
-                    ## Associate authors with their affiliations if possible
-                    out_lines = mark_up_authors_with_affiliations(extract_lines)
-                else:
-                    extract_lines = document_info['affiliations']
-                    ## Just the list of affiliations
-                    out_lines = mark_up_affiliations(set([aff['line'] for aff in extract_lines]))
-
-                if not document_info and extract_error == 0:
-                    extract_error = 6
-                elif extract_error == 2:
-                    extract_lines = []
-
-                if cli_opts['verbosity'] >= 1:
-                    sys.stdout.write("-----author/affiliation extraction " \
-                                         "gave len(extract_lines): %s overall error: " \
-                                         "%s\n" \
-                                         % (str(len(extract_lines)), str(extract_error)))
-
-                processed_lines = []
-                for first_auth_aff, l in out_lines:
-                    (xml_line, \
-                     count_auth, \
-                     count_aff) = \
-                     convert_processed_auth_aff_line_to_marc_xml(l.replace('\n',''), \
-                                                                     first_auth_aff)
-                    processed_lines.append(xml_line)
-
-        else:
-            ## document body is empty, therefore the reference section is empty:
-            extract_lines = []
-            processed_lines = []
-
-        ## 4. Display the extracted references, status codes, etc:
-        if cli_opts['output_raw']:
-            ## now write the raw references to the stream:
-            raw_file = str(recid) + '.rawrefs'
-            try:
-                rawfilehdl = open(raw_file, 'w')
-                write_raw_references_to_stream(recid, extract_lines, rawfilehdl)
-                rawfilehdl.close()
-            except:
-                write_message("***%s\n\n" % raw_file, \
-                                  sys.stderr, verbose=0)
-                halt(err=IOError, msg="Error: Unable to write to '%s'" \
-                              % raw_file, exit_code=1)
-        ## If found ref section by a weaker method and only found misc/urls then junk it
-        ## studies show that such cases are ~ 100% rubbish. Also allowing only
-        ## urls found greatly increases the level of rubbish accepted..
-        if count_reportnum + count_title == 0 and how_found_start > 2:
-            count_misc = count_url = count_doi = count_auth_group = 0
-            processed_lines = []
-            if cli_opts['verbosity'] >= 1:
-                sys.stdout.write("-----Found ONLY miscellaneous/Urls so removed it how_found_start=  %d\n" % (how_found_start))
-        elif  count_reportnum + count_title  > 0 and how_found_start > 2:
-            if cli_opts['verbosity'] >= 1:
-                sys.stdout.write("-----Found journals/reports with how_found_start=  %d\n" % (how_found_start))
 
-        if extract_top_section_metadata:
-            out = display_auth_aff_xml_record(recid, \
-                                                  processed_lines)
-        else:
-            ## Display the processed reference lines:
-            out = display_references_xml_record(extract_error, \
-                                                    count_reportnum, \
-                                                    count_title, \
-                                                    count_url, \
-                                                    count_doi, \
-                                                    count_misc, \
-                                                    count_auth_group, \
-                                                    recid, \
-                                                    processed_lines)
-
-            ## Compress mulitple 'm' subfields in a datafield
-            out = compress_subfields(out, CFG_REFEXTRACT_SUBFIELD_MISC)
-            ## Compress multiple 'h' subfields in a datafield
-            out = compress_subfields(out, CFG_REFEXTRACT_SUBFIELD_AUTH)
-
-            ## Filter the processed reference lines to remove junk
-            out = filter_processed_lines(out)  ## Be sure to call this BEFORE compress_subfields
-                                               ## since filter_processed_lines expects the
-                                               ## original xml format.
-
-        lines = out.split('\n')
-        write_message("-----display_xml_record gave: %s significant " \
-                         "lines of xml, overall error: %s\n" \
-                         % (str(len(lines) - 7), extract_error), verbose=2)
-        if cli_opts['xmlfile']:
-            ofilehdl.write("%s" % (out.encode("utf-8"),))
-            ofilehdl.flush()
-        else:
-            ## Write the record to the standard output stream:
-            sys.stdout.write("%s" % out.encode("utf-8"))
+                ## 4. Display the extracted references, status codes, etc:
+                if cli_opts['output_raw']:
+                    ## now write the raw references to the stream:
+                    raw_file = str(recid) + '.rawrefs'
+                    try:
+                        rawfilehdl = open(raw_file, 'w')
+                        write_raw_references_to_stream(recid, extract_lines, rawfilehdl)
+                        rawfilehdl.close()
+                    except:
+                        write_message("***%s\n\n" % raw_file, \
+                                          sys.stderr, verbose=0)
+                        halt(err=IOError, msg="Error: Unable to write to '%s'" \
+                                      % raw_file, exit_code=1)
+
+                if cli_opts['xmlfile']:
+                    ofilehdl.write("%s" % (out.encode("utf-8"),))
+                    ofilehdl.flush()
+                else:
+                    ## Write the record to the standard output stream:
+                    sys.stdout.write("%s" % out.encode("utf-8"))
+    except:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+        raise
+    if pool is not None:
+        pool.close()
+        pool.join()
 
     ## If an XML collection was opened, display closing tag
     if done_coltags:
@@ -103,4 +103,5 @@ CFG_REFEXTRACT_XML_RECORD_CLOSE     = u"</record>"
 ## Job task file valid parameters
 CFG_REFEXTRACT_JOB_FILE_PARAMS = ('collection', 'recid', 'raw-references',
                                   'output-raw-refs', 'xmlfile', 'dictfile',
-                                  'inspire', 'kb-journal', 'kb-report-number', 'verbose')
+                                  'inspire', 'kb-journal', 'kb-report-number', 'verbose',
+                                  'parallel')
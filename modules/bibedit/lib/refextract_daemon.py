@@ -245,6 +245,8 @@ def _task_submit_elaborate_specific_parameter(key, value, opts, args):
             task_set_option('kb-journal', value)
         elif key in ('-n', '--kb-report-number'):
             task_set_option('kb-report-number', value)
+        elif key in ('--parallel',):
+            task_set_option('parallel', value)
     return True
 
 def _get_fulltext_args_from_recids(recids, task_info):
@@ -348,6 +350,7 @@ def _task_run_core():
                         'authors'                    : 0,
                         'affiliations'               : 0,
                         'treat_as_raw_section'       : 0,
+                        'parallel'                   : 1,
                       }
 
     ## holds the name of the extraction job, and if it's already in the db
@@ -376,6 +379,15 @@ def _task_run_core():
         daemon_cli_opts['kb-journal'] = task_get_option('kb-journal')
     if task_has_option('kb-report-number'):
         daemon_cli_opts['kb-report-number'] = task_get_option('kb-report-number')
+    if task_has_option('parallel'):
+        ## also set from extraction-job files, hence given as a string
+        try:
+            daemon_cli_opts['parallel'] = max(int(task_get_option('parallel')), 1)
+        except ValueError:
+            write_message("Error: The value specified for parallel must be a "
+                "positive integer, not '%s'." % task_get_option('parallel'),
+                stream=sys.stdout, verbose=0)
+            return False
     if task_get_option('recids'):
         ## Construct the fulltext argument equivalent from record id's
         ## (records, and arguments, which have valid files)
@@ -521,6 +533,7 @@ Scheduled (daemon) Refextract options:
                              "inspire",
                              "kb-journal=",
                              "kb-report-number=",
+                             "parallel=",
                              "recid=",
                              "collection=",
                              "extraction-job=",]),
@@ -21,17 +21,30 @@
 The Refextract test suite.
 """
 
+import os
+import re
+import sys
+import shutil
+import tempfile
 import unittest
 from invenio.testutils import make_test_suite, run_test_suite
 ## Import the minimal necessary methods and variables needed to run Refextract
+from invenio import refextract
 from invenio.refextract import CFG_REFEXTRACT_KB_JOURNAL_TITLES, \
                                CFG_REFEXTRACT_KB_REPORT_NUMBERS, \
                                create_marc_xml_reference_section, \
                                build_titles_knowledge_base, \
+                               build_titles_matcher, \
+                               get_periodical_title_candidates, \
+                               identify_periodical_titles, \
                                build_reportnum_knowledge_base, \
                                display_references_xml_record, \
                                compress_subfields, \
                                restrict_m_subfields, \
+                               get_cli_options, \
+                               extract_references_from_job, \
+                               convert_PDF_to_plaintext, \
+                               begin_extraction, \
                                cli_opts
 
 # Initially, build the titles knowledge base
@@ -575,7 +588,142 @@ class RefextractTest(unittest.TestCase):
         #Compare the recieved output with the expected references
         self.assertEqual(out, references_expected)
 
-TEST_SUITE = make_test_suite(RefextractTest)
+class RefextractTitlesMatcherTest(unittest.TestCase):
+    """ refextract - finding the periodical titles in one pass """
+
+    def test_title_candidates(self):
+        """ refextract - titles present in a line """
+        keys = [u'PHYS REV LETT', u'PHYS REV', u'REV', u'NUCL_PHYS', u'LETT B']
+        matcher = build_titles_matcher(keys)
+        self.assertEqual([u'PHYS REV', u'REV', u'NUCL_PHYS'],
+                         get_periodical_title_candidates(u'SEE PHYS REV D 12', keys, matcher))
+        self.assertEqual([u'PHYS REV LETT', u'PHYS REV', u'REV', u'NUCL_PHYS', u'LETT B'],
+                         get_periodical_title_candidates(u'PHYS REV LETT B 4', keys, matcher))
+        self.assertEqual([u'NUCL_PHYS'],
+                         get_periodical_title_candidates(u'PHYS LETT', keys, matcher))
+
+    def test_same_titles_as_patterns(self):
+        """ refextract - same titles identified with the matcher """
+        matcher = build_titles_matcher(title_search_keys)
+        lines = [u'[1] PHYS REV LETT 44 (1980) 912; PHYS LETT B 245 (1990) 669 ',
+                 u'[2] J HIGH ENERGY PHYS 0412 (2004) 045 AND NUCL PHYS B 342 (1990) 15 ',
+                 u'[3] ASTRONOMY AND ASTROPHYSICS 12 (1999) 1; IBID 13 (2000) 2 ',
+                 u'[4] SOME MISC TEXT WITHOUT ANY TITLE ']
+        for line in lines:
+            self.assertEqual(identify_periodical_titles(line, title_search_kb,
+                                                        title_search_keys),
+                             identify_periodical_titles(line, title_search_kb,
+                                                        title_search_keys,
+                                                        matcher))
+
+class RefextractJobTest(unittest.TestCase):
+    """ refextract - extracting the references of whole documents """
+
+    reference_lines = ["[1] J. Maldacena, Adv. Theor. Math. Phys. 2 (1998) 231; hep-th/9711200.",
+                       "[2] S. Gubser, I. Klebanov and A. Polyakov, Phys. Lett. B428 (1998) 105; hep-th/9802109.",
+                       "[3] E. Witten, Adv. Theor. Math. Phys. 2 (1998) 253; hep-th/9802150.",
+                       "[4] L. Susskind, J. Math. Phys. 36 (1995) 6377; hep-th/9409089.",
+                       "[5] W. Fischler and L. Susskind, hep-th/9806039; N. Kaloper and A. Linde, Phys. Rev. D60 (1999) 105509, hep-th/9904120."]
+
+    def setUp(self):
+        """Write the example documents and save the options of refextract"""
+        self.directory = tempfile.mkdtemp()
+        self.saved = (sys.argv, refextract.cli_opts)
+
+    def tearDown(self):
+        """Remove the example documents and restore the options"""
+        (sys.argv, refextract.cli_opts) = self.saved
+        shutil.rmtree(self.directory)
+
+    def write_document(self, name, reference_lines):
+        """Write a small text document citing REFERENCE_LINES"""
+        path = os.path.join(self.directory, name)
+        document = open(path, 'w')
+        document.write("On the large N limit of superconformal field theories\n\n"
+                       "The body of the article.\n\n"
+                       "References\n%s\n" % '\n'.join(reference_lines))
+        document.close()
+        return path
+
+    def run_refextract(self, arguments):
+        """Run refextract as from the command line with ARGUMENTS and
+           return the MARC XML it wrote"""
+        xmlfile = os.path.join(self.directory, 'references.xml')
+        sys.argv = ['refextract', '-x', xmlfile] + arguments
+        begin_extraction()
+        out = open(xmlfile).read()
+        # Remove the extraction time from the statistics of the records
+        return re.sub(r'-\d+((-\d+){7}</subfield>)', r'\1', out)
+
+    def test_extract_references_from_job(self):
+        """ refextract - extracting the references of a text document """
+        path = self.write_document('1.txt', self.reference_lines[:3])
+        sys.argv = ['refextract', '-f', '1:%s' % path]
+        get_cli_options()
+        knowledge_bases = (title_search_kb,
+                           title_search_standardised_titles,
+                           title_search_keys,
+                           build_titles_matcher(title_search_keys),
+                           preprint_reportnum_sre,
+                           standardised_preprint_reportnum_categs)
+        (extract_error, extract_lines, out, record_titles_count) = \
+            extract_references_from_job(('1', path), 0, knowledge_bases)
+        self.assertEqual(0, extract_error)
+        self.assertEqual(3, len(extract_lines))
+        self.assert_('<controlfield tag="001">1</controlfield>' in out)
+        self.assert_('<subfield code="s">Phys. Lett B 428 (1998) 105</subfield>' in out)
+        self.assert_('<subfield code="r">hep-th/9802150</subfield>' in out)
+
+    def test_parallel_extraction(self):
+        """ refextract - same records in the same order in parallel """
+        arguments = []
+        for recid in (5, 3, 1, 4, 2):
+            path = self.write_document('%d.txt' % recid,
+                                       self.reference_lines[:recid])
+            arguments += ['-f', '%d:%s' % (recid, path)]
+        out = self.run_refextract(arguments + ['--parallel=1'])
+        self.assertEqual(['5', '3', '1', '4', '2'],
+                         re.findall(r'<controlfield tag="001">(\d+)</controlfield>', out))
+        self.assertEqual(out, self.run_refextract(arguments + ['--parallel=2']))
+
+class RefextractPDFTextTest(unittest.TestCase):
+    """ refextract - reading the text of PDF documents """
+
+    def setUp(self):
+        """Replace pdftotext by a fake one, recording the modes asked"""
+        self.saved = refextract.get_pdf_text
+        refextract.get_pdf_text = self.get_pdf_text
+        self.modes = []
+
+    def tearDown(self):
+        """Restore pdftotext"""
+        refextract.get_pdf_text = self.saved
+
+    def get_pdf_text(self, path, checksum=None, raw=False):
+        """Fake pdftotext, in default or raw mode"""
+        self.modes.append(raw)
+        if raw:
+            return "Raw title\n\fRaw body text\n"
+        return "Default title\n\fDefault body text\n"
+
+    def test_top_section_text(self):
+        """ refextract - top section read from the default mode text """
+        (doclines, status) = convert_PDF_to_plaintext('1.pdf', True)
+        self.assertEqual(0, status)
+        self.assertEqual([u'Default title\n', u'\fDefault body text\n'], doclines)
+        self.assertEqual([False], self.modes)
+
+    def test_references_text(self):
+        """ refextract - references read from the raw mode text """
+        (doclines, status) = convert_PDF_to_plaintext('1.pdf', False)
+        self.assertEqual(0, status)
+        self.assertEqual([u'Raw title\n', u'\f', u'Raw body text'], doclines)
+        self.assertEqual([True], self.modes)
+
+TEST_SUITE = make_test_suite(RefextractTest,
+                             RefextractTitlesMatcherTest,
+                             RefextractJobTest,
+                             RefextractPDFTextTest)
 
 if __name__ == '__main__':
     run_test_suite(TEST_SUITE)
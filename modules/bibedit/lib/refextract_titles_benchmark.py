@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+##
+## This file is part of Invenio.
+## Copyright (C) 2011 CERN.
+##
+## Invenio is free software; you can redistribute it and/or
+## modify it under the terms of the GNU General Public License as
+## published by the Free Software Foundation; either version 2 of the
+## License, or (at your option) any later version.
+##
+## Invenio is distributed in the hope that it will be useful, but
+## WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+## General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with Invenio; if not, write to the Free Software Foundation, Inc.,
+## 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+
+"""
+Benchmark of the identification of periodical titles in refextract.
+
+Compares, on a synthetic corpus of reference lines citing titles of the
+journal titles knowledge base, the search of every title pattern in
+turn with the search restricted to the titles found by the automaton
+of build_titles_matcher(), both in running time and in the titles they
+identify.  Usage:
+
+  $ python -c 'from invenio.refextract_titles_benchmark import main; main()' \\
+        [number of reference lines] [path to the journal titles kb]
+"""
+
+__revision__ = "$Id$"
+
+import sys
+import time
+import random
+
+from invenio.refextract import CFG_REFEXTRACT_KB_JOURNAL_TITLES, \
+     build_titles_knowledge_base, build_titles_matcher, \
+     identify_periodical_titles
+
+_AUTHORS = [u'J. MALDACENA', u'E. WITTEN', u'L. SUSSKIND', u'A. LINDE',
+            u'S. HAWKING', u'G. T HOOFT', u'N. SEIBERG', u'ET AL']
+
+def generate_reference_lines(periodical_title_search_keys, nr_of_lines,
+                             seed=0):
+    """returns a list of random reference lines, written the way they
+    are when titles are identified (upper case), each citing one to
+    three titles of PERIODICAL_TITLE_SEARCH_KEYS"""
+    rnd = random.Random(seed)
+    lines = []
+    for i in range(nr_of_lines):
+        citations = []
+        for j in range(rnd.randint(1, 3)):
+            citations.append(u"%s, %s %d (%d) %d" % \
+                             (rnd.choice(_AUTHORS),
+                              rnd.choice(periodical_title_search_keys),
+                              rnd.randint(1, 400), rnd.randint(1950, 2011),
+                              rnd.randint(1, 9999)))
+        lines.append(u"[%d] %s " % (i + 1, u"; ".join(citations)))
+    return lines
+
+def run_benchmark(nr_of_lines, kb_path=CFG_REFEXTRACT_KB_JOURNAL_TITLES):
+    """returns (number of titles in the kb, time of the search of every
+    title pattern, time of building the automaton, time of the search
+    with the automaton, number of lines identified differently)"""
+    (title_search_kb, dummy, title_search_keys) = \
+                      build_titles_knowledge_base(kb_path)
+    lines = generate_reference_lines(title_search_keys, nr_of_lines)
+
+    start = time.time()
+    results_patterns = [identify_periodical_titles(line, title_search_kb,
+                                                   title_search_keys)
+                        for line in lines]
+    time_patterns = time.time() - start
+
+    start = time.time()
+    title_search_matcher = build_titles_matcher(title_search_keys)
+    time_build = time.time() - start
+
+    start = time.time()
+    results_matcher = [identify_periodical_titles(line, title_search_kb,
+                                                  title_search_keys,
+                                                  title_search_matcher)
+                       for line in lines]
+    time_matcher = time.time() - start
+
+    nr_of_differences = 0
+    for i in range(nr_of_lines):
+        if results_patterns[i] != results_matcher[i]:
+            nr_of_differences += 1
+    return len(title_search_keys), time_patterns, time_build, time_matcher, \
+           nr_of_differences
+
+def main():
+    """prints the result of the benchmark"""
+    nr_of_lines = 500
+    kb_path = CFG_REFEXTRACT_KB_JOURNAL_TITLES
+    if len(sys.argv) > 1:
+        nr_of_lines = int(sys.argv[1])
+    if len(sys.argv) > 2:
+        kb_path = sys.argv[2]
+    nr_of_titles, time_patterns, time_build, time_matcher, \
+                  nr_of_differences = run_benchmark(nr_of_lines, kb_path)
+    print "reference lines: %d, titles in the kb: %d" % (nr_of_lines,
+                                                         nr_of_titles)
+    print "one pattern per title:      %.3f s" % time_patterns
+    print "automaton (build):          %.3f s" % time_build
+    print "automaton (search):         %.3f s" % time_matcher
+    print "speedup: %.1fx" % (time_patterns / max(time_matcher, 1e-6))
+    print "lines identified differently: %d" % nr_of_differences
+
+if __name__ == "__main__":
+    main()
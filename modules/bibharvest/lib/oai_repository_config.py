@@ -26,3 +26,8 @@ CFG_OAI_REPOSITORY_MARCXML_SIZE = 100
 ## Makefile.am and tabcreate.sql defaults for setSpec column in
 ## oaiREPOSITORY MySQL table.
 CFG_OAI_REPOSITORY_GLOBAL_SET_SPEC = "GLOBAL_SET"
+
+## Minimum number of seconds between two garbage collections of
+## expired resumption token snapshots triggered by OAI requests (the
+## snapshots are also garbage collected by `inveniogc --cache')
+CFG_OAI_REPOSITORY_RT_GC_INTERVAL = 3600
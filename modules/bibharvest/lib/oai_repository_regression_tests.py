@@ -141,6 +141,29 @@ class TestSelectiveHarvesting(unittest.TestCase):
 
         self.assert_('badResumptionToken' in req.getvalue())
 
+class TestResumptionTokens(unittest.TestCase):
+    """Test the resumption token snapshots."""
+
+    def test_resumption_token_format(self):
+        """oairepository - resumption token generation and parsing"""
+        token = oai_repository_server.oai_generate_resumption_token('cern:theory___abc', 200, 'oai_dc')
+        self.assertEqual(('cern:theory___abc', 200, 'oai_dc'),
+                         oai_repository_server.oai_parse_resumption_token(token))
+        self.assertRaises(ValueError, oai_repository_server.oai_parse_resumption_token, 'foobar')
+
+    def test_snapshot_pages(self):
+        """oairepository - shared snapshot of recids read page by page"""
+        recids = intbitset(range(1, 1000, 3))
+        name = oai_repository_server.oai_cache_dump('', '2001-01-01', '', recids)
+        self.assertEqual(name, oai_repository_server.oai_cache_dump('', '2001-01-01', '', recids))
+        query, size, page = oai_repository_server.oai_cache_load(name, 10, 5)
+        self.assertEqual({'set': '', 'from': '2001-01-01', 'until': ''}, query)
+        self.assertEqual(len(recids), size)
+        self.assertEqual(list(recids)[10:15], page)
+        query, size, page = oai_repository_server.oai_cache_load(name, size - 2, 5)
+        self.assertEqual(list(recids)[-2:], page)
+        self.assertRaises(ValueError, oai_repository_server.oai_cache_load, name, size, 5)
+
 class TestPerformance(unittest.TestCase):
     """Test performance of the repository """
 
@@ -180,6 +203,7 @@ Limit: %s seconds""" % (t, self.number_of_records * allowed_seconds_per_record_m
 
 TEST_SUITE = make_test_suite(OAIRepositoryWebPagesAvailabilityTest,
                              TestSelectiveHarvesting,
+                             TestResumptionTokens,
                              TestPerformance)
 
 if __name__ == "__main__":
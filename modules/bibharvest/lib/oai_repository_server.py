@@ -19,13 +19,19 @@
 
 __revision__ = "$Id$"
 
-import cPickle
 import os
 import re
 import time
 import datetime
 import tempfile
+import struct
+import marshal
 import sys
+from array import array
+if sys.hexversion < 0x2050000:
+    from md5 import md5
+else:
+    from hashlib import md5
 if sys.hexversion < 0x2050000:
     from glob import glob as iglob
 else:
@@ -64,7 +70,8 @@ from invenio.search_engine import record_exists, get_all_restricted_recids, get_
 from invenio.bibformat import format_record
 from invenio.bibrecord import record_get_field_instances
 from invenio.errorlib import register_exception
-from invenio.oai_repository_config import CFG_OAI_REPOSITORY_GLOBAL_SET_SPEC
+from invenio.oai_repository_config import CFG_OAI_REPOSITORY_GLOBAL_SET_SPEC, \
+     CFG_OAI_REPOSITORY_RT_GC_INTERVAL
 
 CFG_VERBS = {
     'GetRecord'          : ['identifier', 'metadataPrefix'],
@@ -461,49 +468,47 @@ def oai_list_records_or_identifiers(req, argd):
     if argd.get('resumptionToken'):
         resumption_token_was_specified = True
         try:
-            cache = oai_cache_load(argd['resumptionToken'])
-            last_recid = cache['last_recid']
-            argd = cache['argd']
-            complete_list = cache['complete_list']
-            complete_list = filter_out_based_on_date_range(complete_list, argd.get('from', ''), argd.get('until', ''))
+            snapshot_name, cursor, metadata_prefix = \
+                oai_parse_resumption_token(argd['resumptionToken'])
+            query, complete_list_size, page = \
+                oai_cache_load(snapshot_name, cursor, CFG_OAI_LOAD)
+            argd = {'verb': verb, 'metadataPrefix': metadata_prefix}
+            for key in ('set', 'from', 'until'):
+                if query.get(key):
+                    argd[key] = query[key]
+            ## records may have been modified or restricted since the
+            ## snapshot was taken:
+            page = filter_out_based_on_date_range(page, argd.get('from', ''), argd.get('until', ''))
         except Exception:
             register_exception(alert_admin=True)
             req.write(oai_error(argd, [("badResumptionToken", "ResumptionToken expired or invalid: %s" % argd['resumptionToken'])]))
             return
     else:
-        last_recid = 0
+        cursor = 0
         complete_list = oai_get_recid_list(argd.get('set', ""), argd.get('from', ""), argd.get('until', ""))
 
         if not complete_list: # noRecordsMatch error
             req.write(oai_error(argd, [("noRecordsMatch", "no records correspond to the request")]))
             return
 
-    cursor = 0
-    for cursor, recid in enumerate(complete_list):
-        ## Let's fast-forward the cursor to point after the last recid that was
-        ## disseminated successfully
-        if recid > last_recid:
-            break
+        complete_list_size = len(complete_list)
+        page = list(complete_list)[:CFG_OAI_LOAD]
+        if complete_list_size > CFG_OAI_LOAD:
+            snapshot_name = oai_cache_dump(argd.get('set', ''), argd.get('from', ''), argd.get('until', ''), complete_list)
 
     req.write(oai_header(argd, verb))
-    for recid in list(complete_list)[cursor:cursor+CFG_OAI_LOAD]:
+    for recid in page:
         req.write(print_record(recid, argd['metadataPrefix'], verb=verb, set_spec=argd.get('set')))
 
-    if list(complete_list)[cursor+CFG_OAI_LOAD:]:
-        resumption_token = oai_generate_resumption_token(argd.get('set', ''))
-        cache = {
-            'argd': argd,
-            'last_recid': recid,
-            'complete_list': complete_list.fastdump(),
-        }
-        oai_cache_dump(resumption_token, cache)
+    if cursor + CFG_OAI_LOAD < complete_list_size:
+        resumption_token = oai_generate_resumption_token(snapshot_name, cursor + CFG_OAI_LOAD, argd['metadataPrefix'])
         expdate = oai_get_response_date(CFG_OAI_EXPIRE)
-        req.write(X.resumptionToken(expirationDate=expdate, cursor=cursor, completeListSize=len(complete_list))(resumption_token))
+        req.write(X.resumptionToken(expirationDate=expdate, cursor=cursor, completeListSize=complete_list_size)(resumption_token))
     elif resumption_token_was_specified:
         ## Since a resumptionToken was used we shall put a last empty resumptionToken
-        req.write(X.resumptionToken(cursor=cursor, completeListSize=len(complete_list))(""))
+        req.write(X.resumptionToken(cursor=cursor, completeListSize=complete_list_size)(""))
     req.write(oai_footer(verb))
-    oai_cache_gc()
+    oai_cache_gc_if_needed()
 
 def oai_list_sets(argd):
     """
@@ -645,12 +650,20 @@ def filter_out_based_on_date_range(recids, fromdate="", untildate=""):
 
     recids = intbitset(recids) ## Let's clone :-)
 
+    ## when filtering a page of recids, let us not fetch all the
+    ## records modified in the date range:
+    id_clause = ""
+    id_params = ()
+    if 0 < len(recids) <= CFG_OAI_LOAD:
+        id_clause = " AND id IN (%s)" % ','.join(['%s'] * len(recids))
+        id_params = tuple(recids)
+
     if fromdate and untildate:
-        recids &= intbitset(run_sql("SELECT id FROM bibrec WHERE modification_date BETWEEN %s AND %s", (fromdate, untildate)))
+        recids &= intbitset(run_sql("SELECT id FROM bibrec WHERE modification_date BETWEEN %s AND %s" + id_clause, (fromdate, untildate) + id_params))
     elif fromdate:
-        recids &= intbitset(run_sql("SELECT id FROM bibrec WHERE modification_date >= %s", (fromdate, )))
+        recids &= intbitset(run_sql("SELECT id FROM bibrec WHERE modification_date >= %s" + id_clause, (fromdate, ) + id_params))
     elif untildate:
-        recids &= intbitset(run_sql("SELECT id FROM bibrec WHERE modification_date <= %s", (untildate, )))
+        recids &= intbitset(run_sql("SELECT id FROM bibrec WHERE modification_date <= %s" + id_clause, (untildate, ) + id_params))
     return recids - get_all_restricted_recids()
 
 def oai_get_recid_list(set_spec="", fromdate="", untildate=""):
@@ -674,11 +687,23 @@ def oai_get_recid_list(set_spec="", fromdate="", untildate=""):
             ret -= search_unit_in_bibxxx(p='DUMMY', f='980__%', type='e')
     return filter_out_based_on_date_range(ret, fromdate, untildate)
 
-def oai_generate_resumption_token(set_spec):
-    """Generates unique ID for resumption token management."""
-    fd, name = tempfile.mkstemp(dir=os.path.join(CFG_CACHEDIR, 'RTdata'), prefix='%s___' % set_spec)
-    os.close(fd)
-    return os.path.basename(name)
+def oai_generate_resumption_token(snapshot_name, cursor, metadata_prefix):
+    """
+    Generates the resumption token pointing at position CURSOR of the
+    recid list snapshot SNAPSHOT_NAME.
+    """
+    return '%s___%d___%s' % (snapshot_name, cursor, metadata_prefix)
+
+def oai_parse_resumption_token(resumption_token):
+    """
+    Return (snapshot_name, cursor, metadata_prefix) from
+    RESUMPTION_TOKEN.  Raise ValueError if it is not well-formed.
+    """
+    snapshot_name, cursor, metadata_prefix = resumption_token.rsplit('___', 2)
+    cursor = int(cursor)
+    if cursor < 0 or metadata_prefix not in CFG_OAI_METADATA_FORMATS:
+        raise ValueError("Invalid resumption token")
+    return snapshot_name, cursor, metadata_prefix
 
 def oai_delete_resumption_tokens_for_set(set_spec):
     """
@@ -693,20 +718,62 @@ def oai_delete_resumption_tokens_for_set(set_spec):
     for name in iglob(os.path.join(CFG_CACHEDIR, 'RTdata', '___*')):
         os.remove(name)
 
-def oai_cache_dump(resumption_token, cache):
-    """
-    Given a resumption_token and the cache, stores the cache.
-    """
-    cPickle.dump(cache, open(os.path.join(CFG_CACHEDIR, 'RTdata', resumption_token), 'w'), -1)
-
-def oai_cache_load(resumption_token):
-    """
-    Restores the cache from the resumption_token.
-    """
-    fullpath = os.path.join(CFG_CACHEDIR, 'RTdata', resumption_token)
+def oai_cache_dump(set_spec, fromdate, untildate, complete_list):
+    """
+    Stores the snapshot of COMPLETE_LIST, the recids answering the
+    query SET_SPEC, FROMDATE, UNTILDATE, and returns its name.  The
+    snapshot is shared by all the resumption tokens of all the
+    harvesters getting the same answer to the same query.
+
+    The snapshot file consists of the length of the marshalled query,
+    the marshalled query and the array of sorted recids, so that any
+    page of recids can be read without reading the whole file.
+    """
+    query = {'set': set_spec, 'from': fromdate, 'until': untildate}
+    recids = array('I', list(complete_list))
+    snapshot_name = '%s___%s' % (set_spec, md5(marshal.dumps(query) + recids.tostring()).hexdigest())
+    fullpath = os.path.join(CFG_CACHEDIR, 'RTdata', snapshot_name)
+    if os.path.exists(fullpath):
+        ## somebody is already harvesting the same list: let us just
+        ## extend its lifetime
+        os.utime(fullpath, None)
+        return snapshot_name
+    header = marshal.dumps(query)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.join(CFG_CACHEDIR, 'RTdata'), prefix='tmp')
+    snapshot_file = os.fdopen(fd, 'wb')
+    snapshot_file.write(struct.pack('!I', len(header)))
+    snapshot_file.write(header)
+    recids.tofile(snapshot_file)
+    snapshot_file.close()
+    os.rename(tmp_path, fullpath)
+    return snapshot_name
+
+def oai_cache_load(snapshot_name, cursor, size):
+    """
+    Returns (query, complete_list_size, recids) where recids are the
+    SIZE recids starting at position CURSOR of the snapshot
+    SNAPSHOT_NAME stored by oai_cache_dump().
+    """
+    fullpath = os.path.join(CFG_CACHEDIR, 'RTdata', snapshot_name)
     if os.path.dirname(os.path.abspath(fullpath)) != os.path.abspath(os.path.join(CFG_CACHEDIR, 'RTdata')):
         raise ValueError("Invalid path")
-    return cPickle.load(open(fullpath))
+    if time.time() - os.path.getmtime(fullpath) > CFG_OAI_EXPIRE:
+        raise ValueError("Expired resumption token")
+    snapshot_file = open(fullpath, 'rb')
+    try:
+        header_size = struct.unpack('!I', snapshot_file.read(4))[0]
+        query = marshal.loads(snapshot_file.read(header_size))
+        recids = array('I')
+        complete_list_size = (os.fstat(snapshot_file.fileno()).st_size - 4 - header_size) / recids.itemsize
+        if cursor >= complete_list_size:
+            raise ValueError("Invalid resumption token cursor")
+        snapshot_file.seek(4 + header_size + cursor * recids.itemsize)
+        recids.fromfile(snapshot_file, min(size, complete_list_size - cursor))
+    finally:
+        snapshot_file.close()
+    ## the harvest is going on: let us extend the snapshot lifetime
+    os.utime(fullpath, None)
+    return query, complete_list_size, recids.tolist()
 
 def oai_cache_gc():
     """
@@ -722,6 +789,20 @@ def oai_cache_gc():
                 # Most probably the cache was already deleted
                 pass
 
+def oai_cache_gc_if_needed():
+    """
+    Run the OAI Cache Garbage Collector if it did not run during the
+    last CFG_OAI_REPOSITORY_RT_GC_INTERVAL seconds.
+    """
+    marker = os.path.join(CFG_CACHEDIR, 'RTdata', 'GC')
+    try:
+        if time.time() - os.path.getmtime(marker) < CFG_OAI_REPOSITORY_RT_GC_INTERVAL:
+            return
+    except OSError:
+        pass
+    open(marker, 'w').close()
+    oai_cache_gc()
+
 def get_all_sets():
     """
     Return all the sets.
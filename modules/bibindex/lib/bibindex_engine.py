@@ -46,7 +46,8 @@ from invenio.config import \
 from invenio.websubmit_config import CFG_WEBSUBMIT_BEST_FORMATS_TO_EXTRACT_TEXT_FROM
 from invenio.bibindex_engine_config import CFG_MAX_MYSQL_THREADS, \
     CFG_MYSQL_THREAD_TIMEOUT, \
-    CFG_CHECK_MYSQL_THREADS
+    CFG_CHECK_MYSQL_THREADS, \
+    CFG_BIBINDEX_FLUSH_CHUNK_SIZE
 from invenio.bibindex_engine_tokenizer import BibIndexFuzzyNameTokenizer, \
      BibIndexExactNameTokenizer
 from invenio.bibdocfile import bibdocfile_url_p, \
@@ -56,8 +57,8 @@ from invenio.websubmit_file_converter import convert_file, get_file_converter_lo
 from invenio.search_engine import perform_request_search, \
      wash_index_term, lower_index_term, get_index_stemming_language, \
      get_synonym_terms
-from invenio.dbquery import run_sql, DatabaseError, serialize_via_marshal, \
-     deserialize_via_marshal, wash_table_column_name
+from invenio.dbquery import run_sql, run_sql_many, DatabaseError, \
+     serialize_via_marshal, deserialize_via_marshal, wash_table_column_name
 from invenio.bibindex_engine_stopwords import is_stopword
 from invenio.bibindex_engine_stemmer import stem
 from invenio.bibtask import task_init, write_message, get_datetime, \
@@ -102,6 +103,7 @@ nb_char_in_line = 50  # for verbose pretty printing
 chunksize = 1000 # default size of chunks that the records will be treated by
 base_process_size = 4500 # process base size
 _last_word_table = None
+_tokenizing_word_table = None # word table used by worker processes
 
 def list_union(list1, list2):
     "Returns union of the two lists."
@@ -175,29 +177,38 @@ def get_words_from_journal_tag(recID, tag):
     title/volume/year/page into a standard form that is also used for
     citations.
     """
+    return get_words_from_journal_tag_for_recid_range(recID, recID, tag).get(recID, [])
+
+def get_words_from_journal_tag_for_recid_range(recID1, recID2, tag):
+    """
+    Like get_words_from_journal_tag(), but for all the records from
+    RECID1 to RECID2 at once.  Return dictionary {recID: list of
+    words} for records having some journal tags.
+    """
 
     # get all journal tags/subfields:
     bibXXx = "bib" + tag[0] + tag[1] + "x"
     bibrec_bibXXx = "bibrec_" + bibXXx
-    query = """SELECT bb.field_number,b.tag,b.value FROM %s AS b, %s AS bb
-                WHERE bb.id_bibrec=%%s
+    query = """SELECT bb.id_bibrec,bb.field_number,b.tag,b.value FROM %s AS b, %s AS bb
+                WHERE bb.id_bibrec BETWEEN %%s AND %%s
                   AND bb.id_bibxxx=b.id AND tag LIKE %%s""" % (bibXXx, bibrec_bibXXx)
-    res = run_sql(query, (recID, tag))
+    res = run_sql(query, (recID1, recID2, tag))
     # construct journal pubinfo:
     dpubinfos = {}
     for row in res:
-        nb_instance, subfield, value = row
+        recID, nb_instance, subfield, value = row
         if subfield.endswith("c"):
             # delete pageend if value is pagestart-pageend
             # FIXME: pages may not be in 'c' subfield
             value = value.split('-', 1)[0]
-        if dpubinfos.has_key(nb_instance):
-            dpubinfos[nb_instance][subfield] = value
+        if dpubinfos.has_key((recID, nb_instance)):
+            dpubinfos[(recID, nb_instance)][subfield] = value
         else:
-            dpubinfos[nb_instance] = {subfield: value}
+            dpubinfos[(recID, nb_instance)] = {subfield: value}
     # construct standard format:
-    lwords = []
-    for dpubinfo in dpubinfos.values():
+    out = {}
+    for (recID, nb_instance), dpubinfo in dpubinfos.items():
+        lwords = out.setdefault(recID, [])
         # index all journal subfields separately
         for tag, val in dpubinfo.items():
             lwords.append(val)
@@ -210,8 +221,8 @@ def get_words_from_journal_tag(recID, tag):
             pass
         else:
             lwords.append(pubinfo)
-    # return list of words and pubinfos:
-    return lwords
+    # return list of words and pubinfos per record:
+    return out
 
 def get_field_count(recID, tags):
     """
@@ -232,6 +243,28 @@ def get_field_count(recID, tags):
         out += len(get_fieldvalues(recID, tag))
     return out
 
+def get_field_count_for_recid_range(recID1, recID2, tags):
+    """
+    Return number of field instances having TAGS for every record
+    from RECID1 to RECID2 as dictionary {recID: count}.  Records
+    without any such field instances are not present in the output.
+
+    @param tags: list of tags to count, e.g. ['100__a', '700__a']
+    @type tags: list
+    @rtype: dict
+    """
+    out = {}
+    for tag in tags:
+        bibXXx = "bib" + tag[0] + tag[1] + "x"
+        bibrec_bibXXx = "bibrec_" + bibXXx
+        query = """SELECT bb.id_bibrec,COUNT(*) FROM %s AS b, %s AS bb
+                    WHERE bb.id_bibrec BETWEEN %%s AND %%s
+                      AND bb.id_bibxxx=b.id AND b.tag=%%s
+                 GROUP BY bb.id_bibrec""" % (bibXXx, bibrec_bibXXx)
+        for recID, count in run_sql(query, (recID1, recID2, tag)):
+            out[recID] = out.get(recID, 0) + count
+    return out
+
 def get_author_canonical_ids_for_recid(recID):
     """
     Return list of author canonical IDs (e.g. `J.Ellis.1') for the
@@ -251,6 +284,26 @@ def get_author_canonical_ids_for_recid(recID):
             lwords.append(author_canonical_id)
     return lwords
 
+def get_author_canonical_ids_for_recid_range(recID1, recID2):
+    """
+    Return author canonical IDs (e.g. `J.Ellis.1') for all the records
+    from RECID1 to RECID2 as dictionary {recID: list of canonical
+    IDs}.  Same as get_author_canonical_ids_for_recid(), but consults
+    BibAuthorID module for the whole range at once.
+    """
+    from invenio.bibauthorid_dbinterface import get_canonical_names_by_recid_range
+    return get_canonical_names_by_recid_range(recID1, recID2)
+
+def get_recIDs_with_documents_in_recid_range(recID1, recID2):
+    """
+    Return set of record IDs from RECID1 to RECID2 having at least one
+    non-deleted attached document.
+    """
+    return intbitset(run_sql("""SELECT DISTINCT bb.id_bibrec FROM bibrec_bibdoc AS bb
+                                  JOIN bibdoc AS b ON b.id=bb.id_bibdoc
+                                 WHERE bb.id_bibrec BETWEEN %s AND %s
+                                   AND b.status<>'DELETED'""", (recID1, recID2)))
+
 def get_words_from_date_tag(datestring, stemming_language=None):
     """
     Special procedure to index words from tags storing date-like
@@ -840,6 +893,17 @@ class WordTable:
             out.append(row[0])
         return out
 
+    def get_recIDs_with_field_value_in_range(self, recID1, recID2, tag, value):
+        """Returns set of record IDs from 'recID1' to 'recID2' having
+           the MARC-21 'tag' field of value 'value'."""
+        bibXXx = "bib" + tag[0] + tag[1] + "x"
+        bibrec_bibXXx = "bibrec_" + bibXXx
+        query = """SELECT bb.id_bibrec,b.value FROM %s AS b, %s AS bb
+                WHERE bb.id_bibrec BETWEEN %%s AND %%s AND bb.id_bibxxx=b.id
+                AND tag LIKE %%s""" % (bibXXx, bibrec_bibXXx)
+        res = run_sql(query, (recID1, recID2, tag))
+        return intbitset([row[0] for row in res if row[1] == value])
+
     def clean(self):
         "Cleans the words table."
         self.value = {}
@@ -866,10 +930,18 @@ class WordTable:
         nb_words_total = len(self.value)
         nb_words_report = int(nb_words_total / 10.0)
         nb_words_done = 0
-        for word in self.value.keys():
-            self.put_word_into_db(word)
-            nb_words_done += 1
-            if nb_words_report != 0 and ((nb_words_done % nb_words_report) == 0):
+        words = self.value.keys()
+        chunk_size = max(CFG_BIBINDEX_FLUSH_CHUNK_SIZE, 1)
+        for i in xrange(0, nb_words_total, chunk_size):
+            words_chunk = words[i:i + chunk_size]
+            if len(words_chunk) > 1:
+                self.put_words_into_db(words_chunk)
+            else:
+                self.put_word_into_db(words_chunk[0])
+            nb_words_done_before = nb_words_done
+            nb_words_done += len(words_chunk)
+            if nb_words_report != 0 and \
+                   (nb_words_done / nb_words_report) > (nb_words_done_before / nb_words_report):
                 write_message('......processed %d/%d words' % (nb_words_done, nb_words_total))
                 task_update_progress("%s flushed %d/%d words" % (self.tablename, nb_words_done, nb_words_total))
         write_message('...updating %d words into %s ended' % \
@@ -957,6 +1029,93 @@ class WordTable:
 
         del self.value[word]
 
+    def put_words_into_db(self, words):
+        """Flush WORDS to the database and delete them from memory.
+        Does the same as calling put_word_into_db() for every word,
+        but reads old hitlists of all the words in one query and
+        writes the changed hitlists back in one multi-row query that
+        inserts the new terms and updates the existing ones.  The
+        phrase tables have no unique key on terms, so their existing
+        terms are updated one by one and only the new terms are
+        inserted together."""
+        tablename = wash_table_column_name(self.tablename)
+        chunk = dict.fromkeys(words)
+        # the table collation may consider several words of the chunk
+        # as the same term (e.g. `Ecole' and `école'), so let us be
+        # careful and flush them word by word:
+        collation_keys = {}
+        for word in words:
+            collation_keys[strip_accents(word).lower().rstrip(' ')] = None
+        if len(collation_keys) < len(chunk):
+            write_message("......... falling back to word by word flush for collation-equal words", verbose=9)
+            for word in words:
+                self.put_word_into_db(word)
+            return
+        # load old hitlists of all the words:
+        query = "SELECT term,hitlist FROM %s WHERE term IN (%s)" % \
+                (tablename, ','.join(['%s'] * len(words))) # kwalitee: disable=sql
+        old_sets = {}
+        for term, hitlist in run_sql(query, tuple(words)):
+            if not chunk.has_key(term) or old_sets.has_key(term):
+                # the table collation made the database return a
+                # differently spelled term, or the term is stored
+                # twice, so let us be careful and flush words one by
+                # one
+                write_message("......... falling back to word by word flush for ``%s''" % term, verbose=9)
+                for word in words:
+                    self.put_word_into_db(word)
+                return
+            old_sets[term] = intbitset(hitlist)
+        # merge them with the word recIDs found in memory:
+        rows_to_update = []
+        rows_to_insert = []
+        words_to_delete = []
+        for word in words:
+            set = old_sets.get(word)
+            if set is not None: # merge the word recIDs found in memory:
+                if self.merge_with_old_recIDs(word, set):
+                    write_message("......... updating hitlist for ``%s''" % word, verbose=9)
+                    if set:
+                        rows_to_update.append((set.fastdump(), word))
+                else:
+                    write_message("......... unchanged hitlist for ``%s''" % word, verbose=9)
+            else: # the word is new, will create new set:
+                write_message("......... inserting hitlist for ``%s''" % word, verbose=9)
+                set = intbitset(self.value[word].keys())
+                if set:
+                    rows_to_insert.append((word, set.fastdump()))
+            if not set: # never store empty words
+                words_to_delete.append(word)
+        # write changed hitlists back; the phrase tables have no unique
+        # key on terms, so their existing terms are updated in place
+        # rather than upserted:
+        try:
+            if tablename.startswith('idxPHRASE'):
+                if rows_to_update:
+                    run_sql_many("UPDATE %s SET hitlist=%%s WHERE term=%%s" % tablename,
+                                 rows_to_update, limit=len(rows_to_update)) # kwalitee: disable=sql
+                if rows_to_insert:
+                    run_sql_many("INSERT INTO %s (term, hitlist) VALUES (%%s, %%s)" % tablename,
+                                 rows_to_insert, limit=len(rows_to_insert)) # kwalitee: disable=sql
+            else:
+                rows_to_write = rows_to_insert + [(word, hitlist) for hitlist, word in rows_to_update]
+                if rows_to_write:
+                    run_sql_many("INSERT INTO %s (term, hitlist) VALUES (%%s, %%s) ON DUPLICATE KEY UPDATE hitlist=VALUES(hitlist)" % tablename,
+                                 rows_to_write, limit=len(rows_to_write)) # kwalitee: disable=sql
+            if words_to_delete:
+                run_sql("DELETE FROM %s WHERE term IN (%s)" % \
+                        (tablename, ','.join(['%s'] * len(words_to_delete))),
+                        tuple(words_to_delete)) # kwalitee: disable=sql
+        except Exception, e:
+            ## We send this exception to the admin only when is not
+            ## already reparing the problem.
+            register_exception(prefix="Error when putting %d terms into db, flushing them one by one: %s\n" % (len(words), e), alert_admin=(task_get_option('cmd') != 'repair'))
+            for word in words:
+                self.put_word_into_db(word)
+            return
+        for word in words:
+            del self.value[word]
+
     def display(self):
         "Displays the word table."
         keys = self.value.keys()
@@ -995,8 +1154,12 @@ class WordTable:
         """Fetches records which id in the recIDs range list and adds
         them to the wordTable.  The recIDs range list is of the form:
         [[i1_low,i1_high],[i2_low,i2_high], ..., [iN_low,iN_high]].
+        When the 'parallel' task option asks for more than one
+        process, the words of the records are extracted by a pool of
+        worker processes, while this process remains the only one
+        writing to the word tables.
         """
-        global chunksize, _last_word_table
+        global chunksize, _last_word_table, _tokenizing_word_table
         flush_count = 0
         records_done = 0
         records_to_go = 0
@@ -1004,47 +1167,82 @@ class WordTable:
         for arange in recIDs:
             records_to_go = records_to_go + arange[1] - arange[0] + 1
 
-        time_started = time.time() # will measure profile time
+        # calculate chunk groups of recIDs, remembering after which
+        # ones the word table has to be flushed:
+        chunks = []
         for arange in recIDs:
             i_low = arange[0]
             chunksize_count = 0
             while i_low <= arange[1]:
-                task_sleep_now_if_required()
-                # calculate chunk group of recIDs and treat it:
                 i_high = min(i_low + opt_flush - flush_count - 1, arange[1])
                 i_high = min(i_low + chunksize - chunksize_count - 1, i_high)
-                try:
-                    self.chk_recID_range(i_low, i_high)
-                except StandardError, e:
-                    write_message("Exception caught: %s" % e, sys.stderr)
-                    register_exception(alert_admin=True)
-                    task_update_status("ERROR")
-                    self.put_into_db()
-                    sys.exit(1)
-                write_message("%s adding records #%d-#%d started" % \
-                        (self.tablename, i_low, i_high))
-                if CFG_CHECK_MYSQL_THREADS:
-                    kill_sleepy_mysql_threads()
-                task_update_progress("%s adding recs %d-%d" % (self.tablename, i_low, i_high))
-                self.del_recID_range(i_low, i_high)
-                just_processed = self.add_recID_range(i_low, i_high)
                 flush_count = flush_count + i_high - i_low + 1
                 chunksize_count = chunksize_count + i_high - i_low + 1
-                records_done = records_done + just_processed
-                write_message("%s adding records #%d-#%d ended  " % \
-                        (self.tablename, i_low, i_high))
-
                 if chunksize_count >= chunksize:
                     chunksize_count = 0
-                # flush if necessary:
+                chunks.append((i_low, i_high, flush_count >= opt_flush))
                 if flush_count >= opt_flush:
-                    self.put_into_db()
-                    self.clean()
-                    write_message("%s backing up" % (self.tablename))
                     flush_count = 0
-                    self.log_progress(time_started, records_done, records_to_go)
-                # iterate:
                 i_low = i_high + 1
+
+        nb_processes = task_get_option("parallel") or 1
+        pool = None
+        if nb_processes > 1 and len(chunks) > 1:
+            import multiprocessing
+            _tokenizing_word_table = self
+            pool = multiprocessing.Pool(nb_processes)
+            write_message("%s tokenizing records in %d processes" % \
+                    (self.tablename, nb_processes))
+
+        time_started = time.time() # will measure profile time
+        flush_count = 0
+        try:
+            # treat chunks in batches, so that only the word lists of
+            # a bounded number of chunks are held in memory at once:
+            batch_size = max(2 * nb_processes, 1)
+            for batch_start in range(0, len(chunks), batch_size):
+                batch = chunks[batch_start:batch_start + batch_size]
+                if pool is not None:
+                    wlists = pool.map_async(_get_words_from_recID_range,
+                                            [(i_low, i_high) for (i_low, i_high, dummy) in batch]).get()
+                else:
+                    wlists = [None] * len(batch)
+                for (i_low, i_high, flush_after), wlist in zip(batch, wlists):
+                    task_sleep_now_if_required()
+                    try:
+                        self.chk_recID_range(i_low, i_high)
+                    except StandardError, e:
+                        write_message("Exception caught: %s" % e, sys.stderr)
+                        register_exception(alert_admin=True)
+                        task_update_status("ERROR")
+                        self.put_into_db()
+                        sys.exit(1)
+                    write_message("%s adding records #%d-#%d started" % \
+                            (self.tablename, i_low, i_high))
+                    if CFG_CHECK_MYSQL_THREADS:
+                        kill_sleepy_mysql_threads()
+                    task_update_progress("%s adding recs %d-%d" % (self.tablename, i_low, i_high))
+                    self.del_recID_range(i_low, i_high)
+                    just_processed = self.add_recID_range(i_low, i_high, wlist)
+                    flush_count = flush_count + i_high - i_low + 1
+                    records_done = records_done + just_processed
+                    write_message("%s adding records #%d-#%d ended  " % \
+                            (self.tablename, i_low, i_high))
+                    # flush if necessary:
+                    if flush_after:
+                        self.put_into_db()
+                        self.clean()
+                        write_message("%s backing up" % (self.tablename))
+                        flush_count = 0
+                        self.log_progress(time_started, records_done, records_to_go)
+        except:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+            raise
+        if pool is not None:
+            pool.close()
+            pool.join()
         if flush_count > 0:
             self.put_into_db()
             self.log_progress(time_started, records_done, records_to_go)
@@ -1100,33 +1298,65 @@ class WordTable:
             else:
                 self.add_recIDs(alist, opt_flush)
 
-    def add_recID_range(self, recID1, recID2):
-        """Add records from RECID1 to RECID2."""
-        wlist = {}
+    def add_recID_range(self, recID1, recID2, wlist=None):
+        """Add records from RECID1 to RECID2.  WLIST, if given, holds
+        the words of these records as computed by
+        get_words_from_recID_range(), e.g. in a worker process."""
         self.recIDs_in_mem.append([recID1, recID2])
+        if wlist is None:
+            wlist = self.get_words_from_recID_range(recID1, recID2)
+
+        # were there some words for these recIDs found?
+        if len(wlist) == 0: return 0
+        recIDs = wlist.keys()
+
+        # put words into reverse index table with FUTURE status:
+        run_sql_many("INSERT INTO %sR (id_bibrec,termlist,type) VALUES (%%s,%%s,'FUTURE')" % wash_table_column_name(self.tablename[:-1]),
+                     [(recID, serialize_via_marshal(wlist[recID])) for recID in recIDs]) # kwalitee: disable=sql
+        # ... and, for new records, enter the CURRENT status as empty
+        # (already existing records are silently ignored):
+        run_sql_many("INSERT IGNORE INTO %sR (id_bibrec,termlist,type) VALUES (%%s,%%s,'CURRENT')" % wash_table_column_name(self.tablename[:-1]),
+                     [(recID, serialize_via_marshal([])) for recID in recIDs]) # kwalitee: disable=sql
+
+        # put words into memory word list:
+        put = self.put
+        for recID in recIDs:
+            for w in wlist[recID]:
+                put(recID, w, 1)
+
+        return len(recIDs)
+
+    def get_words_from_recID_range(self, recID1, recID2):
+        """Return dictionary {recID: list of words} of records from
+        RECID1 to RECID2.  Neither the database nor the words table
+        are modified, so that this can be run in worker processes."""
+        wlist = {}
         # special case of author indexes where we also add author
         # canonical IDs:
         if self.index_name in ('author', 'firstauthor', 'exactauthor', 'exactfirstauthor'):
+            author_canonical_ids = get_author_canonical_ids_for_recid_range(recID1, recID2)
             for recID in range(recID1, recID2 + 1):
                 if not wlist.has_key(recID):
                     wlist[recID] = []
-                wlist[recID] = list_union(get_author_canonical_ids_for_recid(recID),
+                wlist[recID] = list_union(author_canonical_ids.get(recID, []),
                                           wlist[recID])
         # special case of journal index:
         if self.fields_to_index == [CFG_JOURNAL_TAG]:
             # FIXME: quick hack for the journal index; a special
             # treatment where we need to associate more than one
             # subfield into indexed term
+            journal_words = get_words_from_journal_tag_for_recid_range(recID1, recID2, self.fields_to_index[0])
             for recID in range(recID1, recID2 + 1):
-                new_words = get_words_from_journal_tag(recID, self.fields_to_index[0])
+                new_words = journal_words.get(recID, [])
                 if not wlist.has_key(recID):
                     wlist[recID] = []
                 wlist[recID] = list_union(new_words, wlist[recID])
         elif self.index_name in ('authorcount',):
             # FIXME: quick hack for the authorcount index; we have to
             # count the number of author fields only
+            field_counts = get_field_count_for_recid_range(recID1, recID2, self.fields_to_index)
             for recID in range(recID1, recID2 + 1):
-                new_words = [str(get_field_count(recID, self.fields_to_index)),]
+                new_words = [str(field_counts.get(recID, 0)),]
                 if not wlist.has_key(recID):
                     wlist[recID] = []
                 wlist[recID] = list_union(new_words, wlist[recID])
@@ -1144,7 +1374,7 @@ class WordTable:
                     ## FIXME: Quick hack to be sure that hidden files are
                     ## actually indexed.
                     res = set(res)
-                    for recid in xrange(int(recID1), int(recID2) + 1):
+                    for recid in get_recIDs_with_documents_in_recid_range(recID1, recID2):
                         for bibdocfile in BibRecDocs(recid).list_latest_files():
                             res.add((recid, bibdocfile.get_url()))
                 for row in res:
@@ -1156,7 +1386,7 @@ class WordTable:
 
         # lookup index-time synonyms:
         if CFG_BIBINDEX_SYNONYM_KBRS.has_key(self.index_name):
-            if len(wlist) == 0: return 0
+            if len(wlist) == 0: return wlist
             recIDs = wlist.keys()
             for recID in recIDs:
                 for word in wlist[recID]:
@@ -1167,32 +1397,15 @@ class WordTable:
                         wlist[recID] = list_union(word_synonyms, wlist[recID])
 
         # were there some words for these recIDs found?
-        if len(wlist) == 0: return 0
-        recIDs = wlist.keys()
-        for recID in recIDs:
+        if len(wlist) == 0: return wlist
+        deleted_recIDs = self.get_recIDs_with_field_value_in_range(recID1, recID2, "980__c", "DELETED")
+        for recID in wlist.keys():
             # was this record marked as deleted?
-            if "DELETED" in self.get_field(recID, "980__c"):
+            if recID in deleted_recIDs:
                 wlist[recID] = []
                 write_message("... record %d was declared deleted, removing its word list" % recID, verbose=9)
             write_message("... record %d, termlist: %s" % (recID, wlist[recID]), verbose=9)
-
-        # put words into reverse index table with FUTURE status:
-        for recID in recIDs:
-            run_sql("INSERT INTO %sR (id_bibrec,termlist,type) VALUES (%%s,%%s,'FUTURE')" % wash_table_column_name(self.tablename[:-1]), (recID, serialize_via_marshal(wlist[recID]))) # kwalitee: disable=sql
-            # ... and, for new records, enter the CURRENT status as empty:
-            try:
-                run_sql("INSERT INTO %sR (id_bibrec,termlist,type) VALUES (%%s,%%s,'CURRENT')" % wash_table_column_name(self.tablename[:-1]), (recID, serialize_via_marshal([]))) # kwalitee: disable=sql
-            except DatabaseError:
-                # okay, it's an already existing record, no problem
-                pass
-
-        # put words into memory word list:
-        put = self.put
-        for recID in recIDs:
-            for w in wlist[recID]:
-                put(recID, w, 1)
-
-        return len(recIDs)
+        return wlist
 
     def log_progress(self, start, done, todo):
         """Calculate progress and store it.
@@ -1445,6 +1658,11 @@ class WordTable:
             write_message("EMERGENCY: " + error_message, stream=sys.stderr)
             raise StandardError, error_message
 
+def _get_words_from_recID_range(recid_range):
+    """Return the words of records in RECID_RANGE for the word table
+    being tokenized.  Run by the worker processes of add_recIDs()."""
+    return _tokenizing_word_table.get_words_from_recID_range(recid_range[0], recid_range[1])
+
 def main():
     """Main that construct all the bibtask."""
     task_init(authorization_action='runbibindex',
@@ -1468,6 +1686,7 @@ def main():
   -w, --windex=w1[,w2]\tword/phrase indexes to consider (all)
   -M, --maxmem=XXX\tmaximum memory usage in kB (no limit)
   -f, --flush=NNN\t\tfull consistent table flush after NNN records (10000)
+  --parallel=N\t\textract words of records in N processes (1)
 """,
             version=__revision__,
             specific_params=("adi:m:c:w:krRM:f:", [
@@ -1482,6 +1701,7 @@ def main():
                 "reindex",
                 "maxmem=",
                 "flush=",
+                "parallel=",
             ]),
             task_stop_helper_fnc=task_stop_table_close_fnc,
             task_submit_elaborate_specific_parameter_fnc=task_submit_elaborate_specific_parameter,
@@ -1534,6 +1754,10 @@ def task_submit_elaborate_specific_parameter(key, value, opts, args):
                 (base_process_size + 1000)
     elif key in ("-f", "--flush"):
         task_set_option("flush", int(value))
+    elif key in ("--parallel",):
+        task_set_option("parallel", int(value))
+        if task_get_option("parallel") < 1:
+            raise StandardError, "Number of processes should be at least 1"
     else:
         return False
     return True
@@ -35,3 +35,9 @@ CFG_MAX_MYSQL_THREADS = 50 # how many threads (connections) we
                            # consider as still safe
 CFG_MYSQL_THREAD_TIMEOUT = 20 # we'll kill threads that were sleeping
                               # for more than X seconds
+
+## how many words are flushed into the words tables at once?  (Their
+## hitlists are read in one query and written back in one multi-row
+## query, so watch out for MySQL max_allowed_packet.)  Put 1 to flush
+## word by word.
+CFG_BIBINDEX_FLUSH_CHUNK_SIZE = 500
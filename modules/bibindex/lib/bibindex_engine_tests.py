@@ -25,6 +25,8 @@ __revision__ = \
 import unittest
 
 from invenio import bibindex_engine
+from invenio.intbitset import intbitset
+from invenio.textutils import strip_accents
 from invenio.testutils import make_test_suite, run_test_suite
 
 
@@ -150,11 +152,141 @@ class TestGetAuthorFamilyNameWords(unittest.TestCase):
           bibindex_engine.get_author_family_name_words_from_phrase('Campbell-Wilson, D'))
 
 
+class FakePhraseTable:
+    """Phrase table without unique key on terms, whose terms are
+    compared with an accent and case insensitive collation."""
+
+    def __init__(self, rows):
+        self.rows = [[term, intbitset(recids).fastdump()] for term, recids in rows]
+        self.queries = []
+
+    def _collate(self, term):
+        """Return the collation key of TERM."""
+        return strip_accents(term).lower()
+
+    def _matching_rows(self, terms):
+        """Return the rows whose term is collation-equal to one of TERMS."""
+        keys = [self._collate(term) for term in terms]
+        return [row for row in self.rows if self._collate(row[0]) in keys]
+
+    def run_sql(self, query, params=(), *dummy_args, **dummy_kwargs):
+        """Run the few queries of the word table flush."""
+        if query.startswith("SELECT term,hitlist"):
+            return tuple([tuple(row) for row in self._matching_rows(params)])
+        elif query.startswith("SELECT hitlist"):
+            return tuple([(row[1],) for row in self._matching_rows(params)])
+        elif query.startswith("UPDATE"):
+            for row in self._matching_rows(params[1:]):
+                row[1] = params[0]
+        elif query.startswith("INSERT"):
+            self.rows.append(list(params))
+        elif query.startswith("DELETE"):
+            matching_rows = self._matching_rows(params)
+            self.rows = [row for row in self.rows if row not in matching_rows]
+        return ()
+
+    def run_sql_many(self, query, params, limit=None):
+        """Run QUERY once for every tuple of PARAMS."""
+        self.queries.append(query.split()[0])
+        for param in params:
+            self.run_sql(query, param)
+
+    def get_rows(self):
+        """Return the rows as (term, list of recIDs)."""
+        return [(term, list(intbitset(hitlist))) for term, hitlist in self.rows]
+
+
+class FakeWordTable(FakePhraseTable):
+    """Word table with a unique key on terms."""
+
+    def run_sql(self, query, params=(), *dummy_args, **dummy_kwargs):
+        """Run the few queries of the word table flush."""
+        if query.endswith("ON DUPLICATE KEY UPDATE hitlist=VALUES(hitlist)"):
+            matching_rows = self._matching_rows(params[:1])
+            if matching_rows:
+                matching_rows[0][1] = params[1]
+            else:
+                self.rows.append(list(params))
+            return ()
+        return FakePhraseTable.run_sql(self, query, params)
+
+
+class TestWordTableFlush(unittest.TestCase):
+    """Test flushing chunks of words to the word tables."""
+
+    def setUp(self):
+        # pylint: disable=C0103
+        """Replace the database by a fake phrase table"""
+        self.saved_functions = (bibindex_engine.run_sql,
+                                bibindex_engine.run_sql_many,
+                                bibindex_engine.get_index_stemming_language)
+        bibindex_engine.get_index_stemming_language = lambda index_id: ''
+
+    def tearDown(self):
+        # pylint: disable=C0103
+        """Restore the database"""
+        (bibindex_engine.run_sql,
+         bibindex_engine.run_sql_many,
+         bibindex_engine.get_index_stemming_language) = self.saved_functions
+
+    def _create_word_table(self, rows, value, table_class=FakePhraseTable,
+                           table_name_pattern='idxPHRASE%02dF'):
+        """Return a WordTable holding VALUE in memory, flushed to a fake
+        table (a phrase table by default) containing ROWS."""
+        self.database = table_class(rows)
+        bibindex_engine.run_sql = self.database.run_sql
+        bibindex_engine.run_sql_many = self.database.run_sql_many
+        table = bibindex_engine.WordTable('title', 8, [], table_name_pattern,
+                                          None, {})
+        table.value = value
+        return table
+
+    def test_existing_terms_updated_in_place(self):
+        """bibindex engine - flushing existing phrases without duplicating them"""
+        table = self._create_word_table([('ellis', [1]), ('muon', [5])],
+                                        {'ellis': {2: 1}, 'muon': {5: -1},
+                                         'higgs': {3: 1}})
+        table.put_words_into_db(['ellis', 'muon', 'higgs'])
+        self.assertEqual([('ellis', [1, 2]), ('higgs', [3])],
+                         self.database.get_rows())
+        self.assertEqual(['UPDATE', 'INSERT'], self.database.queries)
+        self.assertEqual({}, table.value)
+
+    def test_existing_words_upserted(self):
+        """bibindex engine - flushing new and existing words in one query"""
+        table = self._create_word_table([('ellis', [1]), ('muon', [5])],
+                                        {'ellis': {2: 1}, 'muon': {5: -1},
+                                         'higgs': {3: 1}},
+                                        FakeWordTable, 'idxWORD%02dF')
+        table.put_words_into_db(['ellis', 'muon', 'higgs'])
+        self.assertEqual([('ellis', [1, 2]), ('higgs', [3])],
+                         self.database.get_rows())
+        self.assertEqual(['INSERT'], self.database.queries)
+        self.assertEqual({}, table.value)
+
+    def test_collation_equal_term_in_memory(self):
+        """bibindex engine - flushing a word collation-equal to a stored term"""
+        table = self._create_word_table([('école', [1])],
+                                        {'Ecole': {2: 1}, 'école': {3: 1}})
+        table.put_words_into_db(['Ecole'])
+        self.assertEqual([('école', [1, 2])], self.database.get_rows())
+        self.assertEqual(['école'], table.value.keys())
+
+    def test_collation_equal_words_in_chunk(self):
+        """bibindex engine - flushing collation-equal words together"""
+        table = self._create_word_table([],
+                                        {'Ecole': {1: 1}, 'école': {2: 1}})
+        table.put_words_into_db(['Ecole', 'école'])
+        self.assertEqual([('Ecole', [1, 2])], self.database.get_rows())
+
+
+
 TEST_SUITE = make_test_suite(TestListSetOperations,
                              TestWashIndexTerm,
                              TestGetWordsFromPhrase,
                              TestGetWordsFromDateTag,
-                             TestGetAuthorFamilyNameWords)
+                             TestGetAuthorFamilyNameWords,
+                             TestWordTableFlush)
 
 if __name__ == "__main__":
     run_test_suite(TEST_SUITE)
@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+##
+## This file is part of Invenio.
+## Copyright (C) 2011 CERN.
+##
+## Invenio is free software; you can redistribute it and/or
+## modify it under the terms of the GNU General Public License as
+## published by the Free Software Foundation; either version 2 of the
+## License, or (at your option) any later version.
+##
+## Invenio is distributed in the hope that it will be useful, but
+## WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+## General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with Invenio; if not, write to the Free Software Foundation, Inc.,
+## 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+
+"""
+Compact storage of the citation dictionaries.
+
+A citation dictionary { recid -> [list of recids] } is stored in
+compressed sparse row format: an array of offsets indexed by recid
+followed by the concatenated lists of recids.  The serialized graph
+can be written to CFG_CACHEDIR/citations as a snapshot (see
+snapshotutils) and memory-mapped read-only, so that all the Apache
+processes of the machine share the same pages instead of holding each
+their own copy of the dictionaries.
+"""
+
+__revision__ = "$Id$"
+
+import os
+import struct
+from array import array
+
+from invenio.config import CFG_CACHEDIR
+from invenio.intbitset import intbitset
+from invenio.snapshotutils import get_snapshot_path, open_snapshot, \
+     store_snapshot, load_snapshot
+
+CFG_BIBRANK_CITATION_GRAPH_DIR = os.path.join(CFG_CACHEDIR, 'citations')
+
+# magic, number of offsets - 1, number of recids, size of the keys
+_HEADER_FORMAT = '=4siii'
+_HEADER_SIZE = struct.calcsize(_HEADER_FORMAT)
+_MAGIC = 'CSR1'
+_ITEMSIZE = array('i').itemsize
+
+def serialize_citation_graph(citation_dict):
+    """
+    Return the serialized CSR form of CITATION_DICT, a dictionary
+    { recid -> [list of recids] }.  Records present with an empty list
+    are kept, so that the dictionary keys are preserved.
+    """
+    keys = intbitset(citation_dict.keys())
+    nb_nodes = 0
+    if keys:
+        nb_nodes = max(citation_dict.keys()) + 1
+    offsets = array('i', [0]) * (nb_nodes + 1)
+    recids = array('i')
+    previous_recid = -1
+    for recid in keys:
+        for i in xrange(previous_recid + 1, recid + 1):
+            offsets[i] = len(recids)
+        recids.extend(citation_dict[recid])
+        previous_recid = recid
+    offsets[nb_nodes] = len(recids)
+    keys_dump = keys.fastdump()
+    header = struct.pack(_HEADER_FORMAT, _MAGIC, nb_nodes, len(recids),
+                         len(keys_dump))
+    return header + offsets.tostring() + recids.tostring() + keys_dump
+
+class CitationGraph:
+    """
+    Dictionary-like view { recid -> [list of recids] } of a citation
+    dictionary serialized by serialize_citation_graph().  The data may
+    be a string or a memory-mapped file (stored in PATH); the lists of
+    recids are only unpacked when they are asked for.  The serialized
+    data is never modified: the updates of single records, see
+    update(), are kept in memory on top of it.
+    """
+    def __init__(self, data, path=None):
+        self.data = data
+        self.path = path
+        (magic, self.nb_nodes, self.nb_recids, keys_size) = \
+                struct.unpack(_HEADER_FORMAT, data[:_HEADER_SIZE])
+        if magic != _MAGIC:
+            raise ValueError, "not a serialized citation graph"
+        self.offsets_start = _HEADER_SIZE
+        self.recids_start = self.offsets_start + \
+                            (self.nb_nodes + 1) * _ITEMSIZE
+        keys_start = self.recids_start + self.nb_recids * _ITEMSIZE
+        self.keyset = intbitset(data[keys_start:keys_start + keys_size])
+        self.updates = {}
+
+    def _get_offsets(self, recid):
+        """Return the start and end offsets of RECID's list."""
+        start = self.offsets_start + recid * _ITEMSIZE
+        offsets = array('i')
+        offsets.fromstring(self.data[start:start + 2 * _ITEMSIZE])
+        return offsets[0], offsets[1]
+
+    def _is_key(self, recid):
+        """Is RECID a key of the dictionary?"""
+        try:
+            return recid in self.keyset
+        except (TypeError, OverflowError):
+            return False
+
+    def update(self, recid, recids):
+        """Replace the list of recids of RECID by RECIDS, or remove
+        RECID from the dictionary if RECIDS is None."""
+        self.updates[recid] = recids
+        if recids is None:
+            self.keyset.discard(recid)
+        else:
+            self.keyset.add(recid)
+
+    def get_degree(self, recid):
+        """Return the length of RECID's list, without unpacking it."""
+        if not self._is_key(recid):
+            return 0
+        if self.updates.has_key(recid):
+            return len(self.updates[recid])
+        start, end = self._get_offsets(recid)
+        return end - start
+
+    def get(self, recid, default=None):
+        """Return the list of recids of RECID, or DEFAULT."""
+        if not self._is_key(recid):
+            return default
+        if self.updates.has_key(recid):
+            return list(self.updates[recid])
+        start, end = self._get_offsets(recid)
+        recids = array('i')
+        recids.fromstring(self.data[self.recids_start + start * _ITEMSIZE:
+                                    self.recids_start + end * _ITEMSIZE])
+        return recids.tolist()
+
+    def __getitem__(self, recid):
+        if not self._is_key(recid):
+            raise KeyError, recid
+        return self.get(recid)
+
+    def has_key(self, recid):
+        return self._is_key(recid)
+
+    __contains__ = has_key
+
+    def __len__(self):
+        return len(self.keyset)
+
+    def __iter__(self):
+        return iter(self.keyset)
+
+    iterkeys = __iter__
+
+    def keys(self):
+        return list(self.keyset)
+
+    def iteritems(self):
+        for recid in self.keyset:
+            yield recid, self.get(recid)
+
+    def items(self):
+        return list(self.iteritems())
+
+    def itervalues(self):
+        for recid in self.keyset:
+            yield self.get(recid)
+
+    def values(self):
+        return list(self.itervalues())
+
+def get_citation_graph_path(name, timestamp):
+    """Return the path of the file storing the citation dictionary NAME
+    as of TIMESTAMP (e.g. '2011-10-12 10:10:10')."""
+    return get_snapshot_path(CFG_BIBRANK_CITATION_GRAPH_DIR, name, timestamp,
+                             'csr')
+
+def open_citation_graph(path):
+    """Return the CitationGraph stored in PATH, memory-mapped
+    read-only, or None if the file does not exist or is invalid."""
+    return open_snapshot(path, CitationGraph)
+
+def store_citation_graph(path, data):
+    """Atomically write the serialized citation graph DATA to PATH and
+    remove the files of older versions of the same dictionary."""
+    store_snapshot(path, data)
+
+def load_citation_graph(name, timestamp, citation_dict_loader):
+    """
+    Return the citation dictionary NAME as of TIMESTAMP as a
+    CitationGraph.  Use the memory-mapped file if a process has
+    already stored it, otherwise get the dictionary by calling
+    CITATION_DICT_LOADER() and store it for the other processes.  If
+    the file cannot be written, the graph is kept in memory.
+    """
+    return load_snapshot(get_citation_graph_path(name, timestamp),
+                         CitationGraph,
+                         lambda: serialize_citation_graph(citation_dict_loader()))
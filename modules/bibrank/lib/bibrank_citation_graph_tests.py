@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+##
+## This file is part of Invenio.
+## Copyright (C) 2011 CERN.
+##
+## Invenio is free software; you can redistribute it and/or
+## modify it under the terms of the GNU General Public License as
+## published by the Free Software Foundation; either version 2 of the
+## License, or (at your option) any later version.
+##
+## Invenio is distributed in the hope that it will be useful, but
+## WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+## General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with Invenio; if not, write to the Free Software Foundation, Inc.,
+## 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+
+"""Unit tests for the compact citation graph storage."""
+
+__revision__ = "$Id$"
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from invenio.testutils import make_test_suite, run_test_suite
+from invenio.bibrank_citation_graph import CitationGraph, \
+     serialize_citation_graph, store_citation_graph, open_citation_graph, \
+     get_citation_graph_path
+
+class TestCitationGraph(unittest.TestCase):
+    """Test the dictionary interface of the citation graph."""
+
+    def setUp(self):
+        # pylint: disable=C0103
+        """Initialize stuff"""
+        self.citation_dict = {1: [7, 3, 5], 3: [], 4: [1], 10: [2, 4, 8, 9]}
+        self.graph = CitationGraph(serialize_citation_graph(self.citation_dict))
+
+    def test_get(self):
+        """bibrank citation graph - getting lists of recids"""
+        for recid, recids in self.citation_dict.iteritems():
+            self.assertEqual(recids, self.graph.get(recid))
+            self.assertEqual(recids, self.graph[recid])
+        self.assertEqual([], self.graph.get(2, []))
+        self.assertEqual(None, self.graph.get(11))
+        self.assertEqual(None, self.graph.get(-1))
+        self.assertRaises(KeyError, self.graph.__getitem__, 5)
+
+    def test_keys(self):
+        """bibrank citation graph - keys of the dictionary"""
+        self.assertEqual([1, 3, 4, 10], self.graph.keys())
+        self.assertEqual(4, len(self.graph))
+        self.assert_(self.graph.has_key(3))
+        self.assert_(3 in self.graph)
+        self.failIf(self.graph.has_key(2))
+        self.assertEqual(self.citation_dict, dict(self.graph.items()))
+
+    def test_get_degree(self):
+        """bibrank citation graph - length of the lists of recids"""
+        self.assertEqual(3, self.graph.get_degree(1))
+        self.assertEqual(0, self.graph.get_degree(3))
+        self.assertEqual(0, self.graph.get_degree(2))
+        self.assertEqual(4, self.graph.get_degree(10))
+
+    def test_update(self):
+        """bibrank citation graph - updating single records"""
+        self.graph.update(3, [4, 10])
+        self.graph.update(4, None)
+        self.graph.update(12, [1])
+        self.assertEqual([4, 10], self.graph.get(3))
+        self.assertEqual(2, self.graph.get_degree(3))
+        self.assertEqual(None, self.graph.get(4))
+        self.assertEqual(0, self.graph.get_degree(4))
+        self.assertEqual([1], self.graph[12])
+        self.assertEqual([1, 3, 10, 12], self.graph.keys())
+
+    def test_empty_graph(self):
+        """bibrank citation graph - empty dictionary"""
+        graph = CitationGraph(serialize_citation_graph({}))
+        self.assertEqual(0, len(graph))
+        self.assertEqual([], graph.get(1, []))
+
+    def test_invalid_data(self):
+        """bibrank citation graph - refusing data that is not a graph"""
+        self.assertRaises(ValueError, CitationGraph, 'x' * 64)
+
+class TestCitationGraphFiles(unittest.TestCase):
+    """Test storing and memory-mapping citation graphs."""
+
+    def setUp(self):
+        # pylint: disable=C0103
+        """Initialize stuff"""
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        # pylint: disable=C0103
+        """Remove temporary files"""
+        shutil.rmtree(self.directory)
+
+    def test_store_and_open(self):
+        """bibrank citation graph - memory-mapping a stored graph"""
+        path = os.path.join(self.directory, 'citationdict_20111012101010.csr')
+        citation_dict = {2: [1], 5: [2, 3]}
+        store_citation_graph(path, serialize_citation_graph(citation_dict))
+        graph = open_citation_graph(path)
+        self.assertEqual(citation_dict, dict(graph.items()))
+
+    def test_store_removes_older_versions(self):
+        """bibrank citation graph - removing outdated graph files"""
+        old_path = os.path.join(self.directory, 'citationdict_20111012101010.csr')
+        other_path = os.path.join(self.directory, 'reversedict_20111012101010.csr')
+        new_path = os.path.join(self.directory, 'citationdict_20111013101010.csr')
+        data = serialize_citation_graph({1: [2]})
+        store_citation_graph(old_path, data)
+        store_citation_graph(other_path, data)
+        store_citation_graph(new_path, data)
+        self.assertEqual(['citationdict_20111013101010.csr',
+                          'reversedict_20111012101010.csr'],
+                         sorted(os.listdir(self.directory)))
+
+    def test_open_missing_file(self):
+        """bibrank citation graph - opening a graph that is not stored"""
+        self.assertEqual(None, open_citation_graph(os.path.join(self.directory, 'foo.csr')))
+
+    def test_get_citation_graph_path(self):
+        """bibrank citation graph - path depends on the timestamp"""
+        self.assert_(get_citation_graph_path('citationdict', '2011-10-12 10:10:10').endswith('citationdict_20111012101010.csr'))
+
+TEST_SUITE = make_test_suite(TestCitationGraph,
+                             TestCitationGraphFiles,)
+
+if __name__ == "__main__":
+    run_test_suite(TEST_SUITE)
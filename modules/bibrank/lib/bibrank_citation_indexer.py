@@ -30,7 +30,8 @@ if sys.hexversion < 0x2040000:
     from sets import Set as set
     # pylint: enable=W0622
 
-from invenio.dbquery import run_sql, serialize_via_marshal, \
+from invenio.config import CFG_BIBRANK_CITATION_MAX_DELTAS
+from invenio.dbquery import run_sql, run_sql_many, serialize_via_marshal, \
                             deserialize_via_marshal
 from invenio.search_engine import search_pattern, search_unit
 from invenio.search_engine_utils import get_fieldvalues
@@ -40,6 +41,7 @@ from invenio.bibtask import write_message, task_get_option, \
                      task_get_task_param
 from invenio.errorlib import register_exception
 from invenio.intbitset import intbitset
+from invenio.bibrank_citation_searcher import get_citation_dict_from_db
 
 class memoise:
     def __init__(self, function):
@@ -212,18 +214,11 @@ def last_updated_result(rank_method_code):
             dic = deserialize_via_marshal(rdict[0][0])
         except zlib.error:
             return [{}, {}, {}]
-        query = "select object_value from rnkCITATIONDATA where object_name='citationdict'"
-        cit_compressed = run_sql(query)
-        cit = []
-        if cit_compressed and cit_compressed[0] and cit_compressed[0][0]:
-            cit = deserialize_via_marshal(cit_compressed[0][0])
-            if cit:
-                query = """select object_value from rnkCITATIONDATA
-                           where object_name='reversedict'"""
-                ref_compressed = run_sql(query)
-                if ref_compressed and ref_compressed[0] and ref_compressed[0][0]:
-                    ref = deserialize_via_marshal(ref_compressed[0][0])
-                    result = (dic, cit, ref)
+        cit = get_citation_dict_from_db('citationdict')
+        if cit:
+            ref = get_citation_dict_from_db('reversedict')
+            if ref:
+                result = (dic, cit, ref)
     return result
 
 def get_citation_informations(recid_list, config):
@@ -985,41 +980,69 @@ def insert_cit_ref_list_intodb(citation_dic, reference_dic, selfcbdic,
             register_exception(prefix="could not read/write rnkAUTHORDATA aterm="+a+" hitlist="+str(lserarr), alert_admin=True)
 
 def insert_into_cit_db(dic, name):
-    """an aux thing to avoid repeating code"""
+    """Store the citation dictionary DIC under NAME.  Only the records
+       whose list changed since the last run are written, as delta rows
+       of rnkCITATIONDATADELTA.  The whole dictionary is rewritten into
+       rnkCITATIONDATA, and the delta rows deleted, when the citation
+       indexing is run from scratch or when there would be more than
+       CFG_BIBRANK_CITATION_MAX_DELTAS delta rows for NAME."""
     ndate = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
     try:
-        s = serialize_via_marshal(dic)
-        write_message("size of "+name+" "+str(len(s)))
         #check that this column really exists
         testres = run_sql("select object_name from rnkCITATIONDATA where object_name = %s",
                        (name,))
-        if testres:
-            run_sql("UPDATE rnkCITATIONDATA SET object_value = %s where object_name = %s",
-                    (s, name))
+        compact = not testres or task_get_option("quick") == "no"
+        if not compact:
+            changes = get_citation_dict_changes(get_citation_dict_from_db(name), dic)
+            nb_deltas = run_sql("SELECT COUNT(*) FROM rnkCITATIONDATADELTA WHERE object_name=%s",
+                                (name,))[0][0]
+            compact = nb_deltas + len(changes) > CFG_BIBRANK_CITATION_MAX_DELTAS
+        if compact:
+            s = serialize_via_marshal(dic)
+            write_message("size of "+name+" "+str(len(s)))
+            if testres:
+                run_sql("UPDATE rnkCITATIONDATA SET object_value = %s, last_updated = %s where object_name = %s",
+                        (s, ndate, name))
+            else:
+                #there was no entry for name, let's force..
+                run_sql("INSERT INTO rnkCITATIONDATA(object_name,object_value,last_updated) values (%s,%s,%s)",
+                         (name, s, ndate))
+            run_sql("DELETE FROM rnkCITATIONDATADELTA WHERE object_name=%s", (name,))
         else:
-            #there was no entry for name, let's force..
-            run_sql("INSERT INTO rnkCITATIONDATA(object_name,object_value) values (%s,%s)",
-                     (name,s))
-        run_sql("UPDATE rnkCITATIONDATA SET last_updated = %s where object_name = %s",
-               (ndate,name))
+            write_message("number of changed records in "+name+" "+str(len(changes)))
+            rows = []
+            for recid, recids in changes:
+                if recids is not None:
+                    recids = serialize_via_marshal(recids)
+                rows.append((name, recid, recids, ndate))
+            if rows:
+                run_sql_many("INSERT INTO rnkCITATIONDATADELTA(object_name,id_bibrec,object_value,last_updated) VALUES (%s,%s,%s,%s)",
+                             rows)
     except:
         register_exception(prefix="could not write "+name+" into db", alert_admin=True)
 
+def get_citation_dict_changes(old_dic, new_dic):
+    """Return the list of (recid, recids) changes turning the citation
+       dictionary OLD_DIC into NEW_DIC, with recids being None for the
+       records that are not in NEW_DIC any more."""
+    changes = []
+    for recid, recids in new_dic.iteritems():
+        if old_dic.get(recid) != recids:
+            changes.append((recid, recids))
+    for recid in old_dic.iterkeys():
+        if not new_dic.has_key(recid):
+            changes.append((recid, None))
+    changes.sort()
+    return changes
 
 def get_cit_dict(name):
     """get a named citation dict from the db"""
     cdict = {}
     try:
-        cdict = run_sql("select object_value from rnkCITATIONDATA where object_name = %s",
-                       (name,))
-        if cdict and cdict[0] and cdict[0][0]:
-            dict_from_db = deserialize_via_marshal(cdict[0][0])
-            return dict_from_db
-        else:
-            return {}
+        return get_citation_dict_from_db(name)
     except:
         register_exception(prefix="could not read "+name+" from db", alert_admin=True)
-    return dict
+    return cdict
 
 def get_initial_author_dict():
     """read author->citedinlist dict from the db"""
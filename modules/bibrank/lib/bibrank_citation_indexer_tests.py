@@ -22,6 +22,7 @@
 import unittest
 
 from invenio.testutils import make_test_suite, run_test_suite
+from invenio.bibrank_citation_indexer import get_citation_dict_changes
 
 class TestCitationIndexer(unittest.TestCase):
     """Testing citation indexer."""
@@ -29,7 +30,22 @@ class TestCitationIndexer(unittest.TestCase):
     # (and failing); so we are testing nothing here now
     pass
 
-TEST_SUITE = make_test_suite(TestCitationIndexer,)
+class TestCitationDictChanges(unittest.TestCase):
+    """Testing the delta rows of the citation dictionaries."""
+
+    def test_get_citation_dict_changes(self):
+        """bibrank citation indexer - changed records of a citation dictionary"""
+        old_dic = {1: [2, 3], 2: [3], 4: [5]}
+        new_dic = {1: [2, 3], 2: [3, 6], 6: [1]}
+        self.assertEqual([(2, [3, 6]), (4, None), (6, [1])],
+                         get_citation_dict_changes(old_dic, new_dic))
+
+    def test_get_citation_dict_no_changes(self):
+        """bibrank citation indexer - unchanged citation dictionary"""
+        self.assertEqual([], get_citation_dict_changes({1: [2]}, {1: [2]}))
+
+TEST_SUITE = make_test_suite(TestCitationIndexer,
+                             TestCitationDictChanges,)
 
 if __name__ == "__main__":
     run_test_suite(TEST_SUITE)
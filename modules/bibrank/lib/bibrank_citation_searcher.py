@@ -20,38 +20,119 @@
 __revision__ = "$Id$"
 
 import re
+from bisect import bisect_left, bisect_right, insort
 
 from invenio.dbquery import run_sql, get_table_update_time, OperationalError, \
         deserialize_via_marshal
 from invenio.intbitset import intbitset
 from invenio.data_cacher import DataCacher
+from invenio.bibrank_citation_graph import CitationGraph, load_citation_graph
+
+def get_citation_dict_from_db(object_name, apply_deltas=True):
+    """
+    Return the citation dictionary OBJECT_NAME (e.g. citationdict)
+    stored in rnkCITATIONDATA.  Unless APPLY_DELTAS is False, the
+    per-record updates stored in rnkCITATIONDATADELTA since the last
+    compaction of the dictionary are applied to it.
+    """
+    res = run_sql("SELECT object_value FROM rnkCITATIONDATA WHERE object_name=%s",
+                  (object_name,))
+    try:
+        citation_dict = deserialize_via_marshal(res[0][0])
+    except:
+        citation_dict = {}
+    if apply_deltas:
+        for dummy_delta_id, recid, recids in get_citation_dict_deltas(object_name):
+            if recids is None:
+                if citation_dict.has_key(recid):
+                    del citation_dict[recid]
+            else:
+                citation_dict[recid] = recids
+    return citation_dict
+
+def get_citation_dict_deltas(object_name, after_delta_id=0):
+    """
+    Return the list of (delta_id, recid, recids) updates of the
+    citation dictionary OBJECT_NAME stored after AFTER_DELTA_ID, in
+    the order they have to be applied.  RECIDS is the new list of
+    recids of RECID, or None if RECID was removed from the dictionary.
+    """
+    deltas = []
+    res = run_sql("""SELECT id, id_bibrec, object_value FROM rnkCITATIONDATADELTA
+                      WHERE object_name=%s AND id>%s ORDER BY id""",
+                  (object_name, after_delta_id))
+    for delta_id, recid, object_value in res:
+        recids = None
+        if object_value is not None:
+            recids = deserialize_via_marshal(object_value)
+        deltas.append((delta_id, recid, recids))
+    return deltas
 
 class CitationDictsDataCacher(DataCacher):
     """
     Cache holding all citation dictionaries (citationdict,
-    reversedict, selfcitdict, selfcitedbydict).
+    reversedict, selfcitdict, selfcitedbydict).  The dictionaries are
+    CitationGraph objects, memory-mapped from CFG_CACHEDIR/citations
+    and thus shared by all the processes of the machine.  When the
+    citation indexer has only stored some delta rows since the last
+    load, only these are applied to the loaded dictionaries.
     """
     def __init__(self):
+        # object_name -> [base timestamp, graph, last applied delta id]
+        self.citation_graphs = {}
+        def load_citation_dict(object_name, base_timestamp):
+            """Bring the graph of OBJECT_NAME up to date and return it."""
+            state = self.citation_graphs.get(object_name)
+            if state is None or state[0] != base_timestamp:
+                graph = load_citation_graph(object_name, base_timestamp,
+                    lambda: get_citation_dict_from_db(object_name, apply_deltas=False))
+                state = [base_timestamp, graph, 0]
+                self.citation_graphs[object_name] = state
+                if object_name == 'citationdict':
+                    self.citation_count_index = create_citation_count_index(graph)
+            graph = state[1]
+            for delta_id, recid, recids in get_citation_dict_deltas(object_name, state[2]):
+                if object_name == 'citationdict':
+                    old_count = None
+                    if graph.has_key(recid):
+                        old_count = graph.get_degree(recid)
+                    new_count = None
+                    if recids is not None:
+                        new_count = len(recids)
+                    update_citation_count_index(self.citation_count_index,
+                                                recid, old_count, new_count)
+                graph.update(recid, recids)
+                state[2] = delta_id
+            return graph
+        def get_base_timestamps():
+            """Return the list of (object_name, timestamp of its last
+            compaction) of the stored citation dictionaries."""
+            return run_sql("""SELECT object_name, DATE_FORMAT(last_updated, '%Y-%m-%d %H:%i:%s')
+                               FROM rnkCITATIONDATA ORDER BY object_name""")
         def cache_filler():
             alldicts = {}
             try:
-                res = run_sql("SELECT object_name,object_value FROM rnkCITATIONDATA")
+                base_timestamps = get_base_timestamps()
+                # a dictionary compacted while we were reading its delta
+                # rows has to be read again:
+                for dummy_attempt in range(3):
+                    for object_name, base_timestamp in base_timestamps:
+                        alldicts[object_name] = load_citation_dict(object_name, base_timestamp)
+                    new_base_timestamps = get_base_timestamps()
+                    if new_base_timestamps == base_timestamps:
+                        break
+                    base_timestamps = new_base_timestamps
             except OperationalError:
                 # database problems, return empty cache
                 return {}
-            for row in res:
-                object_name = row[0]
-                object_value = row[1]
-                try:
-                    object_value_dict = deserialize_via_marshal(object_value)
-                except:
-                    object_value_dict = {}
-                alldicts[object_name] = object_value_dict
-                if object_name == 'citationdict':
-                    # for cited:M->N queries, it is interesting to cache also
-                    # some preprocessed citationdict:
-                    alldicts['citationdict_keys'] = object_value_dict.keys()
-                    alldicts['citationdict_keys_intbitset'] = intbitset(object_value_dict.keys())
+            if alldicts.has_key('citationdict'):
+                # for cited:M->N queries, it is interesting to cache also
+                # some preprocessed citationdict:
+                alldicts['citationdict_keys_intbitset'] = alldicts['citationdict'].keyset
+                # and the index of records by number of citations,
+                # for cited:N queries:
+                (alldicts['citationdict_counts'],
+                 alldicts['citationdict_count_buckets']) = self.citation_count_index
             return alldicts
         def timestamp_verifier():
             res = run_sql("""SELECT DATE_FORMAT(last_updated, '%Y-%m-%d %H:%i:%s')
@@ -98,15 +179,79 @@ def get_cited_by_count(recordid):
     cache_cited_by_dictionary = get_citation_dict("citationdict")
     return len(cache_cited_by_dictionary.get(recordid, []))
 
+def create_citation_count_index(citationdict):
+    """
+    Build the index of the records of CITATIONDICT by number of
+    citations.
+
+    @param citationdict: { recid -> [list of citing recids] }
+    @type citationdict: dictionary or CitationGraph
+    @return: (counts, buckets) where buckets is { number of citations
+            -> intbitset of recids } and counts is the sorted list of
+            its keys
+    @rtype: tuple
+    """
+    recids_by_count = {}
+    if isinstance(citationdict, CitationGraph):
+        for recid in citationdict:
+            recids_by_count.setdefault(citationdict.get_degree(recid), []).append(recid)
+    else:
+        for recid, citers in citationdict.iteritems():
+            recids_by_count.setdefault(len(citers), []).append(recid)
+    buckets = {}
+    for count, recids in recids_by_count.iteritems():
+        buckets[count] = intbitset(recids)
+    counts = buckets.keys()
+    counts.sort()
+    return (counts, buckets)
+
+def update_citation_count_index(citation_count_index, recid, old_count, new_count):
+    """
+    Move RECID from the bucket of OLD_COUNT citations to the bucket of
+    NEW_COUNT citations of CITATION_COUNT_INDEX, the (counts, buckets)
+    tuple built by create_citation_count_index().  None means that
+    RECID is not in the citation dictionary.
+    """
+    counts, buckets = citation_count_index
+    if old_count == new_count:
+        return
+    if old_count is not None and buckets.has_key(old_count):
+        buckets[old_count].discard(recid)
+        if not buckets[old_count]:
+            del buckets[old_count]
+            counts.remove(old_count)
+    if new_count is not None:
+        if not buckets.has_key(new_count):
+            buckets[new_count] = intbitset()
+            insort(counts, new_count)
+        buckets[new_count].add(recid)
+
+def get_records_in_citation_count_range(counts, buckets, first, last=None):
+    """
+    Return an intbitset of the recids cited between FIRST and LAST
+    times (both included) according to the citation count index
+    (COUNTS, BUCKETS) built by create_citation_count_index().  If LAST
+    is None, there is no upper limit.
+    """
+    start = bisect_left(counts, first)
+    if last is None:
+        stop = len(counts)
+    else:
+        stop = bisect_right(counts, last)
+    matches = intbitset()
+    for count in counts[start:stop]:
+        matches |= buckets[count]
+    return matches
+
 def get_records_with_num_cites(numstr, allrecs = intbitset([])):
     """Return an intbitset of record IDs that are cited X times,
        X defined in numstr.
        Warning: numstr is string and may not be numeric! It can
        be 10,0->100 etc
     """
-    cache_cited_by_dictionary = get_citation_dict("citationdict")
-    cache_cited_by_dictionary_keys = get_citation_dict("citationdict_keys")
     cache_cited_by_dictionary_keys_intbitset = get_citation_dict("citationdict_keys_intbitset")
+    cache_citation_counts = get_citation_dict("citationdict_counts")
+    cache_citation_count_buckets = get_citation_dict("citationdict_count_buckets")
     matches = intbitset([])
     #once again, check that the parameter is a string
     if not (type(numstr) == type("thisisastring")):
@@ -122,11 +267,9 @@ def get_records_with_num_cites(numstr, allrecs = intbitset([])):
         if num == 0:
             #we return recids that are not in keys
             return allrecs - cache_cited_by_dictionary_keys_intbitset
-        for k in cache_cited_by_dictionary_keys:
-            li = cache_cited_by_dictionary[k]
-            if len(li) == num:
-                matches.add(k)
-        return matches
+        return get_records_in_citation_count_range(cache_citation_counts,
+                                                   cache_citation_count_buckets,
+                                                   num, num)
 
     #try to get 1->10 or such
     firstsec = re.findall("(\d+)->(\d+)", numstr)
@@ -142,20 +285,17 @@ def get_records_with_num_cites(numstr, allrecs = intbitset([])):
             #start with those that have no cites..
             matches = allrecs - cache_cited_by_dictionary_keys_intbitset
         if (first <= sec):
-            for k in cache_cited_by_dictionary_keys:
-                li = cache_cited_by_dictionary[k]
-                if len(li) >= first:
-                    if len(li) <= sec:
-                        matches.add(k)
+            matches |= get_records_in_citation_count_range(cache_citation_counts,
+                                                           cache_citation_count_buckets,
+                                                           first, sec)
             return matches
 
     firstsec = re.findall("(\d+)\+", numstr)
     if firstsec:
-        first = firstsec[0]
-        for k in cache_cited_by_dictionary_keys:
-            li = cache_cited_by_dictionary[k]
-            if len(li) > int(first):
-                matches.add(k)
+        first = int(firstsec[0])
+        matches = get_records_in_citation_count_range(cache_citation_counts,
+                                                      cache_citation_count_buckets,
+                                                      first + 1)
     return matches
 
 def get_cited_by_list(recordlist):
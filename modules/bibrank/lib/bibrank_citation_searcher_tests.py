@@ -23,7 +23,10 @@ __revision__ = "$Id$"
 
 import unittest
 
+from invenio.intbitset import intbitset
 from invenio.testutils import make_test_suite, run_test_suite
+from invenio.bibrank_citation_searcher import create_citation_count_index, \
+     get_records_in_citation_count_range, update_citation_count_index
 
 class TestCitationSearcher(unittest.TestCase):
 
@@ -52,7 +55,50 @@ class TestCitationSearcher(unittest.TestCase):
         """bibrank citation searcher - get co-cited-with data"""
         # FIXME: test postponed
 
-TEST_SUITE = make_test_suite(TestCitationSearcher,)
+class TestCitationCountIndex(unittest.TestCase):
+    """Test the index of records by number of citations."""
+
+    def setUp(self):
+        # pylint: disable=C0103
+        """Initialize stuff"""
+        citationdict = {1: [2, 3], 2: [3], 3: [], 4: [1, 2, 3],
+                        5: [1, 6], 6: [2, 3, 4, 5, 7]}
+        self.counts, self.buckets = create_citation_count_index(citationdict)
+
+    def test_create_citation_count_index(self):
+        """bibrank citation searcher - building the citation count index"""
+        self.assertEqual([0, 1, 2, 3, 5], self.counts)
+        self.assertEqual([1, 5], list(self.buckets[2]))
+        self.assertEqual([3], list(self.buckets[0]))
+
+    def test_exact_citation_count(self):
+        """bibrank citation searcher - records cited exactly N times"""
+        self.assertEqual([1, 5], list(get_records_in_citation_count_range(self.counts, self.buckets, 2, 2)))
+        self.assertEqual([], list(get_records_in_citation_count_range(self.counts, self.buckets, 4, 4)))
+
+    def test_citation_count_range(self):
+        """bibrank citation searcher - records cited N to M times"""
+        self.assertEqual([1, 4, 5], list(get_records_in_citation_count_range(self.counts, self.buckets, 2, 4)))
+        self.assertEqual(intbitset([1, 2, 3, 4, 5]), get_records_in_citation_count_range(self.counts, self.buckets, 0, 3))
+        self.assertEqual([], list(get_records_in_citation_count_range(self.counts, self.buckets, 6, 10)))
+
+    def test_open_citation_count_range(self):
+        """bibrank citation searcher - records cited at least N times"""
+        self.assertEqual([4, 6], list(get_records_in_citation_count_range(self.counts, self.buckets, 3)))
+        self.assertEqual([6], list(get_records_in_citation_count_range(self.counts, self.buckets, 4)))
+
+    def test_update_citation_count_index(self):
+        """bibrank citation searcher - updating the citation count index"""
+        index = (self.counts, self.buckets)
+        update_citation_count_index(index, 3, 0, 4)
+        update_citation_count_index(index, 2, 1, None)
+        update_citation_count_index(index, 7, None, 2)
+        self.assertEqual([2, 3, 4, 5], self.counts)
+        self.assertEqual([3], list(get_records_in_citation_count_range(self.counts, self.buckets, 4, 4)))
+        self.assertEqual([1, 5, 7], list(get_records_in_citation_count_range(self.counts, self.buckets, 0, 2)))
+
+TEST_SUITE = make_test_suite(TestCitationSearcher,
+                             TestCitationCountIndex,)
 
 if __name__ == "__main__":
     run_test_suite(TEST_SUITE)
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+##
+## This file is part of Invenio.
+## Copyright (C) 2011 CERN.
+##
+## Invenio is free software; you can redistribute it and/or
+## modify it under the terms of the GNU General Public License as
+## published by the Free Software Foundation; either version 2 of the
+## License, or (at your option) any later version.
+##
+## Invenio is distributed in the hope that it will be useful, but
+## WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+## General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with Invenio; if not, write to the Free Software Foundation, Inc.,
+## 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+
+"""
+Benchmark of the citerank PageRank engines.
+
+Compares, on a synthetic citation graph, the PageRank computed on the
+sparse dictionaries (pagerank()) with the one computed on the CSR
+citation matrix (pagerank_csr()), both in running time and in the
+ranks they give.  Usage:
+
+  $ python -c 'from invenio.bibrank_citerank_benchmark import main; main()' \\
+        [number of papers] [average number of citations]
+"""
+
+__revision__ = "$Id$"
+
+import sys
+import time
+import random
+
+from invenio.bibrank_citerank_indexer import construct_ref_array, \
+     construct_sparse_matrix, construct_csr_matrix, pagerank, pagerank_csr
+
+def generate_citation_graph(nr_of_papers, avg_citations, seed=0):
+    """returns a random citation dictionary {recid: set(citing recids)}
+    and the corresponding dict_of_ids; papers are only cited by more
+    recent papers, i.e. papers with a higher recid"""
+    rnd = random.Random(seed)
+    cit = {}
+    for recid in range(1, nr_of_papers):
+        nr_of_citations = min(nr_of_papers - recid - 1,
+                              int(rnd.expovariate(1.0 / avg_citations)))
+        if nr_of_citations > 0:
+            cit[recid] = set(rnd.sample(xrange(recid + 1, nr_of_papers),
+                                        nr_of_citations))
+    dict_of_ids = {}
+    for recid in range(nr_of_papers):
+        dict_of_ids[recid] = recid
+    return cit, dict_of_ids
+
+def run_benchmark(nr_of_papers, avg_citations, damping_factor=0.85,
+                  conv_threshold=0.0001, check_point=1):
+    """returns (time of pagerank(), time of pagerank_csr(), maximum
+    difference between the weights) on a synthetic graph"""
+    cit, dict_of_ids = generate_citation_graph(nr_of_papers, avg_citations)
+    len_ = len(dict_of_ids)
+    ref = construct_ref_array(cit, dict_of_ids, len_)
+
+    start = time.time()
+    sparse, semi_sparse, semi_sparse_coef = \
+        construct_sparse_matrix(cit, ref, dict_of_ids, len_, damping_factor)
+    weights_dict = pagerank(conv_threshold, check_point, len_, sparse, \
+                            semi_sparse, semi_sparse_coef)
+    time_dict = time.time() - start
+
+    start = time.time()
+    csr_matrix = construct_csr_matrix(cit, dict_of_ids, len_)
+    weights_csr = pagerank_csr(conv_threshold, check_point, len_, \
+                               csr_matrix, ref, damping_factor)
+    time_csr = time.time() - start
+
+    return time_dict, time_csr, abs(weights_dict - weights_csr).max()
+
+def main():
+    """prints the result of the benchmark"""
+    nr_of_papers = 10000
+    avg_citations = 10
+    if len(sys.argv) > 1:
+        nr_of_papers = int(sys.argv[1])
+    if len(sys.argv) > 2:
+        avg_citations = int(sys.argv[2])
+    time_dict, time_csr, max_difference = \
+               run_benchmark(nr_of_papers, avg_citations)
+    print "papers: %d, average citations: %d" % (nr_of_papers, avg_citations)
+    print "pagerank (sparse dictionaries): %.3f s" % time_dict
+    print "pagerank (CSR matrix):          %.3f s" % time_csr
+    print "speedup: %.1fx" % (time_dict / max(time_csr, 1e-6))
+    print "maximum difference of the weights: %g" % max_difference
+
+if __name__ == "__main__":
+    main()
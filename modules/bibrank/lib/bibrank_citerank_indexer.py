@@ -33,7 +33,8 @@ import time
 import re
 import sys
 try:
-    from numpy import array, ones, zeros, int32, float32, sqrt, dot
+    from numpy import array, ones, zeros, int32, float32, sqrt, dot, \
+         int64, float64, arange, unique, add, searchsorted
     import_numpy = 1
 except ImportError:
     import_numpy = 0
@@ -43,9 +44,9 @@ if sys.hexversion < 0x2040000:
     from sets import Set as set
     # pylint: enable=W0622
 
-from invenio.dbquery import run_sql, serialize_via_marshal, \
-        deserialize_via_marshal
+from invenio.dbquery import run_sql, serialize_via_marshal
 from invenio.bibtask import write_message
+from invenio.bibrank_citation_searcher import get_citation_dict_from_db
 from invenio.config import CFG_ETCDIR
 
 
@@ -93,34 +94,26 @@ def get_citations_from_db():
     -a dict of type a:{b} where recid 'a' is asociated with an index 'b'"""
     dict_of_ids = {}
     count = 0
-    query = "select object_value from rnkCITATIONDATA \
-                where object_name = 'citationdict'"
-    cit_compressed = run_sql(query)
-    cit = []
-    if cit_compressed and cit_compressed[0] and cit_compressed[0][0]:
-        cit = deserialize_via_marshal(cit_compressed[0][0])
-        if cit:
-            for item in cit:
-                #check for duplicates in citation dictionary
-                cit[item] = set(cit[item])
-                if item in cit[item]:
-                    cit[item].remove(item)
-                if item not in dict_of_ids:
-                    dict_of_ids[item] = count
+    cit = get_citation_dict_from_db('citationdict')
+    if cit:
+        for item in cit:
+            #check for duplicates in citation dictionary
+            cit[item] = set(cit[item])
+            if item in cit[item]:
+                cit[item].remove(item)
+            if item not in dict_of_ids:
+                dict_of_ids[item] = count
+                count += 1
+            for value in cit[item]:
+                if value not in dict_of_ids:
+                    dict_of_ids[value] = count
                     count += 1
-                for value in cit[item]:
-                    if value not in dict_of_ids:
-                        dict_of_ids[value] = count
-                        count += 1
-            write_message("Citation data collected\
+        write_message("Citation data collected\
 from rnkCITATIONDATA", verbose=2)
-            write_message("Ids and recids corespondace: %s" \
-                % str(dict_of_ids), verbose=9)
-            write_message("Citations: %s" % str(cit), verbose=9)
-            return cit, dict_of_ids
-        else:
-            write_message("Error while extracting citation data \
-from rnkCITATIONDATA table", verbose=1)
+        write_message("Ids and recids corespondace: %s" \
+            % str(dict_of_ids), verbose=9)
+        write_message("Citations: %s" % str(cit), verbose=9)
+        return cit, dict_of_ids
     else:
         write_message("Error while extracting citation data \
 from rnkCITATIONDATA table", verbose=1)
@@ -426,6 +419,44 @@ def construct_sparse_matrix_time(cit, ref, dict_of_ids, \
     return sparse, semi_sparse, semi_sparse_coeficient
 
 
+def construct_csr_matrix(cit, dict_of_ids, len_):
+    """returns the citation matrix in compressed sparse row format:
+    (indptr, indices), where the columns of row i (the papers citing
+    paper i) are indices[indptr[i]:indptr[i+1]]; contrary to the
+    dictionaries of construct_sparse_matrix*(), the matrix is kept in
+    numpy arrays, so that a step of the power iteration is vectorized"""
+    nr_of_links = 0
+    for item in cit:
+        nr_of_links += len(cit[item])
+    keys = zeros(nr_of_links, int64)
+    pos = 0
+    for item in cit:
+        row = dict_of_ids[item] * len_
+        for value in cit[item]:
+            keys[pos] = row + dict_of_ids[value]
+            pos += 1
+    # sorted by row, then by column; duplicated links are counted once,
+    # like in the dictionaries
+    keys = unique(keys)
+    rows = keys // len_
+    indices = keys % len_
+    indptr = searchsorted(rows, arange(len_ + 1))
+    write_message("CSR citation matrix calculated", verbose=3)
+    return indptr, indices
+
+
+def csr_dot(indptr, indices, data, vector):
+    """returns the product of the CSR matrix (indptr, indices, data)
+    with vector"""
+    result = zeros(len(indptr) - 1, float64)
+    if len(indices):
+        products = data * vector[indices]
+        starts = indptr[:-1]
+        not_empty = starts < indptr[1:]
+        result[not_empty] = add.reduceat(products, starts[not_empty])
+    return result
+
+
 def statistics_on_sparse(sparse):
     """returns the number of papers that cite themselves"""
     count_diag = 0
@@ -545,6 +576,105 @@ The threshold was %s" % (str(nr_of_check_points), \
     return weights_old
 
 
+def power_iteration(conv_threshold, check_point, len_, next_weights):
+    """runs the power iteration weights = next_weights(weights),
+    starting from weights 1, until the distance between two
+    consecutive weights vectors measured every check_point steps is
+    lower than conv_threshold; returns the final weights"""
+    weights_old = ones((len_), float32) # initial weights
+    converged = False
+    nr_of_check_points = 0
+    difference = len_
+    while not converged:
+        nr_of_check_points += 1
+        for step in (range(check_point)):
+            weights_new = next_weights(weights_old).astype(float32)
+            if step == check_point - 1:
+                diff = weights_new - weights_old
+                difference = sqrt(dot(diff, diff))/len_
+                write_message("Finished step: %s, %s " \
+                        %(str(check_point*(nr_of_check_points-1) + step), \
+                            str(difference)), verbose=5)
+            weights_old = weights_new
+            converged = (difference < conv_threshold)
+    write_message("PageRank calculated for all recids finnished in %s steps. \
+The threshold was %s" % (str(nr_of_check_points), str(difference)),\
+             verbose=2)
+    return weights_old
+
+
+def pagerank_csr(conv_threshold, check_point, len_, csr_matrix, ref, \
+            damping_factor):
+    """the PAGERANK method computed on the CSR citation matrix; gives
+    the same ranks as pagerank() on the sparse dictionaries"""
+    indptr, indices = csr_matrix
+    ref = array(ref)
+    data = damping_factor / ref[indices].astype(float64)
+    semi_sparse = (ref == 0)
+    semi_sparse_coef = damping_factor/len_
+    def next_weights(weights_old):
+        """one step of the PAGERANK method"""
+        semi_total = weights_old[semi_sparse].astype(float64).sum()
+        return csr_dot(indptr, indices, data, weights_old) + \
+               semi_sparse_coef * semi_total + \
+               (1.0/len_ - semi_sparse_coef) * weights_old.astype(float64).sum()
+    return power_iteration(conv_threshold, check_point, len_, next_weights)
+
+
+def pagerank_ext_csr(conv_threshold, check_point, len_, csr_matrix, ref, \
+            ext_links, alpha, beta):
+    """the PAGERANK_EXT method computed on the CSR citation matrix;
+    gives the same ranks as pagerank_ext() on the sparse dictionaries;
+    the external node is the node 0 of the weights vector"""
+    indptr, indices = csr_matrix
+    ref = array(ref)
+    # probability of going from paper j to the external node:
+    external = zeros(len_, float64)
+    for j in range(len_):
+        if j in ext_links and ext_links[j] != 0:
+            aux = beta * ext_links[j]
+            if ref[j] == 0:
+                external[j] = aux/(aux + len_)
+            else:
+                external[j] = aux/(aux + ref[j])
+        else:
+            external[j] = beta/(len_ + beta)
+    data = (1.0 - external[indices]) / ref[indices].astype(float64)
+    semi_sparse = (ref == 0)
+    semi_sparse_coef = (1.0 - external[semi_sparse])/len_
+    def next_weights(weights_old):
+        """one step of the PAGERANK_EXT method"""
+        papers = weights_old[1:].astype(float64)
+        weights_new = zeros(len_ + 1, float64)
+        weights_new[0] = (1.0 - alpha) * weights_old[0] + dot(external, papers)
+        weights_new[1:] = alpha/len_ * weights_old[0] + \
+                          csr_dot(indptr, indices, data, papers) + \
+                          dot(semi_sparse_coef, papers[semi_sparse])
+        return weights_new
+    weights = power_iteration(conv_threshold, check_point, len_ + 1, \
+                              next_weights)
+    return weights[1:len_ + 1]
+
+
+def pagerank_time_csr(conv_threshold, check_point, len_, csr_matrix, ref, \
+            damping_factor, date_coef):
+    """the PAGERANK_TIME method computed on the CSR citation matrix;
+    gives the same ranks as pagerank_time() on the sparse dictionaries"""
+    indptr, indices = csr_matrix
+    ref = array(ref)
+    dates = array([date_coef[j] for j in range(len_)], float64)
+    data = damping_factor * dates[indices] / ref[indices].astype(float64)
+    semi_sparse = (ref == 0)
+    semi_sparse_coef = damping_factor/len_
+    def next_weights(weights_old):
+        """one step of the PAGERANK_TIME method"""
+        dated_weights = weights_old * dates
+        return csr_dot(indptr, indices, data, weights_old) + \
+               semi_sparse_coef * dated_weights[semi_sparse].sum() + \
+               (1.0/len_ - semi_sparse_coef) * dated_weights.sum()
+    return power_iteration(conv_threshold, check_point, len_, next_weights)
+
+
 def citation_rank_time(cit, dict_of_ids, date_coef, dates, decimals):
     """returns a dictionary recid:weight based on the total number of
     citations as function of time"""
@@ -635,10 +765,9 @@ def run_pagerank(cit, dict_of_ids, len_, ref, damping_factor, \
             conv_threshold, check_point, dates):
     """returns the final form of the ranks when using pagerank method"""
     write_message("Running the PageRank method", verbose=5)
-    sparse, semi_sparse, semi_sparse_coeficient = \
-        construct_sparse_matrix(cit, ref, dict_of_ids, len_, damping_factor)
-    weights = pagerank(conv_threshold, check_point, len_, \
-                    sparse, semi_sparse, semi_sparse_coeficient)
+    csr_matrix = construct_csr_matrix(cit, dict_of_ids, len_)
+    weights = pagerank_csr(conv_threshold, check_point, len_, \
+                    csr_matrix, ref, damping_factor)
     dict_of_ranks = get_ranks(weights, dict_of_ids, 1, dates, 2)
     return dict_of_ranks
 
@@ -648,10 +777,9 @@ def run_pagerank_ext(cit, dict_of_ids, ref, ext_links, \
     """returns the final form of the ranks when using pagerank_ext method"""
     write_message("Running the PageRank with external links method", verbose=5)
     len_ = len(dict_of_ids)
-    sparse, semi_sparse = construct_sparse_matrix_ext(cit, ref, \
-        ext_links, dict_of_ids, alpha, beta)
-    weights = pagerank_ext(conv_threshold, check_point, \
-        len_ + 1, sparse, semi_sparse)
+    csr_matrix = construct_csr_matrix(cit, dict_of_ids, len_)
+    weights = pagerank_ext_csr(conv_threshold, check_point, \
+        len_, csr_matrix, ref, ext_links, alpha, beta)
     dict_of_ranks = get_ranks(weights, dict_of_ids, 1, dates, 2)
     return dict_of_ranks
 
@@ -661,11 +789,9 @@ def run_pagerank_time(cit, dict_of_ids, len_, ref, damping_factor, \
     """returns the final form of the ranks when using
     pagerank + time decay method"""
     write_message("Running the PageRank_time method", verbose=5)
-    sparse, semi_sparse, semi_sparse_coeficient = \
-        construct_sparse_matrix_time(cit, ref, dict_of_ids, \
-            damping_factor, date_coef)
-    weights = pagerank_time(conv_threshold, check_point, len_, \
-        sparse, semi_sparse, semi_sparse_coeficient, date_coef)
+    csr_matrix = construct_csr_matrix(cit, dict_of_ids, len_)
+    weights = pagerank_time_csr(conv_threshold, check_point, len_, \
+        csr_matrix, ref, damping_factor, date_coef)
     dict_of_ranks = get_ranks(weights, dict_of_ids, 100000, dates, 2)
     return dict_of_ranks
 
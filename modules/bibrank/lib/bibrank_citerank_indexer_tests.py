@@ -51,6 +51,26 @@ class TestCiterankIndexer(unittest.TestCase):
         dict_of_ranks = bibrank_citerank_indexer.run_pagerank(self.cit, self.dict_of_ids, len(self.dict_of_ids), self.ref, self.damping_factor, self.conv_threshold, self.check_point, self.dates)
         self.assertEqual({96: 0.622, 18: 1.1419839999999999, 74: 0.88200100000000003, 77: 1.142002, 78: 1.6020020000000001, 79: 0.86200299999999996, 80: 0.62200199999999994, 81: 2.712002, 82: 0.62200199999999994, 83: 0.62200299999999997, 84: 1.6520029999999999, 85: 0.62200299999999997, 86: 0.62200299999999997, 87: 0.62200299999999997, 88: 0.62200299999999997, 89: 0.62200500000000003, 91: 0.88200699999999999, 92: 0.62200599999999995, 94: 1.1419969999999999, 95: 1.8519990000000002}, dict_of_ranks)
 
+    def test_csr_engine(self):
+        """bibrank citerank indexer - same weights with the CSR matrix"""
+        len_ = len(self.dict_of_ids)
+        ref = bibrank_citerank_indexer.construct_ref_array(self.cit, self.dict_of_ids, len_)
+        csr_matrix = bibrank_citerank_indexer.construct_csr_matrix(self.cit, self.dict_of_ids, len_)
+        sparse, semi_sparse, semi_sparse_coef = bibrank_citerank_indexer.construct_sparse_matrix(self.cit, ref, self.dict_of_ids, len_, self.damping_factor)
+        weights = bibrank_citerank_indexer.pagerank(self.conv_threshold, self.check_point, len_, sparse, semi_sparse, semi_sparse_coef)
+        weights_csr = bibrank_citerank_indexer.pagerank_csr(self.conv_threshold, self.check_point, len_, csr_matrix, ref, self.damping_factor)
+        self.assert_(abs(weights - weights_csr).max() < 1e-5)
+        date_coef = bibrank_citerank_indexer.calculate_time_weights(len_, 0.1, self.dates)
+        sparse, semi_sparse, semi_sparse_coef = bibrank_citerank_indexer.construct_sparse_matrix_time(self.cit, ref, self.dict_of_ids, self.damping_factor, date_coef)
+        weights = bibrank_citerank_indexer.pagerank_time(self.conv_threshold, self.check_point, len_, sparse, semi_sparse, semi_sparse_coef, date_coef)
+        weights_csr = bibrank_citerank_indexer.pagerank_time_csr(self.conv_threshold, self.check_point, len_, csr_matrix, ref, self.damping_factor, date_coef)
+        self.assert_(abs(weights - weights_csr).max() < 1e-5)
+        ext_links = {0: 3, 2: 0, 5: 1, 13: 4}
+        sparse, semi_sparse = bibrank_citerank_indexer.construct_sparse_matrix_ext(self.cit, ref, ext_links, self.dict_of_ids, 0.1, 2.0)
+        weights = bibrank_citerank_indexer.pagerank_ext(self.conv_threshold, self.check_point, len_ + 1, sparse, semi_sparse)
+        weights_csr = bibrank_citerank_indexer.pagerank_ext_csr(self.conv_threshold, self.check_point, len_, csr_matrix, ref, ext_links, 0.1, 2.0)
+        self.assert_(abs(weights - weights_csr).max() < 1e-5)
+
 TEST_SUITE = make_test_suite(TestCiterankIndexer,)
 
 if __name__ == "__main__":
@@ -26,6 +26,8 @@ import math
 import re
 import ConfigParser
 import copy
+import heapq
+from array import array
 
 from invenio.config import \
      CFG_SITE_LANG, \
@@ -37,6 +39,7 @@ from invenio.bibindex_engine_stemmer import stem
 from invenio.bibindex_engine_stopwords import is_stopword
 from invenio.bibrank_citation_searcher import get_cited_by, get_cited_by_weight
 from invenio.intbitset import intbitset
+from invenio.data_cacher import DataCacher
 
 
 def compare_on_val(first, second):
@@ -167,12 +170,14 @@ def get_bibrank_methods(colID, ln=CFG_SITE_LANG):
                 avail_methods.append((rank_method_code, rank_method_code))
     return avail_methods
 
-def rank_records(rank_method_code, rank_limit_relevance, hitset_global, pattern=[], verbose=0):
+def rank_records(rank_method_code, rank_limit_relevance, hitset_global, pattern=[], verbose=0, rg=None, jrec=None):
     """rank_method_code, e.g. `jif' or `sbr' (word frequency vector model)
        rank_limit_relevance, e.g. `23' for `nbc' (number of citations) or `0.10' for `vec'
        hitset, search engine hits;
        pattern, search engine query or record ID (you check the type)
        verbose, verbose level
+       rg, jrec, the page of records to display; methods based on
+           predetermined values return only the records needed for it
        output:
        list of records
        list of rank values
@@ -209,7 +214,7 @@ def rank_records(rank_method_code, rank_limit_relevance, hitset_global, pattern=
         elif func_object:
             result = func_object(rank_method_code, pattern, hitset, rank_limit_relevance, verbose)
         else:
-            result = rank_by_method(rank_method_code, pattern, hitset, rank_limit_relevance, verbose)
+            result = rank_by_method(rank_method_code, pattern, hitset, rank_limit_relevance, verbose, rg, jrec)
     except Exception, e:
         register_exception()
         result = (None, "", adderrorbox("An error occured when trying to rank the search result "+rank_method_code, ["Unexpected error: %s<br />" % (e,)]), voutput)
@@ -262,7 +267,86 @@ def combine_method(rank_method_code, pattern, hitset, rank_limit_relevance,verbo
     except Exception, e:
         return (None, "Warning: %s method cannot be used for ranking your query." % rank_method_code, "", voutput)
 
-def rank_by_method(rank_method_code, lwords, hitset, rank_limit_relevance,verbose):
+class RankMethodDataCacher(DataCacher):
+    """
+    Cache holding the predetermined values of a rank method, as stored
+    by bibrank in rnkMETHODDATA.  The values are kept in an array
+    indexed by recID together with an intbitset of the records having
+    a value, so that ranking a hitset does not need to deserialize the
+    whole dictionary at every query.
+    """
+    def __init__(self, rank_method_code):
+        def cache_filler():
+            try:
+                res = run_sql("""SELECT relevance_data FROM rnkMETHODDATA,rnkMETHOD
+                                  WHERE rnkMETHOD.id=id_rnkMETHOD AND rnkMETHOD.name=%s""",
+                              (rank_method_code,))
+            except Exception:
+                # database problems, return empty cache
+                return {}
+            if not res:
+                return {}
+            rnkdict = deserialize_via_marshal(res[0][0])
+            recids = intbitset(rnkdict.keys())
+            # integer values (e.g. number of citations) are kept as
+            # integers, everything else as floating point numbers:
+            typecode = 'l'
+            for value in rnkdict.itervalues():
+                if type(value) not in (int, long):
+                    typecode = 'd'
+                    break
+            max_recid = 0
+            if rnkdict:
+                max_recid = max(rnkdict.keys())
+            values = array(typecode, [0]) * (max_recid + 1)
+            for (recid, value) in rnkdict.iteritems():
+                values[recid] = value
+            return {'values': values,
+                    'recids': recids}
+        def timestamp_verifier():
+            res = run_sql("""SELECT DATE_FORMAT(last_updated, '%%Y-%%m-%%d %%H:%%i:%%s')
+                              FROM rnkMETHOD WHERE name=%s""", (rank_method_code,))
+            if res and res[0][0]:
+                return res[0][0]
+            else:
+                return '0000-00-00 00:00:00'
+
+        DataCacher.__init__(self, cache_filler, timestamp_verifier)
+
+CACHE_RANK_METHOD_DATA = {}
+
+def get_rank_method_data(rank_method_code):
+    """
+    Returns the cached predetermined values of the rank method
+    RANK_METHOD_CODE.  Performs lazy loading, i.e. loads the data the
+    first time it is actually used, and reloads it whenever bibrank
+    updates the method.
+
+    @param rank_method_code: the name of the rank method in rnkMETHOD
+    @type rank_method_code: string
+    @return: dictionary with keys 'values' (array of rank values
+            indexed by recID) and 'recids' (intbitset of the records
+            having a rank value), or empty dictionary if the method has
+            no data
+    @rtype: dictionary
+    """
+    if not CACHE_RANK_METHOD_DATA.has_key(rank_method_code):
+        CACHE_RANK_METHOD_DATA[rank_method_code] = RankMethodDataCacher(rank_method_code)
+    else:
+        CACHE_RANK_METHOD_DATA[rank_method_code].recreate_cache_if_needed()
+    return CACHE_RANK_METHOD_DATA[rank_method_code].cache
+
+def get_number_of_records_to_rank(jrec=None, rg=None):
+    """Return the number of best ranked records that have to be returned
+    in order to display the page of RG records starting from JREC,
+    or None if all the records have to be returned."""
+    if not rg or rg == -9999:
+        return None
+    if not jrec or jrec < 1:
+        jrec = 1
+    return jrec - 1 + abs(rg)
+
+def rank_by_method(rank_method_code, lwords, hitset, rank_limit_relevance, verbose, rg=None, jrec=None):
     """Ranking of records based on predetermined values.
     input:
     rank_method_code - the code of the method, from the name field in rnkMETHOD, used to get predetermined values from
@@ -271,6 +355,9 @@ def rank_by_method(rank_method_code, lwords, hitset, rank_limit_relevance,verbos
     hitset - a list of hits for the query found by search_engine
     rank_limit_relevance - show only records with a rank value above this
     verbose - verbose value
+    rg - number of records to display per page, if given only the best
+         ranked records needed to display the page are returned
+    jrec - number of the first record of the page to display
     output:
     reclist - a list of sorted records, with unsorted added to the end: [[23,34], [344,24], [1,01]]
     prefix - what to show before the rank value
@@ -278,9 +365,9 @@ def rank_by_method(rank_method_code, lwords, hitset, rank_limit_relevance,verbos
     voutput - contains extra information, content dependent on verbose value"""
 
     global voutput
-    rnkdict = run_sql("SELECT relevance_data FROM rnkMETHODDATA,rnkMETHOD where rnkMETHOD.id=id_rnkMETHOD and rnkMETHOD.name='%s'" % rank_method_code)
+    rank_data = get_rank_method_data(rank_method_code)
 
-    if not rnkdict:
+    if not rank_data:
         return (None, "Warning: Could not load ranking data for method %s." % rank_method_code, "", voutput)
 
     max_recid = 0
@@ -305,37 +392,43 @@ def rank_by_method(rank_method_code, lwords, hitset, rank_limit_relevance,verbos
             else:
                 return (None, "Warning: Given record IDs are out of range.", "", voutput)
 
-    rnkdict = deserialize_via_marshal(rnkdict[0][0])
+    values = rank_data['values']
     if verbose > 0:
         voutput += "<br />Running rank method: %s, using rank_by_method function in bibrank_record_sorter<br />" % rank_method_code
-        voutput += "Ranking data loaded, size of structure: %s<br />" % len(rnkdict)
-    lrecIDs = list(hitset)
+        voutput += "Ranking data loaded, size of structure: %s<br />" % len(rank_data['recids'])
 
-    if verbose > 0:
-        voutput += "Number of records to rank: %s<br />" % len(lrecIDs)
-    reclist = []
-    reclist_addend = []
+    hitset = intbitset(hitset)
+    if lwords_hitset: #rank only docs in hitset given by the recid: ranges
+        hitset &= lwords_hitset
 
-    if not lwords_hitset: #rank all docs, can this be speed up using something else than for loop?
-        for recID in lrecIDs:
-            if rnkdict.has_key(recID):
-                reclist.append((recID, rnkdict[recID]))
-                del rnkdict[recID]
-            else:
-                reclist_addend.append((recID, 0))
-    else: #rank docs in hitset, can this be speed up using something else than for loop?
-        for recID in lwords_hitset:
-            if rnkdict.has_key(recID) and recID in hitset:
-                reclist.append((recID, rnkdict[recID]))
-                del rnkdict[recID]
-            elif recID in hitset:
-                reclist_addend.append((recID, 0))
+    if verbose > 0:
+        voutput += "Number of records to rank: %s<br />" % len(hitset)
+
+    ranked = hitset & rank_data['recids']
+    unranked = hitset - ranked
+
+    nb_records_to_rank = get_number_of_records_to_rank(jrec, rg)
+    if nb_records_to_rank is None or nb_records_to_rank >= len(ranked):
+        reclist = [(recID, values[recID]) for recID in ranked]
+        reclist.sort(lambda x, y: cmp(x[1], y[1]))
+        reclist_addend = list(unranked)
+        if nb_records_to_rank is not None:
+            # only the best unranked records are needed to fill the page
+            nb_addend = nb_records_to_rank - len(ranked)
+            reclist_addend = reclist_addend[max(len(reclist_addend) - nb_addend, 0):]
+        reclist_addend = [(recID, 0) for recID in reclist_addend]
+    else:
+        # partial sort: ties are resolved by recID, exactly like the
+        # stable sort of the full list does
+        reclist = heapq.nlargest(nb_records_to_rank, [(values[recID], recID) for recID in ranked])
+        reclist.reverse()
+        reclist = [(recID, value) for (value, recID) in reclist]
+        reclist_addend = []
 
     if verbose > 0:
-        voutput += "Number of records ranked: %s<br />" % len(reclist)
-        voutput += "Number of records not ranked: %s<br />" % len(reclist_addend)
+        voutput += "Number of records ranked: %s<br />" % len(ranked)
+        voutput += "Number of records not ranked: %s<br />" % len(unranked)
 
-    reclist.sort(lambda x, y: cmp(x[1], y[1]))
     return (reclist_addend + reclist, methods[rank_method_code]["prefix"], methods[rank_method_code]["postfix"], voutput)
 
 def find_citations(rank_method_code, recID, hitset, verbose):
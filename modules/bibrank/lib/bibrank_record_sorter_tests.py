@@ -47,7 +47,23 @@ class TestListSetOperations(unittest.TestCase):
         self.assertEqual(({1: 7, 2: 7, 5: 5}, {1: 1, 2: 1, 5: 1}),  bibrank_record_sorter.calculate_record_relevance(("testterm", 2.0),
 {"Gi":(0, 50.0), 1: (3, 4.0), 2: (4, 5.0), 5: (1, 3.5)}, hitset, {}, {}, 0, None))
 
-TEST_SUITE = make_test_suite(TestListSetOperations,)
+class TestNumberOfRecordsToRank(unittest.TestCase):
+    """Test how many records rank_by_method has to return."""
+
+    def test_all_records(self):
+        """bibrank record sorter - ranking all records when no page is given"""
+        self.assertEqual(None, bibrank_record_sorter.get_number_of_records_to_rank())
+        self.assertEqual(None, bibrank_record_sorter.get_number_of_records_to_rank(1, -9999))
+
+    def test_page_of_records(self):
+        """bibrank record sorter - ranking only the records up to the displayed page"""
+        self.assertEqual(10, bibrank_record_sorter.get_number_of_records_to_rank(None, 10))
+        self.assertEqual(30, bibrank_record_sorter.get_number_of_records_to_rank(21, 10))
+        self.assertEqual(30, bibrank_record_sorter.get_number_of_records_to_rank(21, -10))
+        self.assertEqual(25, bibrank_record_sorter.get_number_of_records_to_rank(0, 25))
+
+TEST_SUITE = make_test_suite(TestListSetOperations,
+                             TestNumberOfRecordsToRank,)
 
 if __name__ == "__main__":
     run_test_suite(TEST_SUITE)
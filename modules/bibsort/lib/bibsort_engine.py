@@ -21,6 +21,7 @@
 
 import sys
 import time
+from bisect import bisect_left, bisect_right
 from invenio.dbquery import deserialize_via_marshal, \
 serialize_via_marshal, run_sql, Error
 from invenio.search_engine import get_field_tags, search_pattern
@@ -28,6 +29,8 @@ from invenio.intbitset import intbitset
 from invenio.bibtask import write_message, task_update_progress, \
 task_sleep_now_if_required
 from invenio.config import CFG_BIBSORT_BUCKETS, CFG_CERN_SITE
+from invenio.bibsort_weights import serialize_sort_weights, \
+store_sort_weights, get_sort_weights_path
 from bibsort_washer import BibSortWasher, \
 InvenioBibSortWasherNotImplementedError
 
@@ -332,6 +335,14 @@ def write_to_methoddata_table(id_method, data_dict, data_dict_ordered, data_list
         return False
     write_message('Writing to the bsrMETHODDATA successfully completed.', \
                   verbose=5)
+    #the snapshot of the weights memory-mapped by the search engine
+    try:
+        store_sort_weights(get_sort_weights_path(id_method, date), \
+                           serialize_sort_weights(data_dict_ordered))
+    except EnvironmentError, err:
+        write_message("The error [%s] occured when writing the snapshot of " \
+                      "the weights; it will be created by the search engine" \
+                      %err, sys.stderr)
     return True
 
 
@@ -608,37 +619,31 @@ def update_bibsort_tables(recids, method, update_timestamp = True):
     #remove the recids that were not previously in bibsort
     recids_to_delete = [recid for recid in recids_to_delete if recid in data_dict]
 
-    #dicts to keep the ordered values for the recids - useful bor bucket insertion
-    recids_current_ordered = {}
-    recids_old_ordered = {}
-
     if recids_to_insert or recids_to_modify or recids_to_delete:
         data_dict_ordered = deserialize_via_marshal(res[0][1])
         data_list_sorted = deserialize_via_marshal(res[0][2])
+        #the weights that had to be redistributed to make space for new ones
+        relabelings = []
         if recids_to_modify:
             write_message("%s records have been modified." \
                           %len(recids_to_modify), verbose=5)
             for recid in recids_to_modify:
-                recids_old_ordered[recid] = data_dict_ordered[recid]
                 perform_modify_record(data_dict, data_dict_ordered, \
-                                data_list_sorted, field_data[recid], recid)
+                                data_list_sorted, field_data[recid], recid, \
+                                relabelings=relabelings)
         if recids_to_insert:
             write_message("%s records have been inserted." \
                           %len(recids_to_insert), verbose=5)
             for recid in recids_to_insert:
                 perform_insert_record(data_dict, data_dict_ordered, \
-                                data_list_sorted, field_data[recid], recid)
+                                data_list_sorted, field_data[recid], recid, \
+                                relabelings=relabelings)
         if recids_to_delete:
             write_message("%s records have been deleted." \
                           %len(recids_to_delete), verbose=5)
             for recid in recids_to_delete:
                 perform_delete_record(data_dict, data_dict_ordered, data_list_sorted, recid)
 
-        for recid in recids_to_modify:
-            recids_current_ordered[recid] = data_dict_ordered[recid]
-        for recid in recids_to_insert:
-            recids_current_ordered[recid] = data_dict_ordered[recid]
-
         #write the modifications to db
         executed = write_to_methoddata_table(method_id, data_dict, \
                                          data_dict_ordered, data_list_sorted, update_timestamp)
@@ -647,7 +652,10 @@ def update_bibsort_tables(recids, method, update_timestamp = True):
 
         #update buckets
         try:
-            perform_update_buckets(recids_current_ordered, recids_to_insert, recids_old_ordered, method_id, update_timestamp)
+            perform_update_buckets(data_dict_ordered, \
+                                   recids_to_insert + recids_to_modify.keys(), \
+                                   recids_to_modify.keys() + recids_to_delete, \
+                                   relabelings, method_id, update_timestamp)
         except Error, err:
             write_message("[%s] The bucket data for method %s has not been updated" \
                           %(method, err), sys.stderr)
@@ -655,84 +663,127 @@ def update_bibsort_tables(recids, method, update_timestamp = True):
     return True
 
 
-def perform_update_buckets(recids_current_ordered, recids_to_insert, recids_old_ordered, method_id, update_timestamp = True):
-    """Updates the buckets"""
-    bucket_insert = {}
-    bucket_delete = {}
+def update_bucket_last_values(bucket_last_values, relabelings):
+    """The last value of a bucket separates its weights from the weights
+    of the next bucket. When the weights of some records are redistributed
+    (see create_space_for_new_weight), the separator falling among them is
+    moved to the new weight of the last record it used to follow, so that
+    it separates the same records as before.
+    bucket_last_values = [[bucket_no, last_value]] ordered by bucket_no
+    relabelings = [(left_weight, right_weight, old_weights, new_weights)]"""
+    for left_weight, right_weight, old_weights, new_weights in relabelings:
+        for bucket in bucket_last_values:
+            last_value = bucket[1]
+            if last_value < left_weight or \
+                   (right_weight is not None and last_value >= right_weight):
+                continue
+            index = bisect_right(old_weights, last_value)
+            if index == 0:
+                bucket[1] = left_weight
+            else:
+                bucket[1] = new_weights[index - 1]
+
+
+def perform_update_buckets(data_dict_ordered, recids_to_place, recids_to_remove, relabelings, method_id, update_timestamp = True):
+    """Updates the buckets: the records in recids_to_remove are taken out
+    of the bucket they were in, the ones in recids_to_place are put in the
+    bucket matching their current weight. Only the buckets whose data or
+    last value changed are written back to the database."""
     write_message("Updating the buckets for method_id = %s" %method_id, verbose=5)
-    buckets = run_sql("SELECT bucket_no, bucket_last_value \
+    buckets = run_sql("SELECT bucket_no, bucket_data, bucket_last_value \
                       FROM bsrMETHODDATABUCKET \
-                      WHERE id_bsrMETHOD = %s", (method_id, ))
+                      WHERE id_bsrMETHOD = %s ORDER BY bucket_no", (method_id, ))
     if not buckets:
         write_message("No bucket data found for method_id %s." \
                       %method_id, sys.stderr)
         raise Exception
-    #sort the buckets to be sure we are iterating them in order(1 to max):
-    buckets_dict = dict(buckets)
-    for recid in recids_to_insert:
-        for bucket_no in buckets_dict:
-            if recids_current_ordered[recid] <= buckets_dict[bucket_no]:
-                bucket_insert.setdefault(bucket_no, []).append(recid)
-                break
-
-    for recid in recids_old_ordered:
-        record_inserted = 0
-        record_deleted = 0
-        for bucket_no in buckets_dict:
-            bucket_value = int(buckets_dict[bucket_no])
-            if record_inserted and record_deleted:
-                #both insertion and deletion have been registered
-                break
-            if recids_current_ordered[recid] <= bucket_value and \
-                recids_old_ordered[recid] <= bucket_value and \
-                not record_inserted and \
-                not record_deleted:
-                #both before and after the modif,
-                #recid should be in the same bucket -> nothing to do
+    buckets_data = {}
+    bucket_last_values = []
+    for bucket_no, bucket_data, bucket_last_value in buckets:
+        buckets_data[bucket_no] = intbitset(bucket_data)
+        bucket_last_values.append([bucket_no, int(bucket_last_value)])
+    old_last_values = dict(bucket_last_values)
+    update_bucket_last_values(bucket_last_values, relabelings)
+    separators = [last_value for dummy, last_value in bucket_last_values]
+    bucket_numbers = [bucket_no for bucket_no, dummy in bucket_last_values]
+
+    old_buckets = {}
+    for recid in intbitset(recids_to_remove):
+        for bucket_no in bucket_numbers:
+            if recid in buckets_data[bucket_no]:
+                old_buckets[recid] = bucket_no
                 break
-            if recids_current_ordered[recid] <= bucket_value and not record_inserted:
-                #recid should be, after the modif, here, so insert
-                bucket_insert.setdefault(bucket_no, []).append(recid)
-                record_inserted = 1
-            if recids_old_ordered[recid] <= bucket_value and not record_deleted:
-                #recid was here before modif, must be removed
-                bucket_delete.setdefault(bucket_no, []).append(recid)
-                record_deleted = 1
-
-    for bucket_no in buckets_dict:
-        if (bucket_no in bucket_insert) or (bucket_no in bucket_delete):
-            res = run_sql("SELECT bucket_data FROM bsrMETHODDATABUCKET \
-                          where id_bsrMETHOD = %s AND bucket_no = %s", \
-                          (method_id, bucket_no, ))
-            bucket_data = intbitset(res[0][0])
-            for recid in bucket_insert.get(bucket_no, []):
-                bucket_data.add(recid)
-            for recid in bucket_delete.get(bucket_no, []):
-                bucket_data.remove(recid)
-            if update_timestamp:
-                date = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
-                run_sql("UPDATE bsrMETHODDATABUCKET \
-                    SET bucket_data = %s, last_updated = %s \
-                    WHERE id_bsrMETHOD = %s AND bucket_no = %s", \
-                    (bucket_data.fastdump(), date, method_id, bucket_no, ))
-            else:
-                run_sql("UPDATE bsrMETHODDATABUCKET \
-                    SET bucket_data = %s \
-                    WHERE id_bsrMETHOD = %s AND bucket_no = %s", \
-                    (bucket_data.fastdump(), method_id, bucket_no, ))
-            write_message("Updating bucket %s for method %s." %(bucket_no, method_id), verbose=5)
+    new_buckets = {}
+    for recid in intbitset(recids_to_place):
+        weight = data_dict_ordered[recid]
+        index = bisect_left(separators, weight)
+        if index == len(separators):
+            #the record comes after all the others: extend the last bucket
+            index -= 1
+            separators[index] = weight
+            bucket_last_values[index][1] = weight
+        new_buckets[recid] = bucket_numbers[index]
+
+    buckets_modified = {}
+    for recid, bucket_no in old_buckets.items():
+        if new_buckets.get(recid) != bucket_no:
+            buckets_data[bucket_no].discard(recid)
+            buckets_modified[bucket_no] = True
+    for recid, bucket_no in new_buckets.items():
+        if old_buckets.get(recid) != bucket_no:
+            buckets_data[bucket_no].add(recid)
+            buckets_modified[bucket_no] = True
+    for bucket_no, last_value in bucket_last_values:
+        if last_value != old_last_values[bucket_no]:
+            buckets_modified[bucket_no] = True
+
+    for bucket_no, last_value in bucket_last_values:
+        if bucket_no not in buckets_modified:
+            continue
+        if update_timestamp:
+            date = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
+            run_sql("UPDATE bsrMETHODDATABUCKET \
+                SET bucket_data = %s, bucket_last_value = %s, last_updated = %s \
+                WHERE id_bsrMETHOD = %s AND bucket_no = %s", \
+                (buckets_data[bucket_no].fastdump(), last_value, date, method_id, bucket_no, ))
+        else:
+            run_sql("UPDATE bsrMETHODDATABUCKET \
+                SET bucket_data = %s, bucket_last_value = %s \
+                WHERE id_bsrMETHOD = %s AND bucket_no = %s", \
+                (buckets_data[bucket_no].fastdump(), last_value, method_id, bucket_no, ))
+        write_message("Updating bucket %s for method %s." %(bucket_no, method_id), verbose=5)
+    write_message("%s out of %s buckets updated for method %s." \
+                  %(len(buckets_modified), len(bucket_numbers), method_id), verbose=5)
+
+
+def get_index_in_sorted_list(data_dict_ordered, data_list_sorted, recid):
+    """Returns the index of recid in data_list_sorted, O(log n):
+    the weights in data_dict_ordered increase along data_list_sorted"""
+    weight = data_dict_ordered[recid]
+    minimum = 0
+    maximum = len(data_list_sorted)
+    while minimum < maximum:
+        med = (minimum + maximum)/2
+        if data_dict_ordered[data_list_sorted[med]] < weight:
+            minimum = med + 1
+        else:
+            maximum = med
+    if minimum < len(data_list_sorted) and data_list_sorted[minimum] == recid:
+        return minimum
+    #the weights are not consistent with the list
+    return data_list_sorted.index(recid)
 
 
-def perform_modify_record(data_dict, data_dict_ordered, data_list_sorted, value, recid, spacing=CFG_BIBSORT_WEIGHT_DISTANCE):
+def perform_modify_record(data_dict, data_dict_ordered, data_list_sorted, value, recid, spacing=CFG_BIBSORT_WEIGHT_DISTANCE, relabelings=None):
     """Modifies all the data structures with the new information
     about the record"""
     #remove the recid from the old position, to make place for the new value
-    data_list_sorted.remove(recid)
+    del data_list_sorted[get_index_in_sorted_list(data_dict_ordered, data_list_sorted, recid)]
     # from now on, it is the same thing as insert
-    return perform_insert_record(data_dict, data_dict_ordered, data_list_sorted, value, recid, spacing)
+    return perform_insert_record(data_dict, data_dict_ordered, data_list_sorted, value, recid, spacing, relabelings)
 
 
-def perform_insert_record(data_dict, data_dict_ordered, data_list_sorted, value, recid, spacing=CFG_BIBSORT_WEIGHT_DISTANCE):
+def perform_insert_record(data_dict, data_dict_ordered, data_list_sorted, value, recid, spacing=CFG_BIBSORT_WEIGHT_DISTANCE, relabelings=None):
     """Inserts a new record into all the data structures"""
     #data_dict
     data_dict[recid] = value
@@ -745,7 +796,10 @@ def perform_insert_record(data_dict, data_dict_ordered, data_list_sorted, value,
         #append at the end of the list
         data_list_sorted.append(recid)
         #weight = highest weight + the distance
-        data_dict_ordered[recid] = data_dict_ordered[data_list_sorted[index_for_insert - 1]] + spacing
+        if index_for_insert == 0:
+            data_dict_ordered[recid] = spacing
+        else:
+            data_dict_ordered[recid] = data_dict_ordered[data_list_sorted[index_for_insert - 1]] + spacing
     else:
         if index_for_insert == 0: #insert at the begining of the list
             left_neighbor_weight = 0
@@ -754,12 +808,10 @@ def perform_insert_record(data_dict, data_dict_ordered, data_list_sorted, value,
         right_neighbor_weight = data_dict_ordered[data_list_sorted[index_for_insert]]
         #the recid's weight will be the med between left and right
         weight = (right_neighbor_weight - left_neighbor_weight)/2
+        data_list_sorted.insert(index_for_insert, recid)
         if weight < 1: #there is no more space to insert, we have to create some space
-            data_list_sorted.insert(index_for_insert, recid)
-            data_dict_ordered[recid] = left_neighbor_weight + spacing
-            create_space_for_new_weight(index_for_insert, data_dict_ordered, data_list_sorted, spacing)
+            create_space_for_new_weight(index_for_insert, data_dict_ordered, data_list_sorted, spacing, relabelings)
         else:
-            data_list_sorted.insert(index_for_insert, recid)
             data_dict_ordered[recid] = left_neighbor_weight + weight
     write_message("Record %s done." %recid, verbose=5)
     return index_for_insert
@@ -770,21 +822,65 @@ def perform_delete_record(data_dict, data_dict_ordered, data_list_sorted, recid)
     #data_dict
     del data_dict[recid]
     #data_list_sorted
-    data_list_sorted.remove(recid)
+    del data_list_sorted[get_index_in_sorted_list(data_dict_ordered, data_list_sorted, recid)]
     #data_dict_ordered
     del data_dict_ordered[recid]
     write_message("Record %s done." %recid, verbose=5)
     return 1
 
 
-def create_space_for_new_weight(index_for_insert, data_dict_ordered, data_list_sorted, spacing):
+def create_space_for_new_weight(index_for_insert, data_dict_ordered, data_list_sorted, spacing, relabelings=None):
     """In order to keep an order of the records in data_dict_ordered, when a new
     weight is inserted, there needs to be some place for it
     (ex: recid3 needs to be inserted between recid1-with weight=10 and recid2-with weight=11)
-    The scope of this function is to increease the distance between recid1 and recid2
-    (and thus all the weights after recid2) so that recid3 will have an integer weight"""
-    for i in range(index_for_insert+1, len(data_list_sorted)):
-        data_dict_ordered[data_list_sorted[i]] += 2 * spacing
+    The record at index_for_insert in data_list_sorted (recid3) has no weight yet.
+    The weights are redistributed evenly inside the smallest window of
+    2, 4, 8.. records around index_for_insert that has enough space;
+    the larger the window, the larger the space required between two
+    records (up to spacing), so that the small windows inside it have
+    room for the next inserts; the window at the end of the list can
+    always grow.
+    Only the weights inside the window are modified, so a modification costs
+    O(log n) amortized instead of shifting all the weights after recid3.
+    If relabelings is a list, (left_weight, right_weight, old_weights, new_weights)
+    is appended to it, right_weight being None at the end of the list."""
+    size = len(data_list_sorted)
+    nb_levels = 1
+    while (1 << nb_levels) < size:
+        nb_levels += 1
+    level = 1
+    while True:
+        window_size = 1 << level
+        start = (index_for_insert / window_size) * window_size
+        end = min(start + window_size, size)
+        if start == 0:
+            left_weight = 0
+        else:
+            left_weight = data_dict_ordered[data_list_sorted[start - 1]]
+        if end == size:
+            #nothing after the window: the weights can grow
+            right_weight = None
+            step = spacing
+            break
+        right_weight = data_dict_ordered[data_list_sorted[end]]
+        step = (right_weight - left_weight) / (end - start + 1)
+        #required space between two records, from 1 up to spacing
+        if step >= 1 + (spacing - 1) * min(level, nb_levels) / nb_levels:
+            break
+        level += 1
+    old_weights = []
+    new_weights = []
+    weight = left_weight
+    for i in xrange(start, end):
+        recid = data_list_sorted[i]
+        weight += step
+        if i != index_for_insert:
+            old_weights.append(data_dict_ordered[recid])
+            new_weights.append(weight)
+        data_dict_ordered[recid] = weight
+    if relabelings is not None:
+        relabelings.append((left_weight, right_weight, old_weights, new_weights))
+    write_message("Weights of %s records redistributed." %(end - start), verbose=9)
 
 
 def binary_search(sorted_list, value, data_dict):
@@ -23,7 +23,7 @@ import unittest
 
 from invenio.bibsort_engine import perform_modify_record, \
     perform_insert_record, perform_delete_record, \
-    binary_search
+    binary_search, update_bucket_last_values
 from invenio.testutils import make_test_suite, run_test_suite
 
 
@@ -129,6 +129,31 @@ class TestBibSort(unittest.TestCase):
         self.assertEqual({1:8, 2:16, 4:32, 5:40, 6:48, 7:56}, data_dict_ordered)
         self.assertEqual({1:'b', 2:'c', 4:'g', 5:'i', 6:'k', 7:'s'}, data_dict)
 
+    def test_perform_insert_record_no_space(self):
+        """bibsort - testing perform_insert_record, when the weights have to be redistributed"""
+        data_dict = {1:'b', 2:'c', 3:'e', 4:'g', 5:'i', 6:'k', 7:'s', 8:'u'}
+        data_dict_ordered = {1:8, 2:16, 3:17, 4:18, 5:40, 6:48, 7:56, 8:64}
+        data_list_sorted = [1, 2, 3, 4, 5, 6, 7, 8]
+        spacing = 8
+        relabelings = []
+
+        # no space between 'e' and 'g': the weights of the first 8 records are redistributed
+        new_value = 'f'
+        recid = 100
+        self.assertEqual(3, perform_insert_record(data_dict, data_dict_ordered, data_list_sorted, new_value, recid, spacing, relabelings))
+        self.assertEqual([1, 2, 3, 100, 4, 5, 6, 7, 8], data_list_sorted)
+        self.assertEqual({1:7, 2:14, 3:21, 4:35, 5:42, 6:49, 7:56, 8:64, 100:28}, data_dict_ordered)
+        self.assertEqual([(0, 64, [8, 16, 17, 18, 40, 48, 56], [7, 14, 21, 35, 42, 49, 56])], relabelings)
+
+    def test_update_bucket_last_values(self):
+        """bibsort - testing update_bucket_last_values"""
+        bucket_last_values = [[1, 16], [2, 17], [3, 30], [4, 64]]
+        update_bucket_last_values(bucket_last_values, [(16, 40, [17, 18], [21, 31])])
+        self.assertEqual([[1, 16], [2, 21], [3, 31], [4, 64]], bucket_last_values)
+        bucket_last_values = [[1, 8], [2, 64]]
+        update_bucket_last_values(bucket_last_values, [(0, None, [8, 64], [10, 20])])
+        self.assertEqual([[1, 10], [2, 20]], bucket_last_values)
+
     def test_binary_search_odd_list(self):
         """bibsort -testing binary_search function, list with odd number of elements"""
         data_dict = {1:'b', 2:'d', 3:'e', 4:'g', 5:'i', 6:'k', 7:'s'}
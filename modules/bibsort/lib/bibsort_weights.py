@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+##
+## This file is part of Invenio.
+## Copyright (C) 2012 CERN.
+##
+## Invenio is free software; you can redistribute it and/or
+## modify it under the terms of the GNU General Public License as
+## published by the Free Software Foundation; either version 2 of the
+## License, or (at your option) any later version.
+##
+## Invenio is distributed in the hope that it will be useful, but
+## WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+## General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with Invenio; if not, write to the Free Software Foundation, Inc.,
+## 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+
+"""
+Compact storage of the BibSort weights.
+
+The weights of a sorting method { recid -> weight } (data_dict_ordered
+in bsrMETHODDATA) are stored as a dense array indexed by recid,
+followed by the intbitset of the recids that have a weight.  BibSort
+writes this snapshot (see snapshotutils) to CFG_CACHEDIR/bibsort
+every time it updates a method, and the search engine memory-maps it
+read-only, so that all the Apache processes of the machine share the
+same pages.
+"""
+
+__revision__ = "$Id$"
+
+import os
+import heapq
+import struct
+from array import array
+
+try:
+    import numpy
+    CFG_NUMPY_IMPORTED = True
+except ImportError:
+    CFG_NUMPY_IMPORTED = False
+
+from invenio.config import CFG_CACHEDIR
+from invenio.intbitset import intbitset
+from invenio.snapshotutils import get_snapshot_path, open_snapshot, \
+     store_snapshot, load_snapshot
+
+CFG_BIBSORT_WEIGHTS_DIR = os.path.join(CFG_CACHEDIR, 'bibsort')
+
+# magic, array typecode (padded), array length, size of the recids;
+# 16 bytes, so that the array is aligned for the 'd' typecode
+_HEADER_FORMAT = '=4s4sii'
+_HEADER_SIZE = struct.calcsize(_HEADER_FORMAT)
+_MAGIC = 'BSW1'
+_MAX_INT_WEIGHT = 2 ** 31 - 1
+
+def serialize_sort_weights(weights_dict):
+    """
+    Return the serialized form of WEIGHTS_DICT, a dictionary
+    { recid -> weight }.  Integer weights are stored as 32 bits
+    integers, other weights (e.g. ranking scores) as doubles.
+    """
+    typecode = 'i'
+    for weight in weights_dict.itervalues():
+        if not isinstance(weight, (int, long)) or \
+               not -_MAX_INT_WEIGHT <= weight <= _MAX_INT_WEIGHT:
+            typecode = 'd'
+            break
+    recids = intbitset(weights_dict.keys())
+    nb_items = 0
+    if weights_dict:
+        nb_items = max(weights_dict.keys()) + 1
+    weights = array(typecode, [0]) * nb_items
+    for recid, weight in weights_dict.iteritems():
+        weights[recid] = weight
+    recids_dump = recids.fastdump()
+    header = struct.pack(_HEADER_FORMAT, _MAGIC, typecode, nb_items,
+                         len(recids_dump))
+    return header + weights.tostring() + recids_dump
+
+class SortWeights:
+    """
+    Read-only view { recid -> weight } of the weights serialized by
+    serialize_sort_weights().  The data may be a string or a
+    memory-mapped file.  When numpy is available, the weights array
+    uses the data without copying it.
+    """
+    def __init__(self, data, path=None):
+        self.data = data
+        self.path = path
+        (magic, typecode, nb_items, recids_size) = \
+                struct.unpack(_HEADER_FORMAT, data[:_HEADER_SIZE])
+        typecode = typecode.rstrip('\0')
+        if magic != _MAGIC or typecode not in ('i', 'd'):
+            raise ValueError, "not serialized sort weights"
+        recids_start = _HEADER_SIZE + nb_items * array(typecode).itemsize
+        if CFG_NUMPY_IMPORTED:
+            dtype = {'i': numpy.int32, 'd': numpy.float64}[typecode]
+            self.weights = numpy.frombuffer(data, dtype=dtype, count=nb_items,
+                                            offset=_HEADER_SIZE)
+        else:
+            self.weights = array(typecode)
+            self.weights.fromstring(data[_HEADER_SIZE:recids_start])
+        self.recids = intbitset(data[recids_start:recids_start + recids_size])
+
+    def get(self, recid, default=None):
+        """Return the weight of RECID, or DEFAULT."""
+        if recid not in self:
+            return default
+        weight = self.weights[recid]
+        if CFG_NUMPY_IMPORTED:
+            weight = weight.item()
+        return weight
+
+    def has_key(self, recid):
+        try:
+            return recid in self.recids
+        except (TypeError, OverflowError):
+            return False
+
+    __contains__ = has_key
+
+    def __len__(self):
+        return len(self.recids)
+
+    def get_last_sorted(self, recids, nb_records, reverse=False):
+        """
+        Return the last NB_RECORDS records of RECIDS, an intbitset of
+        records having a weight, sorted by increasing weight (or by
+        decreasing weight if REVERSE).  Records with the same weight
+        are ordered by recid.
+        """
+        if nb_records <= 0 or not recids:
+            return []
+        weights = self.weights
+        if CFG_NUMPY_IMPORTED:
+            recids = numpy.fromiter(recids, dtype=numpy.int32,
+                                    count=len(recids))
+            recids_weights = weights[recids]
+            if reverse:
+                recids_weights = -recids_weights
+            # mergesort is stable: the recids stay ordered for equal weights
+            order = numpy.argsort(recids_weights, kind='mergesort')
+            return recids[order[-nb_records:]].tolist()
+        if reverse:
+            def sort_key(recid):
+                """position in the list sorted by decreasing weights"""
+                return (-weights[recid], recid)
+        else:
+            def sort_key(recid):
+                """position in the list sorted by increasing weights"""
+                return (weights[recid], recid)
+        last_records = heapq.nlargest(nb_records, recids, key=sort_key)
+        last_records.reverse()
+        return last_records
+
+def get_sort_weights_path(method_id, timestamp):
+    """Return the path of the file storing the weights of the sorting
+    method METHOD_ID as of TIMESTAMP (e.g. '2012-03-12 10:10:10')."""
+    return get_snapshot_path(CFG_BIBSORT_WEIGHTS_DIR, method_id, timestamp,
+                             'weights')
+
+def open_sort_weights(path):
+    """Return the SortWeights stored in PATH, memory-mapped read-only,
+    or None if the file does not exist or is invalid."""
+    return open_snapshot(path, SortWeights)
+
+def store_sort_weights(path, data):
+    """Atomically write the serialized weights DATA to PATH and remove
+    the files of older versions of the same sorting method."""
+    store_snapshot(path, data)
+
+def load_sort_weights(method_id, timestamp, weights_dict_loader):
+    """
+    Return the weights of the sorting method METHOD_ID as of TIMESTAMP
+    as SortWeights.  Use the memory-mapped snapshot if BibSort or
+    another process has already stored it, otherwise get the weights
+    by calling WEIGHTS_DICT_LOADER() and store them for the other
+    processes.  If the file cannot be written, the weights are kept in
+    memory.
+    """
+    return load_snapshot(get_sort_weights_path(method_id, timestamp),
+                         SortWeights,
+                         lambda: serialize_sort_weights(weights_dict_loader()))
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+##
+## This file is part of Invenio.
+## Copyright (C) 2012 CERN.
+##
+## Invenio is free software; you can redistribute it and/or
+## modify it under the terms of the GNU General Public License as
+## published by the Free Software Foundation; either version 2 of the
+## License, or (at your option) any later version.
+##
+## Invenio is distributed in the hope that it will be useful, but
+## WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+## General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with Invenio; if not, write to the Free Software Foundation, Inc.,
+## 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+
+"""Unit tests for the compact storage of the BibSort weights."""
+
+__revision__ = "$Id$"
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from invenio.testutils import make_test_suite, run_test_suite
+from invenio.intbitset import intbitset
+from invenio.bibsort_weights import SortWeights, serialize_sort_weights, \
+     store_sort_weights, open_sort_weights, get_sort_weights_path
+
+class TestSortWeights(unittest.TestCase):
+    """Test the access to the BibSort weights."""
+
+    def setUp(self):
+        # pylint: disable=C0103
+        """Initialize stuff"""
+        self.weights_dict = {1: 30, 2: 10, 3: 20, 4: 10, 5: 40, 9: 8}
+        self.weights = SortWeights(serialize_sort_weights(self.weights_dict))
+
+    def test_get(self):
+        """bibsort weights - getting the weight of records"""
+        for recid, weight in self.weights_dict.iteritems():
+            self.assertEqual(weight, self.weights.get(recid))
+        self.assertEqual(None, self.weights.get(6))
+        self.assertEqual(0, self.weights.get(100, 0))
+        self.assertEqual(6, len(self.weights))
+        self.assert_(9 in self.weights)
+        self.failIf(-1 in self.weights)
+        self.assertEqual(intbitset(self.weights_dict.keys()), self.weights.recids)
+
+    def test_float_weights(self):
+        """bibsort weights - storing ranking scores"""
+        weights = SortWeights(serialize_sort_weights({3: 0.5, 7: 2.25}))
+        self.assertEqual(0.5, weights.get(3))
+        self.assertEqual(2.25, weights.get(7))
+
+    def test_get_last_sorted(self):
+        """bibsort weights - last records ordered by weight"""
+        recids = intbitset([1, 2, 3, 4, 5])
+        self.assertEqual([2, 4, 3, 1, 5], self.weights.get_last_sorted(recids, 5))
+        self.assertEqual([1, 5], self.weights.get_last_sorted(recids, 2))
+        self.assertEqual([5, 1, 3, 2, 4], self.weights.get_last_sorted(recids, 10, reverse=True))
+        self.assertEqual([2, 4], self.weights.get_last_sorted(recids, 2, reverse=True))
+        self.assertEqual([], self.weights.get_last_sorted(recids, 0))
+        self.assertEqual([], self.weights.get_last_sorted(intbitset(), 3))
+
+    def test_empty_weights(self):
+        """bibsort weights - no records"""
+        weights = SortWeights(serialize_sort_weights({}))
+        self.assertEqual(0, len(weights))
+        self.assertEqual(None, weights.get(1))
+
+    def test_invalid_data(self):
+        """bibsort weights - refusing data that is not a snapshot"""
+        self.assertRaises(ValueError, SortWeights, 'x' * 64)
+
+class TestSortWeightsFiles(unittest.TestCase):
+    """Test storing and memory-mapping the BibSort weights."""
+
+    def setUp(self):
+        # pylint: disable=C0103
+        """Initialize stuff"""
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        # pylint: disable=C0103
+        """Remove temporary files"""
+        shutil.rmtree(self.directory)
+
+    def test_store_and_open(self):
+        """bibsort weights - memory-mapping a stored snapshot"""
+        path = os.path.join(self.directory, '3_20120312101010.weights')
+        store_sort_weights(path, serialize_sort_weights({2: 16, 5: 8}))
+        weights = open_sort_weights(path)
+        self.assertEqual(path, weights.path)
+        self.assertEqual(16, weights.get(2))
+        self.assertEqual([2, 5], weights.get_last_sorted(intbitset([2, 5]), 2, reverse=True))
+
+    def test_store_removes_older_versions(self):
+        """bibsort weights - removing outdated snapshots"""
+        data = serialize_sort_weights({1: 8})
+        store_sort_weights(os.path.join(self.directory, '3_20120312101010.weights'), data)
+        store_sort_weights(os.path.join(self.directory, '13_20120312101010.weights'), data)
+        store_sort_weights(os.path.join(self.directory, '3_20120313101010.weights'), data)
+        self.assertEqual(['13_20120312101010.weights', '3_20120313101010.weights'],
+                         sorted(os.listdir(self.directory)))
+
+    def test_open_missing_file(self):
+        """bibsort weights - opening a snapshot that is not stored"""
+        self.assertEqual(None, open_sort_weights(os.path.join(self.directory, 'foo.weights')))
+
+    def test_get_sort_weights_path(self):
+        """bibsort weights - path depends on the timestamp"""
+        self.assert_(get_sort_weights_path(3, '2012-03-12 10:10:10').endswith('3_20120312101010.weights'))
+
+TEST_SUITE = make_test_suite(TestSortWeights,
+                             TestSortWeightsFiles,)
+
+if __name__ == "__main__":
+    run_test_suite(TEST_SUITE)
@@ -51,10 +51,14 @@ from invenio.config import CFG_OAI_ID_FIELD, \
 
 from invenio.jsonutils import json, CFG_JSON_AVAILABLE
 from invenio.bibupload_config import CFG_BIBUPLOAD_CONTROLFIELD_TAGS, \
-    CFG_BIBUPLOAD_SPECIAL_TAGS
+    CFG_BIBUPLOAD_SPECIAL_TAGS, \
+    CFG_BIBUPLOAD_BATCH_SIZE, \
+    CFG_BIBUPLOAD_BIBXXX_ID_CACHE_SIZE
 from invenio.dbquery import run_sql, \
+                            run_sql_many, \
                             Error
 from invenio.bibrecord import create_records, \
+                              create_records_iterator, \
                               record_add_field, \
                               record_delete_field, \
                               record_xml_output, \
@@ -95,6 +99,11 @@ stat['exectime'] = time.localtime()
 
 _WRITING_RIGHTS = None
 
+## Session cache of bibxxx row ids, of the form {(tag, value): id}, filled
+## by prefetch_record_bibxxx_ids() in --batch mode.  An id of None means
+## that the tag,value combination was looked for but not found.
+_BIBXXX_ID_CACHE = {}
+
 ## Let's set a reasonable timeout for URL request (e.g. FFT)
 socket.setdefaulttimeout(40)
 
@@ -551,6 +560,39 @@ def xml_marc_to_records(xml_marc):
         recs = map((lambda x:x[0]), recs)
         return recs
 
+def xml_marc_file_to_records_iterator(path):
+    """Iterate over the records of the MARCXML file PATH, creating
+    them one by one while the file is being read."""
+    try:
+        marc_file = open(path, 'r')
+    except IOError, erro:
+        write_message("Error: %s" % erro, verbose=1, stream=sys.stderr)
+        write_message("Exiting.", sys.stderr)
+        if erro.errno == 2:
+            # No such file or directory
+            # Not scary
+            task_update_status("CERROR")
+        else:
+            task_update_status("ERROR")
+        sys.exit(1)
+    nb_records = 0
+    for rec in create_records_iterator(marc_file, 1, 1):
+        if nb_records == 0 and rec[0] is None:
+            write_message("Error: MARCXML file has wrong format: %s" % (rec, ),
+                verbose=1, stream=sys.stderr)
+            write_message("Exiting.", sys.stderr)
+            task_update_status("CERROR")
+            sys.exit(1)
+        nb_records += 1
+        stat['nb_records_to_upload'] += 1
+        yield rec[0]
+    marc_file.close()
+    if nb_records == 0:
+        write_message("Error: Cannot parse MARCXML file.", verbose=1, stream=sys.stderr)
+        write_message("Exiting.", sys.stderr)
+        task_update_status("ERROR")
+        sys.exit(1)
+
 def find_record_format(rec_id, format):
     """Look whether record REC_ID is formatted in FORMAT,
        i.e. whether FORMAT exists in the bibfmt table for this record.
@@ -914,15 +956,23 @@ def insert_record_bibxxx(tag, value, pretend=False):
     # determine into which table one should insert the record
     table_name = 'bib'+tag[0:2]+'x'
 
-    # check if the tag, value combination exists in the table
-    query = """SELECT id,value FROM %s """ % table_name
-    query += """ WHERE tag=%s AND value=%s"""
-    params = (tag, value)
-    try:
-        res = run_sql(query, params)
-    except Error, error:
-        write_message("   Error during the insert_record_bibxxx function : %s "
-            % error, verbose=1, stream=sys.stderr)
+    if _BIBXXX_ID_CACHE.has_key((tag, value)):
+        # the tag, value combination was already looked for in this
+        # batch session:
+        row_id = _BIBXXX_ID_CACHE[(tag, value)]
+        if row_id is not None:
+            return (table_name, row_id)
+        res = ()
+    else:
+        # check if the tag, value combination exists in the table
+        query = """SELECT id,value FROM %s """ % table_name
+        query += """ WHERE tag=%s AND value=%s"""
+        params = (tag, value)
+        try:
+            res = run_sql(query, params)
+        except Error, error:
+            write_message("   Error during the insert_record_bibxxx function : %s "
+                % error, verbose=1, stream=sys.stderr)
 
     # Note: compare now the found values one by one and look for
     # string binary equality (e.g. to respect lowercase/uppercase
@@ -947,6 +997,8 @@ def insert_record_bibxxx(tag, value, pretend=False):
     try:
         if not pretend:
             row_id = run_sql(query, params)
+            if _BIBXXX_ID_CACHE.has_key((tag, value)):
+                _BIBXXX_ID_CACHE[(tag, value)] = row_id
         else:
             return (table_name, 1)
     except Error, error:
@@ -954,6 +1006,50 @@ def insert_record_bibxxx(tag, value, pretend=False):
             % error, verbose=1, stream=sys.stderr)
     return (table_name, row_id)
 
+def prefetch_record_bibxxx_ids(records):
+    """Look up with grouped queries the bibxxx ids of all the tag,value
+    combinations present in RECORDS and store them in the session
+    cache consulted by insert_record_bibxxx().  Combinations that are
+    not found are remembered as such, so that they can be inserted
+    without being looked for again."""
+    if len(_BIBXXX_ID_CACHE) > CFG_BIBUPLOAD_BIBXXX_ID_CACHE_SIZE:
+        _BIBXXX_ID_CACHE.clear()
+    # group the combinations that are not known yet by bibxxx table:
+    pairs_by_table = {}
+    for record in records:
+        for full_tag, value, dummy_field_number in get_record_bibxxx_values(record):
+            if not _BIBXXX_ID_CACHE.has_key((full_tag, value)):
+                table_name = 'bib' + full_tag[0:2] + 'x'
+                pairs_by_table.setdefault(table_name, {})[(full_tag, value)] = None
+    for table_name, pairs in pairs_by_table.items():
+        pairs = pairs.keys()
+        found = {}
+        for i in range(0, len(pairs), 100):
+            pairs_chunk = pairs[i:i + 100]
+            query = """SELECT id,tag,value FROM %s WHERE """ % table_name
+            query += " OR ".join(["(tag=%s AND value=%s)"] * len(pairs_chunk))
+            params = []
+            for full_tag, value in pairs_chunk:
+                params.extend([full_tag, value])
+            try:
+                res = run_sql(query, tuple(params))
+            except Error, error:
+                write_message("   Error during the prefetch_record_bibxxx_ids function : %s "
+                    % error, verbose=1, stream=sys.stderr)
+                # do not cache anything about this chunk
+                for pair in pairs_chunk:
+                    found[pair] = False
+                continue
+            # Note: as in insert_record_bibxxx(), compare found values
+            # in Python to respect binary string equality.
+            for row_id, row_tag, row_value in res:
+                if not found.has_key((row_tag, row_value)):
+                    found[(row_tag, row_value)] = row_id
+        for pair in pairs:
+            row_id = found.get(pair)
+            if row_id is not False:
+                _BIBXXX_ID_CACHE[pair] = row_id
+
 def insert_record_bibrec_bibxxx(table_name, id_bibxxx,
         field_number, id_bibrec, pretend=False):
     """Insert the record into bibrec_bibxxx"""
@@ -974,6 +1070,24 @@ def insert_record_bibrec_bibxxx(table_name, id_bibxxx,
             " function 2nd query : %s " % error, verbose=1, stream=sys.stderr)
     return res
 
+def insert_record_bibrec_bibxxx_rows(table_name, rows, pretend=False):
+    """Insert ROWS, a list of (id_bibrec, id_bibxxx, field_number)
+    tuples, into the bibrec_bibxxx table corresponding to TABLE_NAME
+    by means of multi-row inserts."""
+    full_table_name = 'bibrec_'+ table_name
+    query = """INSERT INTO %s """ % full_table_name
+    query += """(id_bibrec,id_bibxxx, field_number) values (%s , %s, %s)"""
+    res = None
+    try:
+        if not pretend:
+            res = run_sql_many(query, rows)
+        else:
+            return 1
+    except Error, error:
+        write_message("   Error during the insert_record_bibrec_bibxxx_rows"
+            " function : %s " % error, verbose=1, stream=sys.stderr)
+    return res
+
 def synchronize_8564(rec_id, record, record_had_FFT, pretend=False):
     """
     Synchronize 8564_ tags and BibDocFile tables.
@@ -1691,8 +1805,10 @@ def archive_marcxml_for_history(recID, pretend=False):
         return 1
     return 0
 
-def update_database_with_metadata(record, rec_id, oai_rec_id = "oai", pretend=False):
-    """Update the database tables with the record and the record id given in parameter"""
+def get_record_bibxxx_values(record):
+    """Return the list of (full_tag, value, field_number) triples of
+    RECORD that are to be stored in the bibxxx tables."""
+    values = []
     for tag in record.keys():
         # check if tag is not a special one:
         if tag not in CFG_BIBUPLOAD_SPECIAL_TAGS:
@@ -1724,18 +1840,7 @@ def update_database_with_metadata(record, rec_id, oai_rec_id = "oai", pretend=Fa
                     value = single_tuple[3]
                     # get the full tag
                     full_tag = ''.join(tag_list)
-
-                    # update the tables
-                    write_message("   insertion of the tag "+full_tag+" with the value "+value, verbose=9)
-                    # insert the tag and value into into bibxxx
-                    (table_name, bibxxx_row_id) = insert_record_bibxxx(full_tag, value, pretend=pretend)
-                    #print 'tname, bibrow', table_name, bibxxx_row_id;
-                    if table_name is None or bibxxx_row_id is None:
-                        write_message("   Failed : during insert_record_bibxxx", verbose=1, stream=sys.stderr)
-                    # connect bibxxx and bibrec with the table bibrec_bibxxx
-                    res = insert_record_bibrec_bibxxx(table_name, bibxxx_row_id, datafield_number, rec_id, pretend=pretend)
-                    if res is None:
-                        write_message("   Failed : during insert_record_bibrec_bibxxx", verbose=1, stream=sys.stderr)
+                    values.append((full_tag, value, datafield_number))
                 else:
                     # get the tag and value from the content of each subfield
                     for subfield in subfield_list:
@@ -1744,21 +1849,50 @@ def update_database_with_metadata(record, rec_id, oai_rec_id = "oai", pretend=Fa
                         tag_list.append(subtag)
                         # get the full tag
                         full_tag = ''.join(tag_list)
-                        # update the tables
-                        write_message("   insertion of the tag "+full_tag+" with the value "+value, verbose=9)
-                        # insert the tag and value into into bibxxx
-                        (table_name, bibxxx_row_id) = insert_record_bibxxx(full_tag, value, pretend=pretend)
-                        if table_name is None or bibxxx_row_id is None:
-                            write_message("   Failed : during insert_record_bibxxx", verbose=1, stream=sys.stderr)
-                        # connect bibxxx and bibrec with the table bibrec_bibxxx
-                        res = insert_record_bibrec_bibxxx(table_name, bibxxx_row_id, datafield_number, rec_id, pretend=pretend)
-                        if res is None:
-                            write_message("   Failed : during insert_record_bibrec_bibxxx", verbose=1, stream=sys.stderr)
+                        values.append((full_tag, value, datafield_number))
                         # remove the subtag from the list
                         tag_list.pop()
                 tag_list.pop()
                 tag_list.pop()
             tag_list.pop()
+    return values
+
+def prefetch_bibxxx_ids_by_batch(recs, batch_size):
+    """Iterate over the records RECS, looking up the bibxxx ids of
+    every group of BATCH_SIZE records by prefetch_record_bibxxx_ids()
+    before yielding them."""
+    batch = []
+    for record in recs:
+        batch.append(record)
+        if len(batch) >= batch_size:
+            prefetch_record_bibxxx_ids(batch)
+            for record_in_batch in batch:
+                yield record_in_batch
+            batch = []
+    if batch:
+        prefetch_record_bibxxx_ids(batch)
+        for record_in_batch in batch:
+            yield record_in_batch
+
+def update_database_with_metadata(record, rec_id, oai_rec_id = "oai", pretend=False):
+    """Update the database tables with the record and the record id given in parameter"""
+    # rows to insert into bibrec_bibxxx tables, grouped by table:
+    bibrec_bibxxx_rows = {}
+    for full_tag, value, datafield_number in get_record_bibxxx_values(record):
+        # update the tables
+        write_message("   insertion of the tag "+full_tag+" with the value "+value, verbose=9)
+        # insert the tag and value into into bibxxx
+        (table_name, bibxxx_row_id) = insert_record_bibxxx(full_tag, value, pretend=pretend)
+        if table_name is None or bibxxx_row_id is None:
+            write_message("   Failed : during insert_record_bibxxx", verbose=1, stream=sys.stderr)
+            # do not let this field make the other ones of its table fail
+            continue
+        # connect bibxxx and bibrec with the table bibrec_bibxxx
+        bibrec_bibxxx_rows.setdefault(table_name, []).append((rec_id, bibxxx_row_id, datafield_number))
+    for table_name, rows in bibrec_bibxxx_rows.items():
+        res = insert_record_bibrec_bibxxx_rows(table_name, rows, pretend=pretend)
+        if res is None:
+            write_message("   Failed : during insert_record_bibrec_bibxxx", verbose=1, stream=sys.stderr)
     write_message("   -Update the database with metadata : DONE", verbose=2)
 
     log_record_uploading(oai_rec_id, task_get_task_param('task_id', 0), rec_id, 'P', pretend=pretend)
@@ -1962,6 +2096,8 @@ Examples:
 \t\t\trecord does not exist (thus allocating it on-the-fly)
   --callback-url\tSend via a POST request a JSON-serialized answer (see admin guide), in
 \t\t\torder to provide a feedback to an external service about the outcome of the operation.
+  --batch\t\tlook up the existing metadata values of many records at once
+\t\t\t(faster for big input files)
 """,
             version=__revision__,
             specific_params=("ircazdS:fno",
@@ -1978,7 +2114,8 @@ Examples:
                    "holdingpen",
                    "pretend",
                    "force",
-                   "callback-url="
+                   "callback-url=",
+                   "batch"
                  ]),
             task_submit_elaborate_specific_parameter_fnc=task_submit_elaborate_specific_parameter,
             task_run_fnc=task_run_core)
@@ -2077,6 +2214,9 @@ def task_submit_elaborate_specific_parameter(key, value, opts, args):
 
     elif key in ("--callback-url", ):
         task_set_option('callback_url', value)
+
+    elif key in ("--batch", ):
+        task_set_option('batch', True)
     else:
         return False
     return True
@@ -2147,14 +2287,17 @@ def task_run_core():
     if task_get_option('file_path') is not None:
         write_message("start preocessing", verbose=3)
         task_update_progress("Reading XML input")
-        recs = xml_marc_to_records(open_marc_file(task_get_option('file_path')))
-        stat['nb_records_to_upload'] = len(recs)
+        # records are parsed one by one while being uploaded:
+        recs = xml_marc_file_to_records_iterator(task_get_option('file_path'))
         write_message("   -Open XML marc: DONE", verbose=2)
         task_sleep_now_if_required(can_stop_too=True)
         write_message("Entering records loop", verbose=3)
         callback_url = task_get_option('callback_url')
         results_for_callback = {'results': []}
         if recs is not None:
+            if task_get_option('batch') and \
+                   task_get_option("mode") != "holdingpen":
+                recs = prefetch_bibxxx_ids_by_batch(recs, CFG_BIBUPLOAD_BATCH_SIZE)
             # We proceed each record by record
             for record in recs:
                 record_id = record_extract_oai_id(record)
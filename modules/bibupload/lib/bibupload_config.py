@@ -28,3 +28,10 @@ CFG_BIBUPLOAD_CONTROLFIELD_TAGS = ['001', '002', '003', '004',
 
 CFG_BIBUPLOAD_SPECIAL_TAGS = ['FMT', 'FFT']
 
+## number of input records whose bibxxx ids are looked up together
+## when running in --batch mode:
+CFG_BIBUPLOAD_BATCH_SIZE = 1000
+
+## maximum number of (tag, value) pairs kept in the bibxxx id cache
+## of a --batch mode session before it gets cleared:
+CFG_BIBUPLOAD_BIBXXX_ID_CACHE_SIZE = 500000
@@ -4317,6 +4317,54 @@ allow any</subfield>
         self.assertEqual(test_web_page_content(testrec_expected_url, 'jekyll', 'j123ekyll', expected_text=expected_content_version), [])
 
 
+class BibUploadBatchModeTest(GenericBibUploadTest):
+    """Testing the grouped lookup of bibxxx ids used in batch mode."""
+
+    def setUp(self):
+        # pylint: disable=C0103
+        """Initialise the MARCXML variable"""
+        GenericBibUploadTest.setUp(self)
+        self.test = """<collection>
+        <record>
+        <datafield tag="245" ind1=" " ind2=" ">
+        <subfield code="a">batch mode test title</subfield>
+        </datafield>
+        <datafield tag="100" ind1=" " ind2=" ">
+        <subfield code="a">Tester, B</subfield>
+        </datafield>
+        </record>
+        <record>
+        <datafield tag="245" ind1=" " ind2=" ">
+        <subfield code="a">Batch Mode Test Title</subfield>
+        </datafield>
+        <datafield tag="100" ind1=" " ind2=" ">
+        <subfield code="a">Tester, B</subfield>
+        </datafield>
+        </record>
+        </collection>"""
+
+    def tearDown(self):
+        bibupload._BIBXXX_ID_CACHE.clear()
+        GenericBibUploadTest.tearDown(self)
+
+    def test_batch_insert(self):
+        """bibupload - batch mode, inserting records after grouped bibxxx lookup"""
+        recs = bibupload.xml_marc_to_records(self.test)
+        bibupload.prefetch_record_bibxxx_ids(recs)
+        recids = []
+        for rec in recs:
+            err, recid, msg = bibupload.bibupload(rec, opt_mode='insert')
+            self.assertEqual(err, 0)
+            recids.append(recid)
+        self.failUnless("batch mode test title" in print_record(recids[0], 'xm'))
+        self.failUnless("Batch Mode Test Title" in print_record(recids[1], 'xm'))
+        # the shared author value is stored only once...
+        self.assertEqual(run_sql("""SELECT COUNT(*) FROM bib10x
+                                    WHERE tag='100__a' AND value='Tester, B'""")[0][0], 1)
+        # ...while titles differing in case are stored separately:
+        self.assertEqual(len(run_sql("""SELECT DISTINCT id_bibxxx FROM bibrec_bib24x
+                                        WHERE id_bibrec IN (%s, %s)""", tuple(recids))), 2)
+
 TEST_SUITE = make_test_suite(BibUploadHoldingPenTest,
                              BibUploadInsertModeTest,
                              BibUploadAppendModeTest,
@@ -4334,7 +4382,8 @@ TEST_SUITE = make_test_suite(BibUploadHoldingPenTest,
                              BibUploadStrongTagsTest,
                              BibUploadFFTModeTest,
                              BibUploadPretendTest,
-                             BibUploadCallbackURLTest
+                             BibUploadCallbackURLTest,
+                             BibUploadBatchModeTest
                              )
 
 
@@ -22,7 +22,15 @@ Tool for caching important infos, which are slow to rebuild, but that
 rarely change.
 """
 
-from invenio.dbquery import run_sql, get_table_update_time
+from invenio.config import CFG_CACHEDIR, CFG_DATACACHER_SHARED_CACHE, \
+     CFG_DATACACHER_VERIFICATION_INTERVAL
+from invenio.dbquery import run_sql, get_tables_update_time
+from invenio.intbitset import intbitset
+from invenio.snapshotutils import make_directory
+import fcntl
+import marshal
+import os
+import tempfile
 import time
 
 class InvenioDataCacherError(Exception):
@@ -38,11 +46,28 @@ class DataCacher:
     The .timestamp and .cache objects are exposed to clients.  Most
     use cases use a dict internal structure for .cache, but some use
     lists.
+
+    When a shared backend is used, the cache is built by one process
+    only and the other processes load its serialized copy from the
+    backend (see DataCacherFileBackend).
+
+    The .nb_verifications and .nb_rebuilds counters tell how many times
+    the timestamp verifier and the cache filler were run.
     """
-    def __init__(self, cache_filler, timestamp_verifier):
+    def __init__(self, cache_filler, timestamp_verifier,
+                 shared_cache_name=None, shared_backend=None,
+                 verification_interval=None):
         """ @param cache_filler: a function that fills the cache dictionary.
             @param timestamp_verifier: a function that returns a timestamp for
                    checking if something has changed after cache creation.
+            @param shared_cache_name: the name under which the cache is
+                   stored in the shared backend; None means that the
+                   cache is not shared between processes.
+            @param shared_backend: the DataCacherFileBackend to use;
+                   defaults to the site-wide one, if any.
+            @param verification_interval: minimum number of seconds
+                   between two runs of the timestamp verifier; defaults
+                   to CFG_DATACACHER_VERIFICATION_INTERVAL.
         """
         self.timestamp = 0 # WARNING: may be exposed to clients
         self.cache = {} # WARNING: may be exposed to clients; lazy
@@ -53,30 +78,118 @@ class DataCacher:
         if not callable(timestamp_verifier):
             raise InvenioDataCacherError, "timestamp_verifier is not callable"
         self.timestamp_verifier = timestamp_verifier
+        if verification_interval is None:
+            verification_interval = CFG_DATACACHER_VERIFICATION_INTERVAL
+        self.verification_interval = verification_interval
+        self.last_verification_time = 0
+        self.nb_verifications = 0
+        self.nb_rebuilds = 0
+        if shared_backend is None and shared_cache_name:
+            shared_backend = get_default_shared_backend()
+        self.shared_cache_name = shared_cache_name
+        self.shared_backend = shared_backend
         self.is_ok_p = True
         self.create_cache()
 
     def clear(self):
         """Clear the cache rebuilding it."""
-        self.create_cache()
+        if self.shared_backend is not None:
+            self.create_shared_cache(reuse_stored_cache=False)
+        else:
+            self.create_cache()
 
     def create_cache(self):
         """
         Create and populate cache by calling cache filler.  Called on
         startup and used later during runtime as needed by clients.
         """
+        if self.shared_backend is not None:
+            self.create_shared_cache()
+            return
         # We empty the cache first to force freeing of the variable
         # this is useful when it is really big like our citations dictionary
         self.cache = None
 
         self.cache = self.cache_filler()
+        self.nb_rebuilds += 1
         self.timestamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
 
+    def create_shared_cache(self, reuse_stored_cache=True):
+        """
+        Populate cache from the shared backend if it stores a copy
+        that is still up to date, otherwise create it by calling cache
+        filler and store it in the backend.  The processes load the
+        stored copy concurrently, under a shared lock; only one
+        process at a time creates the cache, under an exclusive lock,
+        and the others wait for it and then load the stored copy.
+        """
+        name = self.shared_cache_name
+        backend = self.shared_backend
+        try:
+            if reuse_stored_cache:
+                backend.lock(name, shared=True)
+                try:
+                    if self.load_shared_cache():
+                        return
+                finally:
+                    backend.unlock(name)
+            backend.lock(name)
+        except (IOError, OSError):
+            # backend not usable, let us fall back to a private cache:
+            self.shared_backend = None
+            self.create_cache()
+            return
+        try:
+            # another process may have created the cache meanwhile:
+            if reuse_stored_cache and self.load_shared_cache():
+                return
+            self.cache = None
+            self.cache = self.cache_filler()
+            self.nb_rebuilds += 1
+            self.timestamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
+            try:
+                backend.store(name, self.timestamp,
+                              self.serialize_cache(self.cache))
+            except (IOError, OSError, ValueError):
+                # the cache stays private to this process
+                pass
+        finally:
+            backend.unlock(name)
+
+    def load_shared_cache(self):
+        """
+        Populate cache from the copy stored in the shared backend and
+        return True, if it is still up to date; otherwise return False.
+        """
+        stored = self.shared_backend.load(self.shared_cache_name)
+        if stored is None or stored[0] < str(self.timestamp_verifier()):
+            return False
+        self.cache = None
+        self.cache = self.deserialize_cache(stored[1])
+        self.timestamp = stored[0]
+        return True
+
+    def serialize_cache(self, cache):
+        """Return CACHE serialized into a string for the shared backend."""
+        return marshal.dumps(_encode_intbitsets(cache))
+
+    def deserialize_cache(self, data):
+        """Return the cache serialized by serialize_cache() into DATA."""
+        return _decode_intbitsets(marshal.loads(data))
+
     def recreate_cache_if_needed(self):
         """
         Recreate cache if needed, by verifying the cache timestamp
-        against the timestamp verifier function.
+        against the timestamp verifier function.  The verification is
+        skipped if the previous one is more recent than the
+        verification interval.
         """
+        if self.verification_interval:
+            now = time.time()
+            if now - self.last_verification_time < self.verification_interval:
+                return
+            self.last_verification_time = now
+        self.nb_verifications += 1
         if self.timestamp_verifier() > self.timestamp:
             self.create_cache()
 
@@ -101,10 +214,238 @@ class SQLDataCacher(DataCacher):
         def timestamp_verifier():
             """The standard timestamp verifier is looking at affected
             tables time stamp."""
-            return max([get_table_update_time(table)
-                for table in self.affected_tables])
+            return get_tables_update_time(self.affected_tables)
 
         DataCacher.__init__(self, cache_filler, timestamp_verifier)
 
+def _encode_intbitsets(obj):
+    """Return OBJ with its intbitsets replaced by marshallable
+    {'__intbitset__': fastdump} dictionaries.  Only dictionary values
+    are looked at, not the items of lists or tuples."""
+    if isinstance(obj, intbitset):
+        return {'__intbitset__': obj.fastdump()}
+    elif isinstance(obj, dict):
+        ret = {}
+        for key, value in obj.iteritems():
+            if isinstance(value, (dict, intbitset)):
+                value = _encode_intbitsets(value)
+            ret[key] = value
+        return ret
+    return obj
+
+def _decode_intbitsets(obj):
+    """Reverse operation of _encode_intbitsets()."""
+    if isinstance(obj, dict):
+        if len(obj) == 1 and obj.has_key('__intbitset__'):
+            return intbitset(obj['__intbitset__'])
+        for key, value in obj.iteritems():
+            if isinstance(value, dict):
+                obj[key] = _decode_intbitsets(value)
+    return obj
+
+class DataCacherFileBackend:
+    """
+    Storage of serialized DataCacher caches, shared by all the
+    processes of the machine.  Every cache is stored under its name,
+    together with its timestamp, in a file of a local directory
+    (ideally on a memory-backed file system), written atomically.
+    File locks are used as rebuilding locks.
+    """
+    def __init__(self, directory):
+        """ @param directory: where to store the cache files.
+        """
+        self.directory = directory
+        self.lock_files = {}
+
+    def _get_path(self, name, extension):
+        """Return the path of the file storing NAME with EXTENSION."""
+        return os.path.join(self.directory, '%s.%s' % (name, extension))
+
+    def load(self, name):
+        """Return (timestamp, data) of the cache NAME, or None."""
+        try:
+            cache_file = open(self._get_path(name, 'cache'), 'rb')
+        except IOError:
+            return None
+        try:
+            timestamp = cache_file.readline().rstrip('\n')
+            data = cache_file.read()
+        finally:
+            cache_file.close()
+        return (timestamp, data)
+
+    def store(self, name, timestamp, data):
+        """Store DATA as the cache NAME created at TIMESTAMP."""
+        fd, tmp_path = tempfile.mkstemp(prefix=name, dir=self.directory)
+        try:
+            cache_file = os.fdopen(fd, 'wb')
+            cache_file.write(timestamp + '\n')
+            cache_file.write(data)
+            cache_file.close()
+            os.rename(tmp_path, self._get_path(name, 'cache'))
+        except:
+            os.remove(tmp_path)
+            raise
+
+    def lock(self, name, shared=False):
+        """Wait until this process is the only one to hold the
+        rebuilding lock of the cache NAME or, if SHARED, until no
+        process holds it exclusively."""
+        if not os.path.isdir(self.directory):
+            make_directory(self.directory)
+        lock_file = open(self._get_path(name, 'lock'), 'a')
+        if shared:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_SH)
+        else:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        self.lock_files[name] = lock_file
+
+    def unlock(self, name):
+        """Release the rebuilding lock of the cache NAME."""
+        lock_file = self.lock_files.pop(name, None)
+        if lock_file is not None:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+            lock_file.close()
+
+_DEFAULT_SHARED_BACKEND = None
+
+def get_default_shared_backend():
+    """Return the site-wide shared backend of data caches, or None if
+    caches are not to be shared (see CFG_DATACACHER_SHARED_CACHE)."""
+    global _DEFAULT_SHARED_BACKEND
+    if _DEFAULT_SHARED_BACKEND is None and CFG_DATACACHER_SHARED_CACHE:
+        _DEFAULT_SHARED_BACKEND = DataCacherFileBackend(
+            os.path.join(CFG_CACHEDIR, 'datacacher'))
+    return _DEFAULT_SHARED_BACKEND
+
+class LRUCache:
+    """
+    Size-bounded mapping that forgets its least recently used items
+    first.  Useful for caching many small things (e.g. hitsets of
+    popular search terms) where the full set of possible keys is too
+    large to be held in memory.
+
+    The .hits and .misses counters are exposed to clients so that
+    cache sizes can be tuned.
+
+    Subclasses that verify whether their items are still up to date
+    should do it only when verification_due_p() says so, in order to
+    throttle the verifications like DataCacher does.
+    """
+    def __init__(self, maxsize, verification_interval=None):
+        """ @param maxsize: maximum number of items to keep in the cache;
+                   0 means that nothing will be cached.
+            @param verification_interval: minimum number of seconds
+                   between two verifications of the cached items;
+                   defaults to CFG_DATACACHER_VERIFICATION_INTERVAL.
+        """
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        if verification_interval is None:
+            verification_interval = CFG_DATACACHER_VERIFICATION_INTERVAL
+        self.verification_interval = verification_interval
+        self.last_verification_time = 0
+        self.nb_verifications = 0
+        self.clear()
+
+    def verification_due_p(self):
+        """
+        Return True if the cached items are to be verified now, i.e. if
+        the previous verification is older than the verification
+        interval, and count the verification.
+        """
+        if self.verification_interval:
+            now = time.time()
+            if now - self.last_verification_time < self.verification_interval:
+                return False
+            self.last_verification_time = now
+        self.nb_verifications += 1
+        return True
+
+    def clear(self):
+        """Forget all the cached items (but not the statistics)."""
+        # self.items maps key to its node in a circular doubly linked
+        # list [prev, next, key, value] ordered by last access time;
+        # self.root.next is the least recently used node.
+        self.root = []
+        self.root[:] = [self.root, self.root, None, None]
+        self.items = {}
+
+    def __len__(self):
+        return len(self.items)
+
+    def __contains__(self, key):
+        return key in self.items
+
+    def keys(self):
+        """Return cached keys, from the least to the most recently used."""
+        out = []
+        node = self.root[1]
+        while node is not self.root:
+            out.append(node[2])
+            node = node[1]
+        return out
+
+    def get(self, key, default=None):
+        """Return cached value for KEY, or DEFAULT if not cached."""
+        node = self.items.get(key)
+        if node is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self._unlink(node)
+        self._link_last(node)
+        return node[3]
+
+    def peek(self, key, default=None):
+        """Return cached value for KEY, or DEFAULT if not cached,
+        without counting the access in the statistics nor in the
+        access order."""
+        node = self.items.get(key)
+        if node is None:
+            return default
+        return node[3]
+
+    def set(self, key, value):
+        """Store VALUE under KEY, evicting the least recently used item
+        if the cache is full."""
+        if self.maxsize <= 0:
+            return
+        node = self.items.get(key)
+        if node is not None:
+            node[3] = value
+            self._unlink(node)
+            self._link_last(node)
+            return
+        if len(self.items) >= self.maxsize:
+            oldest = self.root[1]
+            self._unlink(oldest)
+            del self.items[oldest[2]]
+        node = [None, None, key, value]
+        self._link_last(node)
+        self.items[key] = node
+
+    def remove(self, key):
+        """Forget item KEY, if cached."""
+        node = self.items.pop(key, None)
+        if node is not None:
+            self._unlink(node)
+
+    def remove_if(self, predicate):
+        """Forget all items whose key satisfies PREDICATE."""
+        for key in [key for key in self.items if predicate(key)]:
+            self.remove(key)
 
+    def _unlink(self, node):
+        """Take NODE out of the access order list."""
+        node[0][1] = node[1]
+        node[1][0] = node[0]
 
+    def _link_last(self, node):
+        """Put NODE at the most recently used end of the list."""
+        last = self.root[0]
+        node[0] = last
+        node[1] = self.root
+        last[1] = node
+        self.root[0] = node
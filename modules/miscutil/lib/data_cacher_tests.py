@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+##
+## This file is part of Invenio.
+## Copyright (C) 2012 CERN.
+##
+## Invenio is free software; you can redistribute it and/or
+## modify it under the terms of the GNU General Public License as
+## published by the Free Software Foundation; either version 2 of the
+## License, or (at your option) any later version.
+##
+## Invenio is distributed in the hope that it will be useful, but
+## WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+## General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with Invenio; if not, write to the Free Software Foundation, Inc.,
+## 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+
+"""Unit tests for the data cacher library."""
+
+__revision__ = "$Id$"
+
+import marshal
+import shutil
+import tempfile
+import unittest
+
+from invenio.data_cacher import DataCacher, DataCacherFileBackend, LRUCache
+from invenio.intbitset import intbitset
+from invenio.testutils import make_test_suite, run_test_suite
+
+class TestLRUCache(unittest.TestCase):
+    """Test the size-bounded LRU cache."""
+
+    def test_get_and_set(self):
+        """data cacher - LRU cache get and set"""
+        cache = LRUCache(3)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('c'), None)
+        self.assertEqual(cache.get('c', 0), 0)
+        self.assertEqual(len(cache), 2)
+        self.assert_('b' in cache)
+
+    def test_eviction_of_least_recently_used(self):
+        """data cacher - LRU cache evicts least recently used items"""
+        cache = LRUCache(3)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.set('c', 3)
+        cache.get('a')
+        cache.set('d', 4)
+        self.assertEqual(cache.keys(), ['c', 'a', 'd'])
+        cache.set('c', 33)
+        cache.set('e', 5)
+        self.assertEqual(cache.keys(), ['d', 'c', 'e'])
+        self.assertEqual(cache.get('c'), 33)
+
+    def test_statistics(self):
+        """data cacher - LRU cache hit and miss counters"""
+        cache = LRUCache(2)
+        cache.set('a', 1)
+        cache.get('a')
+        cache.get('a')
+        cache.get('b')
+        self.assertEqual((cache.hits, cache.misses), (2, 1))
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+        self.assertEqual((cache.hits, cache.misses), (2, 1))
+
+    def test_peek(self):
+        """data cacher - LRU cache peek does not touch the statistics"""
+        cache = LRUCache(2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        self.assertEqual(cache.peek('a'), 1)
+        self.assertEqual(cache.peek('c', 0), 0)
+        self.assertEqual((cache.hits, cache.misses), (0, 0))
+        cache.set('c', 3)
+        self.assertEqual(cache.keys(), ['b', 'c'])
+
+    def test_remove_if(self):
+        """data cacher - LRU cache removal of selected keys"""
+        cache = LRUCache(10)
+        for key in range(6):
+            cache.set(key, key)
+        cache.remove_if(lambda key: key % 2)
+        self.assertEqual(cache.keys(), [0, 2, 4])
+        cache.remove(2)
+        cache.remove(7)
+        self.assertEqual(cache.keys(), [0, 4])
+
+    def test_zero_size(self):
+        """data cacher - LRU cache of zero size caches nothing"""
+        cache = LRUCache(0)
+        cache.set('a', 1)
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.get('a'), None)
+
+    def test_throttled_verification(self):
+        """data cacher - LRU cache verification is throttled by interval"""
+        cache = LRUCache(2, verification_interval=3600)
+        self.assert_(cache.verification_due_p())
+        self.failIf(cache.verification_due_p())
+        cache.last_verification_time -= 3600
+        self.assert_(cache.verification_due_p())
+        self.assertEqual(cache.nb_verifications, 2)
+        cache = LRUCache(2, verification_interval=0)
+        self.assert_(cache.verification_due_p())
+        self.assert_(cache.verification_due_p())
+
+class TestDataCacherVerification(unittest.TestCase):
+    """Test the verification of data cacher timestamps."""
+
+    def setUp(self):
+        """Prepare a timestamp verifier counting its runs"""
+        self.update_time = '2012-01-01 00:00:00'
+        self.verifications = 0
+
+    def _create_data_cacher(self, verification_interval):
+        """Return a data cacher using the test timestamp verifier."""
+        def cache_filler():
+            return {}
+        def timestamp_verifier():
+            self.verifications += 1
+            return self.update_time
+        return DataCacher(cache_filler, timestamp_verifier,
+                          verification_interval=verification_interval)
+
+    def test_counters(self):
+        """data cacher - verification and rebuild counters"""
+        cacher = self._create_data_cacher(0)
+        self.assertEqual(cacher.nb_rebuilds, 1)
+        cacher.recreate_cache_if_needed()
+        cacher.recreate_cache_if_needed()
+        self.assertEqual(cacher.nb_verifications, 2)
+        self.assertEqual(cacher.nb_rebuilds, 1)
+        self.update_time = '9999-01-01 00:00:00'
+        cacher.recreate_cache_if_needed()
+        self.assertEqual(cacher.nb_verifications, 3)
+        self.assertEqual(cacher.nb_rebuilds, 2)
+
+    def test_throttled_verification(self):
+        """data cacher - verification is throttled by interval"""
+        cacher = self._create_data_cacher(3600)
+        cacher.recreate_cache_if_needed()
+        self.update_time = '9999-01-01 00:00:00'
+        cacher.recreate_cache_if_needed()
+        self.assertEqual(self.verifications, 1)
+        self.assertEqual(cacher.nb_rebuilds, 1)
+        cacher.last_verification_time -= 3600
+        cacher.recreate_cache_if_needed()
+        self.assertEqual(self.verifications, 2)
+        self.assertEqual(cacher.nb_rebuilds, 2)
+
+class TestDataCacherSharedBackend(unittest.TestCase):
+    """Test the sharing of caches between data cachers."""
+
+    def setUp(self):
+        """Prepare a file backend in a temporary directory"""
+        self.directory = tempfile.mkdtemp()
+        self.backend = DataCacherFileBackend(self.directory)
+        self.fillings = 0
+        self.update_time = '2012-01-01 00:00:00'
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _create_data_cacher(self):
+        """Return a data cacher shared via the test backend."""
+        def cache_filler():
+            self.fillings += 1
+            return {'numbers': [1, 2, 3],
+                    'sets': {'a': intbitset([1, 5, 7])},
+                    'all': intbitset([10, 20])}
+        def timestamp_verifier():
+            return self.update_time
+        return DataCacher(cache_filler, timestamp_verifier,
+                          shared_cache_name='test', shared_backend=self.backend)
+
+    def test_stored_cache_is_reused(self):
+        """data cacher - shared cache is built only once"""
+        cacher1 = self._create_data_cacher()
+        cacher2 = self._create_data_cacher()
+        self.assertEqual(self.fillings, 1)
+        self.assertEqual(cacher1.cache, cacher2.cache)
+        self.assertEqual(cacher2.cache['sets']['a'], intbitset([1, 5, 7]))
+        self.assertEqual(cacher2.cache['all'], intbitset([10, 20]))
+        self.assertEqual(cacher1.timestamp, cacher2.timestamp)
+
+    def test_outdated_stored_cache_is_rebuilt(self):
+        """data cacher - outdated shared cache is rebuilt"""
+        cacher1 = self._create_data_cacher()
+        self.update_time = '9999-01-01 00:00:00'
+        cacher1.recreate_cache_if_needed()
+        self.assertEqual(self.fillings, 2)
+        self._create_data_cacher()
+        self.assertEqual(self.fillings, 3)
+
+    def test_clear_rebuilds_shared_cache(self):
+        """data cacher - clearing shared cache rebuilds it"""
+        cacher1 = self._create_data_cacher()
+        cacher1.clear()
+        self.assertEqual(self.fillings, 2)
+
+    def _record_locks(self, before_exclusive_lock=None):
+        """Record the locks taken on the test backend, calling
+        BEFORE_EXCLUSIVE_LOCK() before any exclusive one."""
+        locks = []
+        lock = self.backend.lock
+        def record_lock(name, shared=False):
+            locks.append(shared)
+            if not shared and before_exclusive_lock is not None:
+                before_exclusive_lock()
+            lock(name, shared)
+        self.backend.lock = record_lock
+        return locks
+
+    def test_stored_cache_is_loaded_under_shared_lock(self):
+        """data cacher - up-to-date shared cache is loaded concurrently"""
+        self._create_data_cacher()
+        locks = self._record_locks()
+        self._create_data_cacher()
+        self.assertEqual(locks, [True])
+        self.update_time = '9999-01-01 00:00:00'
+        self._create_data_cacher()
+        self.assertEqual(locks, [True, True, False])
+        self.assertEqual(self.fillings, 2)
+
+    def test_cache_rebuilt_meanwhile_is_loaded(self):
+        """data cacher - shared cache rebuilt by another process is reused"""
+        self._create_data_cacher()
+        self.update_time = '9999-01-01 00:00:00'
+        def rebuild_in_another_process():
+            self.backend.store('test', self.update_time,
+                               marshal.dumps({'numbers': [4]}))
+        self._record_locks(rebuild_in_another_process)
+        cacher = self._create_data_cacher()
+        self.assertEqual(self.fillings, 1)
+        self.assertEqual(cacher.cache, {'numbers': [4]})
+
+TEST_SUITE = make_test_suite(TestLRUCache,
+                             TestDataCacherVerification,
+                             TestDataCacherSharedBackend)
+
+if __name__ == "__main__":
+    run_test_suite(TEST_SUITE)
@@ -339,6 +339,29 @@ def get_table_update_time(tablename):
     # SELECT UPDATE_TIME FROM INFORMATION_SCHEMA.TABLES WHERE
     # table_name='collection'.
     res = run_sql("SHOW TABLE STATUS LIKE %s", (tablename,))
+    return max(_get_update_times_from_table_status(res))
+
+def get_tables_update_time(tablenames):
+    """Return the maximum update time of TABLENAMES, by means of one
+       query only.  Table names can contain wildcard `%'.
+    """
+    tablenames = list(tablenames)
+    if len(tablenames) == 1:
+        return get_table_update_time(tablenames[0])
+    try:
+        # Note: the WHERE clause needs MySQL-5.0 or later
+        res = run_sql("SHOW TABLE STATUS WHERE " + \
+                      " OR ".join(["Name LIKE %s"] * len(tablenames)),
+                      tuple(tablenames))
+    except (ProgrammingError, OperationalError):
+        return max([get_table_update_time(tablename)
+                    for tablename in tablenames])
+    return max(_get_update_times_from_table_status(res))
+
+def _get_update_times_from_table_status(res):
+    """Return the list of update times found in RES, the result of a
+       SHOW TABLE STATUS query.
+    """
     update_times = [] # store all update times
     for row in res:
         if type(row[10]) is long or \
@@ -351,7 +374,7 @@ def get_table_update_time(tablename):
             # of type datetime.datetime or str (depending on the
             # version of MySQLdb), so return next column:
             update_times.append(str(row[11]))
-    return max(update_times)
+    return update_times
 
 def get_table_status_info(tablename):
     """Return table status information on TABLENAME.  Returned is a
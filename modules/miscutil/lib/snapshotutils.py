@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+##
+## This file is part of Invenio.
+## Copyright (C) 2012 CERN.
+##
+## Invenio is free software; you can redistribute it and/or
+## modify it under the terms of the GNU General Public License as
+## published by the Free Software Foundation; either version 2 of the
+## License, or (at your option) any later version.
+##
+## Invenio is distributed in the hope that it will be useful, but
+## WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+## General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with Invenio; if not, write to the Free Software Foundation, Inc.,
+## 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+
+"""
+Timestamped snapshots shared through memory maps.
+
+A snapshot holds some data serialized as of a timestamp in a file
+named NAME_TIMESTAMP.EXTENSION (e.g. citationdict_20111012101010.csr).
+The file is written atomically, the older versions of the same NAME
+are removed, and the processes memory-map it read-only, so that all
+the Apache processes of the machine share the same pages instead of
+holding each their own copy of the data.  The snapshot classes, e.g.
+CitationGraph or SortWeights, are instantiated with the serialized
+data and the path of the file (None when the data is kept in memory)
+and raise ValueError when the data is not what they expect.
+"""
+
+__revision__ = "$Id$"
+
+import os
+import re
+import mmap
+import struct
+
+def make_directory(directory):
+    """Create DIRECTORY and its missing parents, unless it exists
+    already, maybe created meanwhile by another process."""
+    try:
+        os.makedirs(directory)
+    except OSError:
+        if not os.path.isdir(directory):
+            raise
+
+def write_file_atomically(path, data):
+    """Write DATA to the file PATH, creating its directory if needed,
+    so that the other processes read either the old or the new
+    content of the file, but never a partial one."""
+    directory = os.path.dirname(path)
+    if not os.path.isdir(directory):
+        make_directory(directory)
+    tmp_path = '%s.%s.tmp' % (path, os.getpid())
+    try:
+        tmp_file = open(tmp_path, 'wb')
+        try:
+            tmp_file.write(data)
+        finally:
+            tmp_file.close()
+        os.rename(tmp_path, path)
+    except EnvironmentError:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def get_snapshot_path(directory, name, timestamp, extension):
+    """Return the path of the file of DIRECTORY storing the snapshot
+    NAME as of TIMESTAMP (e.g. '2011-10-12 10:10:10')."""
+    return os.path.join(directory, '%s_%s.%s' % (name,
+                                                 re.sub(r'\D', '', str(timestamp)),
+                                                 extension))
+
+def open_snapshot(path, snapshot_class):
+    """Return the SNAPSHOT_CLASS instance stored in PATH,
+    memory-mapped read-only, or None if the file does not exist or is
+    invalid."""
+    try:
+        snapshot_file = open(path, 'rb')
+    except IOError:
+        return None
+    try:
+        try:
+            data = mmap.mmap(snapshot_file.fileno(),
+                             os.fstat(snapshot_file.fileno()).st_size,
+                             access=mmap.ACCESS_READ)
+            return snapshot_class(data, path)
+        except (EnvironmentError, ValueError, struct.error):
+            return None
+    finally:
+        snapshot_file.close()
+
+def store_snapshot(path, data):
+    """Atomically write the serialized DATA to the snapshot file PATH
+    and remove the files of the older versions of the same snapshot."""
+    write_file_atomically(path, data)
+    # the processes still mapping the old files keep their pages until
+    # they open the new snapshot
+    directory, filename = os.path.split(path)
+    prefix = filename[:filename.rindex('_') + 1]
+    extension = os.path.splitext(filename)[1]
+    for other_filename in os.listdir(directory):
+        if other_filename != filename and other_filename.endswith(extension) \
+               and other_filename[:other_filename.rfind('_') + 1] == prefix:
+            try:
+                os.remove(os.path.join(directory, other_filename))
+            except OSError:
+                pass
+
+def load_snapshot(path, snapshot_class, data_builder):
+    """
+    Return the SNAPSHOT_CLASS instance stored in PATH.  Use the
+    memory-mapped file if a process has already stored it, otherwise
+    serialize the data by calling DATA_BUILDER() and store it for the
+    other processes.  If the file cannot be written, the data is kept
+    in memory.
+    """
+    snapshot = open_snapshot(path, snapshot_class)
+    if snapshot is not None:
+        return snapshot
+    data = data_builder()
+    try:
+        store_snapshot(path, data)
+    except EnvironmentError:
+        return snapshot_class(data, None)
+    snapshot = open_snapshot(path, snapshot_class)
+    if snapshot is None:
+        snapshot = snapshot_class(data, None)
+    return snapshot
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+##
+## This file is part of Invenio.
+## Copyright (C) 2012 CERN.
+##
+## Invenio is free software; you can redistribute it and/or
+## modify it under the terms of the GNU General Public License as
+## published by the Free Software Foundation; either version 2 of the
+## License, or (at your option) any later version.
+##
+## Invenio is distributed in the hope that it will be useful, but
+## WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+## General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with Invenio; if not, write to the Free Software Foundation, Inc.,
+## 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+
+"""Unit tests for the timestamped snapshots."""
+
+__revision__ = "$Id$"
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from invenio.testutils import make_test_suite, run_test_suite
+from invenio.snapshotutils import make_directory, write_file_atomically, \
+     get_snapshot_path, open_snapshot, store_snapshot, load_snapshot
+
+class Snapshot:
+    """Snapshot of a string starting with 'SNAP'."""
+
+    def __init__(self, data, path=None):
+        if data[:4] != 'SNAP':
+            raise ValueError, "not a snapshot"
+        self.text = data[4:]
+        self.path = path
+
+class TestSnapshotFiles(unittest.TestCase):
+    """Test storing and memory-mapping snapshots."""
+
+    def setUp(self):
+        # pylint: disable=C0103
+        """Initialize stuff"""
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        # pylint: disable=C0103
+        """Remove temporary files"""
+        shutil.rmtree(self.directory)
+
+    def test_make_directory(self):
+        """snapshotutils - creating a directory that may already exist"""
+        directory = os.path.join(self.directory, 'foo', 'bar')
+        make_directory(directory)
+        make_directory(directory)
+        self.assert_(os.path.isdir(directory))
+
+    def test_write_file_atomically(self):
+        """snapshotutils - writing files atomically in new directories"""
+        path = os.path.join(self.directory, 'foo', 'bar.txt')
+        write_file_atomically(path, 'bar')
+        write_file_atomically(path, 'baz')
+        self.assertEqual('baz', open(path).read())
+        self.assertEqual(['bar.txt'], os.listdir(os.path.dirname(path)))
+
+    def test_get_snapshot_path(self):
+        """snapshotutils - path depends on the timestamp"""
+        self.assertEqual(os.path.join(self.directory, 'citationdict_20111012101010.csr'),
+                         get_snapshot_path(self.directory, 'citationdict', '2011-10-12 10:10:10', 'csr'))
+
+    def test_store_and_open(self):
+        """snapshotutils - memory-mapping a stored snapshot"""
+        path = get_snapshot_path(self.directory, 'foo', '2012-03-12 10:10:10', 'snap')
+        store_snapshot(path, 'SNAPbar')
+        snapshot = open_snapshot(path, Snapshot)
+        self.assertEqual('bar', snapshot.text)
+        self.assertEqual(path, snapshot.path)
+
+    def test_open_invalid_snapshot(self):
+        """snapshotutils - opening missing or invalid snapshots"""
+        path = os.path.join(self.directory, 'foo_20120312101010.snap')
+        self.assertEqual(None, open_snapshot(path, Snapshot))
+        store_snapshot(path, 'SNIPbar')
+        self.assertEqual(None, open_snapshot(path, Snapshot))
+
+    def test_store_removes_older_versions(self):
+        """snapshotutils - removing outdated snapshots of the same name only"""
+        for filename in ('3_20120312101010.snap', '13_20120312101010.snap',
+                         'cited_by_20120312101010.snap', 'by_20120312101010.snap',
+                         '3_20120313101010.snap'):
+            store_snapshot(os.path.join(self.directory, filename), 'SNAP')
+        store_snapshot(os.path.join(self.directory, 'by_20120313101010.snap'), 'SNAP')
+        self.assertEqual(['13_20120312101010.snap', '3_20120313101010.snap',
+                          'by_20120313101010.snap', 'cited_by_20120312101010.snap'],
+                         sorted(os.listdir(self.directory)))
+
+    def test_load_snapshot(self):
+        """snapshotutils - building a snapshot only once"""
+        path = os.path.join(self.directory, 'foo_20120312101010.snap')
+        built = []
+        def data_builder():
+            built.append(True)
+            return 'SNAPbar'
+        self.assertEqual(path, load_snapshot(path, Snapshot, data_builder).path)
+        self.assertEqual('bar', load_snapshot(path, Snapshot, data_builder).text)
+        self.assertEqual(1, len(built))
+
+    def test_load_snapshot_in_memory(self):
+        """snapshotutils - keeping a snapshot in memory if it cannot be stored"""
+        # the directory of the snapshot cannot be created over a file:
+        open(os.path.join(self.directory, 'foo'), 'w').close()
+        path = os.path.join(self.directory, 'foo', 'foo_20120312101010.snap')
+        snapshot = load_snapshot(path, Snapshot, lambda: 'SNAPbar')
+        self.assertEqual('bar', snapshot.text)
+        self.assertEqual(None, snapshot.path)
+
+TEST_SUITE = make_test_suite(TestSnapshotFiles,)
+
+if __name__ == "__main__":
+    run_test_suite(TEST_SUITE)
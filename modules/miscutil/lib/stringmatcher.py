@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+##
+## This file is part of Invenio.
+## Copyright (C) 2012 CERN.
+##
+## Invenio is free software; you can redistribute it and/or
+## modify it under the terms of the GNU General Public License as
+## published by the Free Software Foundation; either version 2 of the
+## License, or (at your option) any later version.
+##
+## Invenio is distributed in the hope that it will be useful, but
+## WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+## General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with Invenio; if not, write to the Free Software Foundation, Inc.,
+## 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+
+"""
+Finding many strings in a text in one pass.
+
+The strings, e.g. the periodical titles of refextract or the literal
+parts of the single keywords of BibClassify, are compiled into an
+Aho-Corasick automaton by build_string_matcher(), and find_strings()
+then returns all the strings present in a text by reading it only
+once, instead of searching for every string in turn.
+
+This module does not depend on the rest of Invenio, so that the
+standalone tools can use it as well.
+"""
+
+__revision__ = "$Id$"
+
+def build_string_matcher(strings):
+    """
+    Return the Aho-Corasick automaton of the list STRINGS, to be
+    passed to find_strings().  The empty strings (or None) of the list
+    are never found; this way, the positions returned by find_strings()
+    are those of the list of the caller.
+
+    The automaton is a tuple (transitions, failures, outputs), where
+    transitions holds for each state a dictionary {char: state},
+    failures the failure transition of each state, and outputs the
+    tuple of the positions in STRINGS of the strings ending at each
+    state.
+    """
+    transitions = [{}]
+    outputs = [()]
+    for position, string in enumerate(strings):
+        if not string:
+            continue
+        state = 0
+        for char in string:
+            next_state = transitions[state].get(char)
+            if next_state is None:
+                next_state = len(transitions)
+                transitions.append({})
+                outputs.append(())
+                transitions[state][char] = next_state
+            state = next_state
+        outputs[state] = outputs[state] + (position,)
+
+    # Compute the failure transitions breadth-first, so that the
+    # failure state of each state is complete when it is reached:
+    failures = [0] * len(transitions)
+    queue = transitions[0].values()
+    i = 0
+    while i < len(queue):
+        state = queue[i]
+        i += 1
+        for char, next_state in transitions[state].iteritems():
+            queue.append(next_state)
+            failure = failures[state]
+            while failure and not transitions[failure].has_key(char):
+                failure = failures[failure]
+            failure = transitions[failure].get(char, 0)
+            failures[next_state] = failure
+            if outputs[failure]:
+                outputs[next_state] = outputs[next_state] + outputs[failure]
+    return (transitions, failures, outputs)
+
+def find_strings(text, matcher):
+    """
+    Return the sorted list of the positions of the strings of MATCHER
+    (see build_string_matcher()) that are present in TEXT.
+    """
+    transitions, failures, outputs = matcher
+    found = {}
+    state = 0
+    for char in text:
+        while state and not transitions[state].has_key(char):
+            state = failures[state]
+        state = transitions[state].get(char, 0)
+        for position in outputs[state]:
+            found[position] = None
+    positions = found.keys()
+    positions.sort()
+    return positions
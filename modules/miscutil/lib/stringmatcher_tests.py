@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+##
+## This file is part of Invenio.
+## Copyright (C) 2012 CERN.
+##
+## Invenio is free software; you can redistribute it and/or
+## modify it under the terms of the GNU General Public License as
+## published by the Free Software Foundation; either version 2 of the
+## License, or (at your option) any later version.
+##
+## Invenio is distributed in the hope that it will be useful, but
+## WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+## General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with Invenio; if not, write to the Free Software Foundation, Inc.,
+## 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+
+"""Unit tests for finding many strings in a text in one pass."""
+
+__revision__ = "$Id$"
+
+import unittest
+
+from invenio.testutils import make_test_suite, run_test_suite
+from invenio.stringmatcher import build_string_matcher, find_strings
+
+class TestStringMatcher(unittest.TestCase):
+    """Test finding strings with the Aho-Corasick automaton."""
+
+    def _find_strings_naively(self, text, strings):
+        """Return the positions of STRINGS in TEXT, one by one."""
+        return [position for position, string in enumerate(strings)
+                if string and string in text]
+
+    def test_find_strings(self):
+        """stringmatcher - finding the strings present in a text"""
+        matcher = build_string_matcher(['he', 'she', 'his', 'hers'])
+        self.assertEqual([0, 1, 3], find_strings('ushers', matcher))
+        self.assertEqual([2], find_strings('this', matcher))
+        self.assertEqual([], find_strings('hi', matcher))
+
+    def test_overlapping_strings(self):
+        """stringmatcher - finding strings ending inside other strings"""
+        strings = [u'PHYS REV LETT', u'PHYS REV', u'REV', u'NUCL_PHYS', u'LETT B']
+        matcher = build_string_matcher(strings)
+        self.assertEqual([0, 1, 2, 4], find_strings(u'PHYS REV LETT B 4', matcher))
+        self.assertEqual([1, 2], find_strings(u'SEE PHYS REV D 12', matcher))
+        self.assertEqual([3], find_strings(u'NUCL_PHYS', matcher))
+
+    def test_empty_strings_never_found(self):
+        """stringmatcher - skipping the empty strings"""
+        matcher = build_string_matcher(['', 'ab', None, 'b'])
+        self.assertEqual([1, 3], find_strings('xaby', matcher))
+        self.assertEqual([], find_strings('', matcher))
+
+    def test_same_strings_as_naive_search(self):
+        """stringmatcher - same strings as searched one by one"""
+        strings = ['aa', 'aab', 'ab', 'ba', 'bab', 'abba', 'b', 'aaa']
+        matcher = build_string_matcher(strings)
+        for text in ('', 'a', 'aab', 'abab', 'baabba', 'aaaab', 'bbbbaa'):
+            self.assertEqual(self._find_strings_naively(text, strings),
+                             find_strings(text, matcher))
+
+TEST_SUITE = make_test_suite(TestStringMatcher,)
+
+if __name__ == "__main__":
+    run_test_suite(TEST_SUITE)
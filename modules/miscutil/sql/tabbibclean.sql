@@ -310,6 +310,7 @@ TRUNCATE idxPHRASE17R;
 TRUNCATE idxPHRASE18R;
 TRUNCATE rnkMETHODDATA;
 TRUNCATE rnkCITATIONDATA;
+TRUNCATE rnkCITATIONDATADELTA;
 TRUNCATE rnkDOWNLOADS;
 TRUNCATE rnkPAGEVIEWS;
 TRUNCATE rnkWORD01F;
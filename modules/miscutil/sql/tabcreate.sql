@@ -2664,6 +2664,21 @@ CREATE TABLE IF NOT EXISTS rnkCITATIONDATA (
   UNIQUE KEY object_name (object_name)
 ) ENGINE=MyISAM;
 
+-- a table for the per-record updates of the citation dictionaries
+-- stored since their last compaction into rnkCITATIONDATA.
+-- object_value is the new marshalled list of recids of id_bibrec, or
+-- NULL if id_bibrec was removed from the dictionary.
+
+CREATE TABLE IF NOT EXISTS rnkCITATIONDATADELTA (
+  id int(15) unsigned NOT NULL auto_increment,
+  object_name varchar(255) NOT NULL,
+  id_bibrec mediumint(8) unsigned NOT NULL,
+  object_value longblob,
+  last_updated datetime NOT NULL default '0000-00-00',
+  PRIMARY KEY id (id),
+  KEY object_name (object_name, id)
+) ENGINE=MyISAM;
+
 -- a table for missing citations. This should be scanned by a program
 -- occasionally to check if some publication has been cited more than
 -- 50 times (or such), and alert cataloguers to create record for that
@@ -338,6 +338,7 @@ DROP TABLE IF EXISTS rnkWORD01R;
 DROP TABLE IF EXISTS rnkPAGEVIEWS;
 DROP TABLE IF EXISTS rnkDOWNLOADS;
 DROP TABLE IF EXISTS rnkCITATIONDATA;
+DROP TABLE IF EXISTS rnkCITATIONDATADELTA;
 DROP TABLE IF EXISTS rnkCITATIONDATAEXT;
 DROP TABLE IF EXISTS rnkAUTHORDATA;
 DROP TABLE IF EXISTS collection_rnkMETHOD;
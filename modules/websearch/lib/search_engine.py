@@ -54,6 +54,8 @@ from invenio.config import \
      CFG_WEBSEARCH_FIELDS_CONVERT, \
      CFG_WEBSEARCH_NB_RECORDS_TO_SORT, \
      CFG_WEBSEARCH_SEARCH_CACHE_SIZE, \
+     CFG_WEBSEARCH_HITLIST_CACHE_SIZE, \
+     CFG_WEBSEARCH_QUERY_PLAN_CACHE_SIZE, \
      CFG_WEBSEARCH_USE_MATHJAX_FOR_FORMATS, \
      CFG_WEBSEARCH_USE_ALEPH_SYSNOS, \
      CFG_WEBSEARCH_DEF_RECORDS_IN_GROUPS, \
@@ -87,7 +89,8 @@ from invenio.bibformat import format_record, format_records, get_output_format_c
 from invenio.bibformat_config import CFG_BIBFORMAT_USE_OLD_BIBFORMAT
 from invenio.bibrank_downloads_grapher import create_download_history_graph_and_box
 from invenio.bibknowledge import get_kbr_values
-from invenio.data_cacher import DataCacher
+from invenio.data_cacher import DataCacher, LRUCache
+from invenio.bibsort_weights import load_sort_weights, open_sort_weights
 from invenio.websearch_external_collections import print_external_results_overview, perform_external_collection_search
 from invenio.access_control_admin import acc_get_action_id
 from invenio.access_control_config import VIEWRESTRCOLL, \
@@ -112,7 +115,7 @@ from invenio.bibrank_citation_grapher import create_citation_history_graph_and_b
 
 
 from invenio.dbquery import run_sql, run_sql_with_limit, \
-                            get_table_update_time, Error
+                            get_table_update_time, get_tables_update_time, Error
 from invenio.webuser import getUid, collect_user_info, session_param_set
 from invenio.webpage import pageheaderonly, pagefooteronly, create_error_box
 from invenio.messages import gettext_set_language
@@ -175,9 +178,10 @@ class RestrictedCollectionDataCacher(DataCacher):
             return ret
 
         def timestamp_verifier():
-            return max(get_table_update_time('accROLE_accACTION_accARGUMENT'), get_table_update_time('accARGUMENT'))
+            return get_tables_update_time(('accROLE_accACTION_accARGUMENT', 'accARGUMENT'))
 
-        DataCacher.__init__(self, cache_filler, timestamp_verifier)
+        DataCacher.__init__(self, cache_filler, timestamp_verifier,
+                            shared_cache_name='restricted_collections')
 
 def collection_restricted_p(collection, recreate_cache_if_needed=True):
     if recreate_cache_if_needed:
@@ -355,6 +359,132 @@ def get_index_stemming_language(index_id, recreate_cache_if_needed=True):
         index_stemming_cache.recreate_cache_if_needed()
     return index_stemming_cache.cache[index_id]
 
+class IndexHitlistCache(LRUCache):
+    """
+    Provides cache for hitlists of popular word and phrase index
+    terms.  The cache is keyed by (index table, washed term, match
+    type) and the hitlists of an index are forgotten as soon as the
+    index `last_updated' timestamp changes.  The timestamps of all the
+    indexes are verified together, at most once per verification
+    interval.  This class is not to be used directly; use functions
+    get_index_hitlist_from_cache() and store_index_hitlist_in_cache()
+    instead.
+    """
+    def __init__(self):
+        LRUCache.__init__(self, CFG_WEBSEARCH_HITLIST_CACHE_SIZE)
+        self.index_timestamps = {} # index_id -> last_updated value
+                                   # seen when its hitlists were cached
+
+    def verify_index_timestamps(self):
+        """Forget cached hitlists of the indexes that BibIndex has
+        updated meanwhile."""
+        if not self.verification_due_p():
+            return
+        try:
+            res = run_sql("SELECT id, last_updated FROM idxINDEX")
+        except DatabaseError:
+            # database problems, do not trust the cache
+            res = ()
+        index_timestamps = {}
+        for index_id, last_updated in res:
+            index_timestamps[index_id] = last_updated
+        index_ids = dict(self.index_timestamps)
+        index_ids.update(index_timestamps)
+        for index_id in index_ids.keys():
+            if self.index_timestamps.get(index_id) != index_timestamps.get(index_id):
+                tables = ("idxWORD%02dF" % index_id, "idxPHRASE%02dF" % index_id)
+                self.remove_if(lambda key: key[0] in tables)
+        self.index_timestamps = index_timestamps
+
+try:
+    index_hitlist_cache.hits
+except Exception:
+    index_hitlist_cache = IndexHitlistCache()
+
+def get_index_hitlist_from_cache(table, term, match_type):
+    """Return cached hitset of TERM searched in index TABLE according
+    to MATCH_TYPE, or None if it is not cached.  The returned hitset
+    is a copy, so callers may modify it."""
+    if not CFG_WEBSEARCH_HITLIST_CACHE_SIZE:
+        return None
+    index_hitlist_cache.verify_index_timestamps()
+    hitset = index_hitlist_cache.get((table, term, match_type))
+    if hitset is None:
+        return None
+    return intbitset(hitset)
+
+def store_index_hitlist_in_cache(table, term, match_type, hitset):
+    """Store a copy of HITSET as the result of TERM searched in index
+    TABLE according to MATCH_TYPE."""
+    if CFG_WEBSEARCH_HITLIST_CACHE_SIZE:
+        index_hitlist_cache.set((table, term, match_type), intbitset(hitset))
+
+class QueryPlanCache(LRUCache):
+    """
+    Provides cache for query plans, i.e. for the basic search units
+    that create_basic_search_units() breaks search patterns into,
+    together with the warnings printed meanwhile.  The plans are
+    forgotten as soon as the field or index definitions change, which
+    is verified at most once per verification interval.  This class is
+    not to be used directly; use function get_basic_search_units()
+    instead.
+    """
+    def __init__(self):
+        LRUCache.__init__(self, CFG_WEBSEARCH_QUERY_PLAN_CACHE_SIZE)
+        self.timestamp = None # update time of the field and index
+                              # definitions seen when plans were cached
+
+    def verify_timestamp(self):
+        """Forget cached plans if the field or index definitions have
+        been updated meanwhile."""
+        if not self.verification_due_p():
+            return
+        try:
+            timestamp = get_tables_update_time(('field', 'idxINDEX', 'idxINDEX_field'))
+        except DatabaseError:
+            # database problems, do not trust the cache
+            timestamp = None
+        if timestamp is None or timestamp != self.timestamp:
+            self.clear()
+            self.timestamp = timestamp
+
+try:
+    query_plan_cache.hits
+except Exception:
+    query_plan_cache = QueryPlanCache()
+
+class QueryPlanWarningRecorder:
+    """Stands for the request object while a query plan is created,
+    so that the warnings printed on it can be replayed later."""
+    def __init__(self):
+        self.warnings = []
+
+    def write(self, text):
+        """Remember printed TEXT."""
+        self.warnings.append(text)
+
+def get_basic_search_units(req, p, f, m=None, of='hb'):
+    """Return the basic search units of pattern P in field F with
+    matching type M, see create_basic_search_units(), using the query
+    plan cache if it is switched on.  The returned units are a fresh
+    copy that callers may modify.  Warnings are printed on req (when
+    not None) in case of HTML output formats."""
+    if not CFG_WEBSEARCH_QUERY_PLAN_CACHE_SIZE:
+        return create_basic_search_units(req, p, f, m, of)
+    query_plan_cache.verify_timestamp()
+    key = (p, f, m or '', of.startswith('h'))
+    plan = query_plan_cache.get(key)
+    if plan is None:
+        recorder = QueryPlanWarningRecorder()
+        units = create_basic_search_units(recorder, p, f, m, of)
+        plan = ([list(unit) for unit in units], recorder.warnings)
+        query_plan_cache.set(key, plan)
+    units, warnings = plan
+    if req:
+        for warning in warnings:
+            req.write(warning)
+    return [list(unit) for unit in units]
+
 class CollectionRecListDataCacher(DataCacher):
     """
     Provides cache for collection reclist hitsets.  This class is not
@@ -375,7 +505,8 @@ class CollectionRecListDataCacher(DataCacher):
         def timestamp_verifier():
             return get_table_update_time('collection')
 
-        DataCacher.__init__(self, cache_filler, timestamp_verifier)
+        DataCacher.__init__(self, cache_filler, timestamp_verifier,
+                            shared_cache_name='collection_reclist')
 
 try:
     if not collection_reclist_cache.is_ok_p:
@@ -426,26 +557,73 @@ def get_available_output_formats(visible_only=False):
                        })
     return formats
 
-class SearchResultsCache(DataCacher):
+class SearchResultsCache(LRUCache):
     """
-    Provides temporary lazy cache for Search Results.
-    Useful when users click on `next page'.
+    Provides cache for the results of complete simple searches, so
+    that popular queries and `next page' clicks are not searched
+    again.  The cache holds CFG_WEBSEARCH_SEARCH_CACHE_SIZE hitsets,
+    stored as intbitset dumps, forgetting the least recently used ones
+    first; it is emptied as soon as BibIndex or BibUpload modify the
+    data, which is verified at most once per verification interval.
+    This class is not to be used directly; use functions
+    get_search_results_from_cache() and store_search_results_in_cache()
+    instead.
     """
     def __init__(self):
-        def cache_filler():
-            return {}
-        def timestamp_verifier():
-            return '1970-01-01 00:00:00' # lazy cache is always okay;
-                                         # its filling is governed by
-                                         # CFG_WEBSEARCH_SEARCH_CACHE_SIZE
-        DataCacher.__init__(self, cache_filler, timestamp_verifier)
+        LRUCache.__init__(self, CFG_WEBSEARCH_SEARCH_CACHE_SIZE)
+        self.timestamp = None # update time of the indexes and records
+                              # seen when the results were cached
+
+    def verify_timestamp(self):
+        """Forget cached results if the indexes or the records have
+        been updated meanwhile."""
+        if not self.verification_due_p():
+            return
+        try:
+            timestamp = get_tables_update_time(('idxINDEX', 'bibrec'))
+        except DatabaseError:
+            # database problems, do not trust the cache
+            timestamp = None
+        if timestamp is None or timestamp != self.timestamp:
+            self.clear()
+            self.timestamp = timestamp
 
 try:
-    if not search_results_cache.is_ok_p:
-        raise Exception
+    search_results_cache.hits
 except Exception:
     search_results_cache = SearchResultsCache()
 
+def get_search_results_cache_key(req, p, f, ap, wl, cc, colls_to_search):
+    """Return the key of the search results cache for simple search
+    of pattern P in field F (with alternative patterns AP and wildcard
+    limit WL) in collections COLLS_TO_SEARCH of CC.  The key also
+    tells whether the user can see the records' hidden tags, since
+    the results depend on it."""
+    can_see_hidden = False
+    if req and CFG_BIBFORMAT_HIDDEN_TAGS:
+        user_info = collect_user_info(req)
+        can_see_hidden = (acc_authorize_action(user_info, 'runbibedit')[0] == 0)
+    colls = list(colls_to_search)
+    colls.sort()
+    return (p.strip(), f or '', ap, wl, cc, tuple(colls), can_see_hidden)
+
+def get_search_results_from_cache(key):
+    """Return cached hitset of the search KEY (see
+    get_search_results_cache_key()), or None if it is not cached.
+    The returned hitset is a fresh copy, so callers may modify it."""
+    if not CFG_WEBSEARCH_SEARCH_CACHE_SIZE:
+        return None
+    search_results_cache.verify_timestamp()
+    dump = search_results_cache.get(key)
+    if dump is None:
+        return None
+    return intbitset(dump)
+
+def store_search_results_in_cache(key, hitset):
+    """Store HITSET as the results of the search KEY."""
+    if CFG_WEBSEARCH_SEARCH_CACHE_SIZE:
+        search_results_cache.set(key, hitset.fastdump())
+
 class CollectionI18nNameDataCacher(DataCacher):
     """
     Provides cache for I18N collection names.  This class is not to be
@@ -1809,7 +1987,65 @@ def browse_in_bibwords(req, p, f, ln=CFG_SITE_LANG):
     ))
     return
 
-def search_pattern(req=None, p=None, f=None, m=None, ap=0, of="id", verbose=0, ln=CFG_SITE_LANG, display_nearest_terms_box=True, wl=0):
+def estimate_search_unit_cost(p, f, m, prefetched_hitsets=None):
+    """Estimate how expensive it is to search for basic search unit
+    defined by pattern 'p', field 'f' and matching type 'm', and how
+    many hits it gives.  Return tuple (cost class, number of hits)
+    suitable for sorting: cost class 0 means that the hitset is
+    already known (prefetched or cached) and the number of hits is
+    exact; otherwise the number of hits is unknown (0) and the cost
+    class grows from plain word look-ups (1) through phrase searches
+    (2) and wildcard, span or regexp searches (3) to citation and
+    full-text searches (4).  No query is run on the word tables."""
+    if prefetched_hitsets and prefetched_hitsets.has_key((p, f)):
+        return (0, len(prefetched_hitsets[(p, f)]))
+    if f in ('refersto', 'citedby', 'fulltext') or p.startswith("cited:"):
+        return (4, 0)
+    if f in ('datecreated', 'datemodified'):
+        return (2, 0)
+    if m == 'r':
+        return (3, 0)
+    if m == 'a':
+        if p.find('%') >= 0:
+            return (3, 0)
+        return (2, 0)
+    if CFG_WEBSEARCH_HITLIST_CACHE_SIZE:
+        # maybe the word hitlist was cached by a previous search:
+        query = get_query_for_search_unit_in_bibwords(p, f)
+        if query is not None:
+            dummy, bibwordsX, query_addons, query_params, use_query_limit = query
+            hitset = index_hitlist_cache.peek((bibwordsX, query_params, query_addons))
+            if hitset is not None:
+                return (0, len(hitset))
+    if p.find('*') >= 0 or p.find('->') >= 0:
+        return (3, 0)
+    return (1, 0)
+
+def plan_search_units(operations, costs):
+    """Return the order in which to evaluate basic search units whose
+    set operations are listed in OPERATIONS and whose estimated costs
+    (see estimate_search_unit_cost()) are listed in COSTS, as a list of
+    unit indexes.  Within each run of consecutive intersections ('+')
+    and exclusions ('-'), which can be applied in any order, the
+    intersections come first, cheapest first, followed by the
+    exclusions, cheapest first; so that once the running set is empty,
+    the remaining units of the run need not be searched at all.  Other
+    units (unions) keep their place."""
+    order = []
+    run = []
+    for idx_unit in range(0, len(operations)):
+        if operations[idx_unit] in ('+', '-'):
+            run.append((operations[idx_unit] == '-', costs[idx_unit], idx_unit))
+        else:
+            run.sort()
+            order.extend([item[2] for item in run])
+            run = []
+            order.append(idx_unit)
+    run.sort()
+    order.extend([item[2] for item in run])
+    return order
+
+def search_pattern(req=None, p=None, f=None, m=None, ap=0, of="id", verbose=0, ln=CFG_SITE_LANG, display_nearest_terms_box=True, wl=0, prefetched_hitsets=None):
     """Search for complex pattern 'p' within field 'f' according to
        matching type 'm'.  Return hitset of recIDs.
 
@@ -1832,6 +2068,16 @@ def search_pattern(req=None, p=None, f=None, m=None, ap=0, of="id", verbose=0, l
        The 'verbose' argument controls the level of debugging information
        to be printed (0=least, 9=most).
 
+       The 'prefetched_hitsets' argument may hold word hitsets that
+       were already fetched by the caller via
+       prefetch_search_units_in_bibwords().  If it is not set, then
+       all the exact-match word units of the pattern are fetched from
+       the database together before searching unit by unit.
+
+       The units joined by AND or NOT are searched in the order of
+       their estimated cost, see plan_search_units(), and they are
+       not searched at all once no hits are left.
+
        All the parameters are assumed to have been previously washed.
 
        This function is suitable as a mid-level API.
@@ -1849,7 +2095,7 @@ def search_pattern(req=None, p=None, f=None, m=None, ap=0, of="id", verbose=0, l
     # search stage 1: break up arguments into basic search units:
     if verbose and of.startswith("h"):
         t1 = os.times()[4]
-    basic_search_units = create_basic_search_units(req, p, f, m, of)
+    basic_search_units = get_basic_search_units(req, p, f, m, of)
     if verbose and of.startswith("h"):
         t2 = os.times()[4]
         print_warning(req, "Search stage 1: basic search units are: %s" % cgi.escape(repr(basic_search_units)))
@@ -1879,8 +2125,13 @@ def search_pattern(req=None, p=None, f=None, m=None, ap=0, of="id", verbose=0, l
                           {'x_range_from_year': '2008',
                            'x_range_to_year': '2012'})
 
-    for idx_unit in xrange(len(basic_search_units)):
-        bsu_o, bsu_p, bsu_f, bsu_m = basic_search_units[idx_unit]
+    if prefetched_hitsets is None:
+        prefetched_hitsets = prefetch_search_units_in_bibwords(basic_search_units)
+
+    # check the fields to be searched, so that the units can then be
+    # searched in any order:
+    searched_units = [] # (field, matching type, is hidden) to search each unit in
+    for bsu_o, bsu_p, bsu_f, bsu_m in basic_search_units:
         if bsu_f and len(bsu_f) < 2:
             if of.startswith("h"):
                 print_warning(req, _("There is no index %s.  Searching for %s in all fields." % (bsu_f, bsu_p)))
@@ -1888,29 +2139,64 @@ def search_pattern(req=None, p=None, f=None, m=None, ap=0, of="id", verbose=0, l
             bsu_m = 'w'
             if of.startswith("h") and verbose:
                 print_warning(req, _('Instead searching %s.' % str([bsu_o, bsu_p, bsu_f, bsu_m])))
-        try:
-            basic_search_unit_hitset = search_unit(bsu_p, bsu_f, bsu_m, wl)
-        except InvenioWebSearchWildcardLimitError, excp:
-            basic_search_unit_hitset = excp.res
-            if of.startswith("h"):
-                print_warning(req, _("Search term too generic, displaying only partial results..."))
-        # FIXME: print warning if we use native full-text indexing
-        if bsu_f == 'fulltext' and bsu_m != 'w' and of.startswith('h') and not CFG_SOLR_URL:
-            print_warning(req, _("No phrase index available for fulltext yet, looking for word combination..."))
         #check that the user is allowed to search with this tag
         #if he/she tries it
+        bsu_hidden = False
         if bsu_f and len(bsu_f) > 1 and bsu_f[0].isdigit() and bsu_f[1].isdigit():
             for htag in myhiddens:
                 ltag = len(htag)
                 samelenfield = bsu_f[0:ltag]
                 if samelenfield == htag: #user searches by a hidden tag
-                    #we won't show you anything..
-                    basic_search_unit_hitset = intbitset()
-                    if verbose >= 9 and of.startswith("h"):
-                        print_warning(req, "Pattern %s hitlist omitted since \
-                                            it queries in a hidden tag %s" %
-                                      (repr(bsu_p), repr(myhiddens)))
+                    bsu_hidden = True
                     display_nearest_terms_box=False #..and stop spying, too.
+        searched_units.append((bsu_f, bsu_m, bsu_hidden))
+
+    # plan the search: intersect with the most selective units first,
+    # so that the expensive ones need not be searched if nothing is
+    # left anyway:
+    basic_search_units_costs = []
+    for idx_unit in xrange(len(basic_search_units)):
+        bsu_f, bsu_m, bsu_hidden = searched_units[idx_unit]
+        if bsu_hidden:
+            basic_search_units_costs.append((0, 0))
+        else:
+            basic_search_units_costs.append(estimate_search_unit_cost(basic_search_units[idx_unit][1],
+                                                                      bsu_f, bsu_m, prefetched_hitsets))
+    search_order = plan_search_units([bsu[0] for bsu in basic_search_units],
+                                     basic_search_units_costs)
+    if verbose and of.startswith("h"):
+        print_warning(req, "Search stage 2: basic search units are searched in order %s." % search_order)
+
+    # let the initial set be the complete universe:
+    hitset_in_any_collection = intbitset(trailing_bits=1)
+    hitset_in_any_collection.discard(0)
+    basic_search_units_hitsets = [None] * len(basic_search_units) # None = not searched
+    for idx_unit in search_order:
+        bsu_o, bsu_p = basic_search_units[idx_unit][:2]
+        bsu_f, bsu_m, bsu_hidden = searched_units[idx_unit]
+        if not hitset_in_any_collection and bsu_o in ('+', '-'):
+            # the running set is empty, so intersecting with or
+            # excluding this unit cannot change it:
+            if verbose >= 9 and of.startswith("h"):
+                print_warning(req, "Search stage 2: pattern %s skipped since no hits are left" % cgi.escape(bsu_p))
+            continue
+        if bsu_hidden:
+            #we won't show you anything..
+            basic_search_unit_hitset = intbitset()
+            if verbose >= 9 and of.startswith("h"):
+                print_warning(req, "Pattern %s hitlist omitted since \
+                                    it queries in a hidden tag %s" %
+                              (repr(bsu_p), repr(myhiddens)))
+        else:
+            try:
+                basic_search_unit_hitset = search_unit(bsu_p, bsu_f, bsu_m, wl, prefetched_hitsets)
+            except InvenioWebSearchWildcardLimitError, excp:
+                basic_search_unit_hitset = excp.res
+                if of.startswith("h"):
+                    print_warning(req, _("Search term too generic, displaying only partial results..."))
+            # FIXME: print warning if we use native full-text indexing
+            if bsu_f == 'fulltext' and bsu_m != 'w' and of.startswith('h') and not CFG_SOLR_URL:
+                print_warning(req, _("No phrase index available for fulltext yet, looking for word combination..."))
         if verbose >= 9 and of.startswith("h"):
             print_warning(req, "Search stage 1: pattern %s gave hitlist %s" % (cgi.escape(bsu_p), basic_search_unit_hitset))
         if len(basic_search_unit_hitset) > 0 or \
@@ -1922,7 +2208,7 @@ def search_pattern(req=None, p=None, f=None, m=None, ap=0, of="id", verbose=0, l
             # pattern treatment is switched off, or the search unit
             # was joined by an OR operator to preceding/following
             # units so we do not require that it exists
-            basic_search_units_hitsets.append(basic_search_unit_hitset)
+            basic_search_units_hitsets[idx_unit] = basic_search_unit_hitset
         else:
             # stage 2-2: no hits found for this search unit, try to replace non-alphanumeric chars inside pattern:
             if re.search(r'[^a-zA-Z0-9\s\:]', bsu_p) and bsu_f != 'refersto' and bsu_f != 'citedby':
@@ -1940,7 +2226,7 @@ def search_pattern(req=None, p=None, f=None, m=None, ap=0, of="id", verbose=0, l
                                       {'x_query1': "<em>" + cgi.escape(bsu_p) + "</em>",
                                        'x_query2': "<em>" + cgi.escape(bsu_pn) + "</em>"})
                     basic_search_units[idx_unit][1] = bsu_pn
-                    basic_search_units_hitsets.append(basic_search_unit_hitset)
+                    basic_search_units_hitsets[idx_unit] = basic_search_unit_hitset
                 else:
                     # stage 2-3: no hits found either, propose nearest indexed terms:
                     if of.startswith('h') and display_nearest_terms_box:
@@ -1959,36 +2245,47 @@ def search_pattern(req=None, p=None, f=None, m=None, ap=0, of="id", verbose=0, l
                         else:
                             print_warning(req, create_nearest_terms_box(req.argd, bsu_p, bsu_f, bsu_m, ln=ln))
                 return hitset_empty
-    if verbose and of.startswith("h"):
-        t2 = os.times()[4]
-        for idx_unit in range(0, len(basic_search_units)):
-            print_warning(req, "Search stage 2: basic search unit %s gave %d hits." %
-                          (basic_search_units[idx_unit][1:], len(basic_search_units_hitsets[idx_unit])))
-        print_warning(req, "Search stage 2: execution took %.2f seconds." % (t2 - t1))
-    # search stage 3: apply boolean query for each search unit:
-    if verbose and of.startswith("h"):
-        t1 = os.times()[4]
-    # let the initial set be the complete universe:
-    hitset_in_any_collection = intbitset(trailing_bits=1)
-    hitset_in_any_collection.discard(0)
-    for idx_unit in xrange(len(basic_search_units)):
-        this_unit_operation = basic_search_units[idx_unit][0]
+        # apply boolean query for this search unit; the units of a
+        # run of intersections and exclusions can be applied in any
+        # order, unions are applied in the order of the pattern:
         this_unit_hitset = basic_search_units_hitsets[idx_unit]
-        if this_unit_operation == '+':
+        if bsu_o == '+':
             hitset_in_any_collection.intersection_update(this_unit_hitset)
-        elif this_unit_operation == '-':
+        elif bsu_o == '-':
             hitset_in_any_collection.difference_update(this_unit_hitset)
-        elif this_unit_operation == '|':
+        elif bsu_o == '|':
             hitset_in_any_collection.union_update(this_unit_hitset)
         else:
             if of.startswith("h"):
-                print_warning(req, "Invalid set operation %s." % cgi.escape(this_unit_operation), "Error")
+                print_warning(req, "Invalid set operation %s." % cgi.escape(bsu_o), "Error")
+    if verbose and of.startswith("h"):
+        t2 = os.times()[4]
+        for idx_unit in range(0, len(basic_search_units)):
+            if basic_search_units_hitsets[idx_unit] is None:
+                print_warning(req, "Search stage 2: basic search unit %s was not searched." %
+                              (basic_search_units[idx_unit][1:],))
+            else:
+                print_warning(req, "Search stage 2: basic search unit %s gave %d hits." %
+                              (basic_search_units[idx_unit][1:], len(basic_search_units_hitsets[idx_unit])))
+        print_warning(req, "Search stage 2: execution took %.2f seconds." % (t2 - t1))
+    # search stage 3: check the result of the boolean query:
+    if verbose and of.startswith("h"):
+        t1 = os.times()[4]
     if len(hitset_in_any_collection) == 0:
         # no hits found, propose alternative boolean query:
         if of.startswith('h') and display_nearest_terms_box:
             nearestterms = []
             for idx_unit in range(0, len(basic_search_units)):
                 bsu_o, bsu_p, bsu_f, bsu_m = basic_search_units[idx_unit]
+                if basic_search_units_hitsets[idx_unit] is None:
+                    # the unit was not needed for the boolean query,
+                    # so search for it now:
+                    bsu_f_searched, bsu_m_searched = searched_units[idx_unit][:2]
+                    try:
+                        basic_search_units_hitsets[idx_unit] = search_unit(bsu_p, bsu_f_searched, bsu_m_searched,
+                                                                           wl, prefetched_hitsets)
+                    except InvenioWebSearchWildcardLimitError, excp:
+                        basic_search_units_hitsets[idx_unit] = excp.res
                 if bsu_p.startswith("%") and bsu_p.endswith("%"):
                     bsu_p = "'" + bsu_p[1:-1] + "'"
                 bsu_nbhits = len(basic_search_units_hitsets[idx_unit])
@@ -2044,6 +2341,12 @@ def search_pattern_parenthesised(req=None, p=None, f=None, m=None, ap=0, of="id"
             print_warning(req, "Search stage 1: search_pattern_parenthesised() searched %s." % repr(p))
             print_warning(req, "Search stage 1: search_pattern_parenthesised() returned %s." % repr(parsing_result))
 
+        # fetch exact-match words of all the patterns together:
+        basic_search_units = []
+        for index in xrange(0, len(parsing_result)-1, 2 ):
+            basic_search_units.extend(get_basic_search_units(None, parsing_result[index+1], f, m, of="id"))
+        prefetched_hitsets = prefetch_search_units_in_bibwords(basic_search_units)
+
         # go through every pattern
         # calculate hitset for it
         # combine pattern's hitset with the result using the corresponding operator
@@ -2061,7 +2364,7 @@ def search_pattern_parenthesised(req=None, p=None, f=None, m=None, ap=0, of="id"
                 display_nearest_terms_box=False
 
             # obtain a hitset for the current pattern
-            current_hitset = search_pattern(req, current_pattern, f, m, ap, of, verbose, ln, display_nearest_terms_box=display_nearest_terms_box, wl=wl)
+            current_hitset = search_pattern(req, current_pattern, f, m, ap, of, verbose, ln, display_nearest_terms_box=display_nearest_terms_box, wl=wl, prefetched_hitsets=prefetched_hitsets)
 
             # combine the current hitset with resulting hitset using the current operator
             if current_operator == '+':
@@ -2088,7 +2391,7 @@ def search_pattern_parenthesised(req=None, p=None, f=None, m=None, ap=0, of="id"
         return search_pattern(req, p, f, m, ap, of, verbose, ln, display_nearest_terms_box=display_nearest_terms_box, wl=wl)
 
 
-def search_unit(p, f=None, m=None, wl=0):
+def search_unit(p, f=None, m=None, wl=0, prefetched_hitsets=None):
     """Search for basic search unit defined by pattern 'p' and field
        'f' and matching type 'm'.  Return hitset of recIDs.
 
@@ -2107,6 +2410,9 @@ def search_unit(p, f=None, m=None, wl=0):
        In case you want to call this function with no limit for the
        wildcard queries, wl should be 0.
 
+       The optional 'prefetched_hitsets' argument can hold word
+       hitsets fetched in advance by prefetch_search_units_in_bibwords().
+
        This function is suitable as a low-level API.
     """
 
@@ -2161,18 +2467,18 @@ def search_unit(p, f=None, m=None, wl=0):
         hitset = search_unit_by_times_cited(p[6:])
     else:
         # we are doing bibwords search by default
-        hitset = search_unit_in_bibwords(p, f, m, wl=wl)
+        hitset = search_unit_in_bibwords(p, f, m, wl=wl, prefetched_hitsets=prefetched_hitsets)
 
     ## merge synonym results and return total:
     hitset |= hitset_synonyms
     return hitset
 
-def search_unit_in_bibwords(word, f, m=None, decompress=zlib.decompress, wl=0):
-    """Searches for 'word' inside bibwordsX table for field 'f' and returns hitset of recIDs."""
-    set = intbitset() # will hold output result set
-    set_used = 0 # not-yet-used flag, to be able to circumvent set operations
-    limit_reached = 0 # flag for knowing if the query limit has been reached
-
+def get_query_for_search_unit_in_bibwords(word, f):
+    """Wash 'word' for being searched inside bibwordsX table for field
+    'f' and return tuple (index_id, bibwordsX, query_addons,
+    query_params, use_query_limit) describing the SQL query to run.
+    Return None in case nothing can be found (e.g. the word index 'f'
+    does not exist)."""
     # if no field is specified, search in the global index.
     f = f or 'anyfield'
     index_id = get_index_id_from_field(f)
@@ -2180,9 +2486,9 @@ def search_unit_in_bibwords(word, f, m=None, decompress=zlib.decompress, wl=0):
         bibwordsX = "idxWORD%02dF" % index_id
         stemming_language = get_index_stemming_language(index_id)
     else:
-        return intbitset() # word index f does not exist
+        return None # word index f does not exist
 
-    # wash 'word' argument and run query:
+    # wash 'word' argument:
     if f == 'authorcount' and word.endswith('+'):
         # field count query of the form N+ so transform N+ to N->99999:
         word = word[:-1] + '->99999'
@@ -2206,35 +2512,53 @@ def search_unit_in_bibwords(word, f, m=None, decompress=zlib.decompress, wl=0):
                 word1_washed = int(word1_washed)
             except ValueError:
                 pass
+        return (index_id, bibwordsX, "BETWEEN %s AND %s", (word0_washed, word1_washed), True)
+    if f == 'journal':
+        pass # FIXME: quick hack for the journal index
+    else:
+        word = re_word.sub('', word)
+    if stemming_language:
+        word = lower_index_term(word)
+        word = stem(word, stemming_language)
+    if string.find(word, '%') >= 0: # do we have wildcard in the word?
+        if f == 'journal':
+            # FIXME: quick hack for the journal index
+            # FIXME: we can run a sanity check here for all indexes
+            return None
+        return (index_id, bibwordsX, "LIKE %s", (wash_index_term(word),), True)
+    return (index_id, bibwordsX, "= %s", (wash_index_term(word),), False)
+
+def search_unit_in_bibwords(word, f, m=None, decompress=zlib.decompress, wl=0, prefetched_hitsets=None):
+    """Searches for 'word' inside bibwordsX table for field 'f' and returns hitset of recIDs.
+    If 'prefetched_hitsets' is given (see prefetch_search_units_in_bibwords()), then
+    the word is looked up there before querying the database."""
+    set = intbitset() # will hold output result set
+    set_used = 0 # not-yet-used flag, to be able to circumvent set operations
+    limit_reached = 0 # flag for knowing if the query limit has been reached
+
+    # maybe the word was fetched together with other words of the query:
+    if prefetched_hitsets and prefetched_hitsets.has_key((word, f)):
+        return intbitset(prefetched_hitsets[(word, f)])
+
+    query = get_query_for_search_unit_in_bibwords(word, f)
+    if query is None:
+        return set
+    dummy, bibwordsX, query_addons, query_params, use_query_limit = query
+    # maybe we have the hitlist in the cache already:
+    hitset_cached = get_index_hitlist_from_cache(bibwordsX, query_params, query_addons)
+    if hitset_cached is not None:
+        return hitset_cached
+    # no, so run the query:
+    if use_query_limit:
         try:
-            res = run_sql_with_limit("SELECT term,hitlist FROM %s WHERE term BETWEEN %%s AND %%s" % bibwordsX,
-                          (word0_washed, word1_washed), wildcard_limit = wl)
+            res = run_sql_with_limit("SELECT term,hitlist FROM %s WHERE term %s" % (bibwordsX, query_addons),
+                          query_params, wildcard_limit = wl)
         except InvenioDbQueryWildcardLimitError, excp:
             res = excp.res
             limit_reached = 1 # set the limit reached flag to true
     else:
-        if f == 'journal':
-            pass # FIXME: quick hack for the journal index
-        else:
-            word = re_word.sub('', word)
-        if stemming_language:
-            word = lower_index_term(word)
-            word = stem(word, stemming_language)
-        if string.find(word, '%') >= 0: # do we have wildcard in the word?
-            if f == 'journal':
-                # FIXME: quick hack for the journal index
-                # FIXME: we can run a sanity check here for all indexes
-                res = ()
-            else:
-                try:
-                    res = run_sql_with_limit("SELECT term,hitlist FROM %s WHERE term LIKE %%s" % bibwordsX,
-                                  (wash_index_term(word),), wildcard_limit = wl)
-                except InvenioDbQueryWildcardLimitError, excp:
-                    res = excp.res
-                    limit_reached = 1 # set the limit reached flag to true
-        else:
-            res = run_sql("SELECT term,hitlist FROM %s WHERE term=%%s" % bibwordsX,
-                          (wash_index_term(word),))
+        res = run_sql("SELECT term,hitlist FROM %s WHERE term %s" % (bibwordsX, query_addons),
+                      query_params)
     # fill the result set:
     for word, hitlist in res:
         hitset_bibwrd = intbitset(hitlist)
@@ -2248,9 +2572,75 @@ def search_unit_in_bibwords(word, f, m=None, decompress=zlib.decompress, wl=0):
     if limit_reached:
         #raise an exception, so we can print a nice message to the user
         raise InvenioWebSearchWildcardLimitError(set)
+    # remember complete results for popular terms:
+    store_index_hitlist_in_cache(bibwordsX, query_params, query_addons, set)
     # okay, return result set:
     return set
 
+def prefetch_search_units_in_bibwords(basic_search_units):
+    """Fetch hitsets of all exact-match word search units found in
+    BASIC_SEARCH_UNITS using one `term IN (...)' query per word index
+    table, instead of one query per search unit.  Return dictionary
+    {(pattern, field): hitset} to be passed to search_unit() as its
+    'prefetched_hitsets' argument.  Units that are not found in the
+    dictionary are simply searched for one by one later.
+    """
+    out = {}
+    units_by_table = {} # bibwordsX -> {washed_term: [(pattern, field), ...]}
+    for dummy, bsu_p, bsu_f, bsu_m in basic_search_units:
+        # consider only units that search_unit() will dispatch to
+        # search_unit_in_bibwords():
+        if bsu_m != 'w' or not bsu_p or bsu_p.startswith("cited:"):
+            continue
+        if bsu_f and len(bsu_f) < 2:
+            continue
+        if bsu_f in ('datecreated', 'datemodified', 'refersto', 'citedby'):
+            continue
+        if CFG_SOLR_URL and bsu_f == 'fulltext':
+            continue
+        query = get_query_for_search_unit_in_bibwords(bsu_p, bsu_f)
+        if query is None:
+            continue
+        dummy, bibwordsX, query_addons, query_params, use_query_limit = query
+        if use_query_limit or (bibwordsX, query_params, query_addons) in index_hitlist_cache:
+            continue
+        units_by_table.setdefault(bibwordsX, {}).setdefault(query_params[0], []).append((bsu_p, bsu_f))
+    for bibwordsX, units_by_term in units_by_table.items():
+        terms = units_by_term.keys()
+        if len(terms) < 2:
+            # nothing to win here
+            continue
+        res = run_sql("SELECT term,hitlist FROM %s WHERE term IN (%s)" % \
+                      (bibwordsX, ','.join(['%s'] * len(terms))), tuple(terms))
+        hitsets = {}
+        found_terms_are_exact = True
+        for term, hitlist in res:
+            if units_by_term.has_key(term):
+                hitsets[term] = intbitset(hitlist)
+            else:
+                # the table collation made the database return a
+                # differently spelled term, so we cannot tell which
+                # of our terms it stands for
+                found_terms_are_exact = False
+        if found_terms_are_exact:
+            # the table collation may also have made the database return
+            # one row for several of our terms (e.g. 'müller' and
+            # 'muller'), which then matched the one spelled alike only:
+            collation_keys = {}
+            for term in terms:
+                collation_keys[strip_accents(term).lower().rstrip()] = 1
+            found_terms_are_exact = len(collation_keys) == len(terms)
+        if found_terms_are_exact:
+            # the remaining terms are simply not indexed:
+            for term in terms:
+                if not hitsets.has_key(term):
+                    hitsets[term] = intbitset()
+        for term, hitset in hitsets.items():
+            store_index_hitlist_in_cache(bibwordsX, (term,), "= %s", hitset)
+            for unit in units_by_term[term]:
+                out[unit] = hitset
+    return out
+
 def search_unit_in_idxphrases(p, f, type, wl=0):
     """Searches for phrase 'p' inside idxPHRASE*F table for field 'f' and returns hitset of recIDs found.
     The search type is defined by 'type' (e.g. equals to 'r' for a regexp search)."""
@@ -2262,13 +2652,12 @@ def search_unit_in_idxphrases(p, f, type, wl=0):
     limit_reached = 0 # flag for knowing if the query limit has been reached
     use_query_limit = False # flag for knowing if to limit the query results or not
     # deduce in which idxPHRASE table we will search:
-    idxphraseX = "idxPHRASE%02dF" % get_index_id_from_field("anyfield")
+    index_id = get_index_id_from_field("anyfield")
     if f:
         index_id = get_index_id_from_field(f)
-        if index_id:
-            idxphraseX = "idxPHRASE%02dF" % index_id
-        else:
+        if not index_id:
             return intbitset() # phrase index f does not exist
+    idxphraseX = "idxPHRASE%02dF" % index_id
     # detect query type (exact phrase, partial phrase, regexp):
     if type == 'r':
         query_addons = "REGEXP %s"
@@ -2296,6 +2685,10 @@ def search_unit_in_idxphrases(p, f, type, wl=0):
         for query_param in query_params:
             query_params_washed += (wash_author_name(query_param),)
         query_params = query_params_washed
+    # maybe we have the hitlist in the cache already:
+    hitset_cached = get_index_hitlist_from_cache(idxphraseX, query_params, query_addons)
+    if hitset_cached is not None:
+        return hitset_cached
     # perform search:
     if use_query_limit:
         try:
@@ -2319,6 +2712,8 @@ def search_unit_in_idxphrases(p, f, type, wl=0):
     if limit_reached:
         #raise an exception, so we can print a nice message to the user
         raise InvenioWebSearchWildcardLimitError(set)
+    # remember complete results for popular phrases:
+    store_index_hitlist_in_cache(idxphraseX, query_params, query_addons, set)
     # okay, return result set:
     return set
 
@@ -3452,7 +3847,8 @@ def print_hosted_results(url_and_engine, ln=CFG_SITE_LANG, of=None, req=None, no
 class BibSortDataCacher(DataCacher):
     """
     Cache holding all structures created by bibsort
-    (   _data, data_dict).
+    (sort_weights, bucket_data).  The weights are memory-mapped from
+    the snapshot written by bibsort, see bibsort_weights.
     """
     def __init__(self, method_name):
         self.method_name = method_name
@@ -3472,18 +3868,28 @@ class BibSortDataCacher(DataCacher):
             if self.method_id == 0:
                 return {}
             try:
-                res_data = run_sql("""SELECT data_dict_ordered from bsrMETHODDATA \
+                res_data = run_sql("""SELECT last_updated from bsrMETHODDATA \
                                    where id_bsrMETHOD = %s""", (method_id,))
                 res_buckets = run_sql("""SELECT bucket_no, bucket_data from bsrMETHODDATABUCKET\
                                       where id_bsrMETHOD = %s""", (method_id,))
             except Exception:
                 # database problems, return empty cache
                 return {}
+
+            def data_dict_ordered_loader():
+                """Returns the recid: weight dictionary stored by bibsort"""
+                try:
+                    res = run_sql("""SELECT data_dict_ordered from bsrMETHODDATA \
+                                  where id_bsrMETHOD = %s""", (method_id,))
+                    return deserialize_via_marshal(res[0][0])
+                except:
+                    return {}
             try:
-                data_dict_ordered = deserialize_via_marshal(res_data[0][0])
-            except:
-                data_dict_ordered= {}
-            alldicts['data_dict_ordered'] = data_dict_ordered # recid: weight
+                last_updated = res_data[0][0]
+            except IndexError:
+                last_updated = '1970-01-01 00:00:00'
+            alldicts['sort_weights'] = load_sort_weights(method_id, last_updated,
+                                                         data_dict_ordered_loader) # recid: weight
 
             if not res_buckets:
                 alldicts['bucket_data'] = {}
@@ -3513,7 +3919,29 @@ class BibSortDataCacher(DataCacher):
                 update_time_buckets = '1970-01-01 00:00:00'
             return max(update_time_methoddata, update_time_buckets)
 
-        DataCacher.__init__(self, cache_filler, timestamp_verifier)
+        DataCacher.__init__(self, cache_filler, timestamp_verifier,
+                            shared_cache_name='bibsort_%s' % self.method_id)
+
+    def serialize_cache(self, cache):
+        """The weights are already shared through their memory-mapped
+        snapshot, so only its path is stored with the buckets."""
+        cache = cache.copy()
+        if cache.has_key('sort_weights'):
+            if cache['sort_weights'].path is None:
+                # the snapshot could not be written, do not share the cache
+                raise ValueError, "BibSort weights not stored in a file"
+            cache['sort_weights'] = cache['sort_weights'].path
+        return DataCacher.serialize_cache(self, cache)
+
+    def deserialize_cache(self, data):
+        """Memory-map the weights of the cache stored by serialize_cache()."""
+        cache = DataCacher.deserialize_cache(self, data)
+        if cache.has_key('sort_weights'):
+            cache['sort_weights'] = open_sort_weights(cache['sort_weights'])
+            if cache['sort_weights'] is None:
+                # the snapshot has been replaced in the meantime
+                return self.cache_filler()
+        return cache
 
 def get_sorting_methods():
     if not CFG_BIBSORT_BUCKETS: # we do not want to use buckets
@@ -3571,7 +3999,7 @@ def rank_records(req, rank_method_code, rank_limit_relevance, hitset_global, pat
                 if verbose > 0:
                     comment = 'find_citations retlist %s' %[[solution_recs[i], solution_scores[i]] for i in range(len(solution_recs))]
                 return (solution_recs, solution_scores, '(', ')', comment)
-    return rank_records_bibrank(rank_method_code, rank_limit_relevance, hitset_global, pattern, verbose)
+    return rank_records_bibrank(rank_method_code, rank_limit_relevance, hitset_global, pattern, verbose, rg, jrec)
 
 
 def sort_records(req, recIDs, sort_field='', sort_order='d', sort_pattern='', verbose=0, of='hb', ln=CFG_SITE_LANG, rg=None, jrec=None):
@@ -3643,7 +4071,7 @@ def sort_records_bibsort(req, recIDs, sort_method, sort_field='', sort_order='d'
     #sanity check
     if sort_method not in sorting_methods:
         if sort_or_rank == 'r':
-            return rank_records_bibrank(sort_method, 0, recIDs, None, verbose)
+            return rank_records_bibrank(sort_method, 0, recIDs, None, verbose, rg, jrec)
         else:
             return sort_records_bibxxx(req, recIDs, None, sort_field, sort_order, '', verbose, of, ln, rg, jrec)
 
@@ -3663,7 +4091,7 @@ def sort_records_bibsort(req, recIDs, sort_method, sort_field='', sort_order='d'
         if verbose > 3 and of.startswith('h'):
             print_warning(req, "Not all buckets have been constructed.. switching to old fashion sorting.")
         if sort_or_rank == 'r':
-            return rank_records_bibrank(sort_method, 0, recIDs, None, verbose)
+            return rank_records_bibrank(sort_method, 0, recIDs, None, verbose, rg, jrec)
         else:
             return sort_records_bibxxx(req, recIDs, None, sort_field, sort_order, '', verbose, of, ln, rg, jrec)
 
@@ -3673,37 +4101,37 @@ def sort_records_bibsort(req, recIDs, sort_method, sort_field='', sort_order='d'
         solution.union_update(input_recids & sort_cache['bucket_data'][bucket_no])
         if len(solution) >= irec_max:
             break
-    dict_solution = {}
-    missing_records = []
-    for recid in solution:
-        try:
-            dict_solution[recid] = sort_cache['data_dict_ordered'][recid]
-        except KeyError:
-            #recid is in buckets, but not in the bsrMETHODDATA,
-            #maybe because the value has been deleted, but the change has not yet been propagated to the buckets
-            missing_records.append(recid)
+    sort_weights = sort_cache['sort_weights']
+    solution_with_weights = solution & sort_weights.recids
+    #recids in buckets, but not in the bsrMETHODDATA,
+    #maybe because the value has been deleted, but the change has not yet been propagated to the buckets
+    missing_records = list(solution - solution_with_weights)
     #check if there are recids that are not in any bucket -> to be added at the end/top, ordered by insertion date
     if len(solution) < irec_max:
         #some records have not been yet inserted in the bibsort structures
         #or, some records have no value for the sort_method
-        missing_records = sorted(missing_records + list(input_recids.difference(solution)))
+        #(missing_records is a subset of solution, so the union is sorted and has no duplicates)
+        missing_records = list(intbitset(missing_records) | input_recids.difference(solution))
     #the records need to be sorted in reverse order for the print record function
     #the return statement should be equivalent with the following statements
     #(these are clearer, but less efficient, since they revert the same list twice)
     #sorted_solution = (missing_records + sorted(dict_solution, key=dict_solution.__getitem__, reverse=sort_order=='d'))[:irec_max]
     #sorted_solution.reverse()
     #return sorted_solution
+    #only the last irec_max records of the list are returned, so only them are sorted
     if sort_method.strip().lower().startswith('latest') and sort_order == 'd':
         # if we want to sort the records on their insertion date, add the mission records at the top
-        solution = sorted(dict_solution, key=dict_solution.__getitem__, reverse=sort_order=='a') + missing_records
+        nb_sorted = max(irec_max - len(missing_records), 0)
+        solution = sort_weights.get_last_sorted(solution_with_weights, nb_sorted, sort_order=='a') + missing_records
     else:
-        solution = missing_records + sorted(dict_solution, key=dict_solution.__getitem__, reverse=sort_order=='a')
+        solution = missing_records[max(len(missing_records) + len(solution_with_weights) - irec_max, 0):] + \
+                   sort_weights.get_last_sorted(solution_with_weights, irec_max, sort_order=='a')
     #calculate the min index on the reverted list
     index_min = max(len(solution) - irec_max, 0) #just to be sure that the min index is not negative
     #return all the records up to irec_max, but on the reverted list
     if sort_or_rank == 'r':
         # we need the recids, with values
-        return (solution[index_min:], [dict_solution.get(record, 0) for record in solution[index_min:]])
+        return (solution[index_min:], [sort_weights.get(record, 0) for record in solution[index_min:]])
     else:
         return solution[index_min:]
 
@@ -5084,7 +5512,7 @@ def perform_request_search(req=None, cc=CFG_SITE_NAME, c=None, p="", f="", rg=CF
     else:
         ## 3 - common search needed
         query_in_cache = False
-        query_representation_in_cache = repr((p,f,colls_to_search, wl))
+        query_representation_in_cache = None # only simple searches are cached
         page_start(req, of, cc, aas, ln, uid, p=create_page_title_search_pattern_info(p, p1, p2, p3))
 
         if of.startswith("h") and verbose and wash_colls_debug:
@@ -5196,10 +5624,12 @@ def perform_request_search(req=None, cc=CFG_SITE_NAME, c=None, p="", f="", rg=CF
                 return page_end(req, of, ln)
         else:
             ## 3B - simple search
-            if search_results_cache.cache.has_key(query_representation_in_cache):
-                # query is not in the cache already, so reuse it:
+            query_representation_in_cache = get_search_results_cache_key(req, p, f, ap, wl, cc, colls_to_search)
+            results_in_cache = get_search_results_from_cache(query_representation_in_cache)
+            if results_in_cache is not None:
+                # query is in the cache already, so reuse it:
                 query_in_cache = True
-                results_in_any_collection = search_results_cache.cache[query_representation_in_cache]
+                results_in_any_collection = results_in_cache
                 if verbose and of.startswith("h"):
                     print_warning(req, "Search stage 0: query found in cache, reusing cached results.")
             else:
@@ -5226,10 +5656,9 @@ def perform_request_search(req=None, cc=CFG_SITE_NAME, c=None, p="", f="", rg=CF
             return page_end(req, of, ln)
 
         # store this search query results into search results cache if needed:
-        if CFG_WEBSEARCH_SEARCH_CACHE_SIZE and not query_in_cache:
-            if len(search_results_cache.cache) > CFG_WEBSEARCH_SEARCH_CACHE_SIZE:
-                search_results_cache.clear()
-            search_results_cache.cache[query_representation_in_cache] = results_in_any_collection
+        if CFG_WEBSEARCH_SEARCH_CACHE_SIZE and query_representation_in_cache is not None \
+               and not query_in_cache:
+            store_search_results_in_cache(query_representation_in_cache, results_in_any_collection)
             if verbose and of.startswith("h"):
                 print_warning(req, "Search stage 3: storing query results in cache.")
 
@@ -5583,11 +6012,15 @@ def perform_request_cache(req, action="show"):
     # clear cache if requested:
     if action == "clear":
         search_results_cache.clear()
+        index_hitlist_cache.clear()
+        query_plan_cache.clear()
     req.write(out)
     # show collection reclist cache:
     out = "<h3>Collection reclist cache</h3>"
     out += "- collection table last updated: %s" % get_table_update_time('collection')
     out += "<br />- reclist cache timestamp: %s" % collection_reclist_cache.timestamp
+    out += "<br />- reclist cache verifications: %d, rebuilds: %d" % \
+           (collection_reclist_cache.nb_verifications, collection_reclist_cache.nb_rebuilds)
     out += "<br />- reclist cache contents:"
     out += "<blockquote>"
     for coll in collection_reclist_cache.cache.keys():
@@ -5597,20 +6030,45 @@ def perform_request_cache(req, action="show"):
     req.write(out)
     # show search results cache:
     out = "<h3>Search Cache</h3>"
-    out += "- search cache usage: %d queries cached (max. ~%d)" % \
-           (len(search_results_cache.cache), CFG_WEBSEARCH_SEARCH_CACHE_SIZE)
-    if len(search_results_cache.cache):
+    out += "- search cache usage: %d queries cached (max. %d)" % \
+           (len(search_results_cache), CFG_WEBSEARCH_SEARCH_CACHE_SIZE)
+    out += "<br />- search cache hits: %d, misses: %d" % \
+           (search_results_cache.hits, search_results_cache.misses)
+    out += "<br />- search cache verifications: %d" % \
+           search_results_cache.nb_verifications
+    if len(search_results_cache):
         out += "<br />- search cache contents:"
         out += "<blockquote>"
-        for query, hitset in search_results_cache.cache.items():
-            out += "<br />%s ... %s" % (query, hitset)
+        for query in search_results_cache.keys():
+            out += "<br />%s ... %d hits" % (cgi.escape(repr(query)),
+                                             len(intbitset(search_results_cache.peek(query))))
         out += """<p><a href="%s/search/cache?action=clear">clear search results cache</a>""" % CFG_SITE_URL
         out += "</blockquote>"
     req.write(out)
+    # show index hitlist cache:
+    out = "<h3>Index hitlist cache</h3>"
+    out += "- hitlist cache usage: %d hitlists cached (max. %d)" % \
+           (len(index_hitlist_cache), CFG_WEBSEARCH_HITLIST_CACHE_SIZE)
+    out += "<br />- hitlist cache hits: %d, misses: %d" % \
+           (index_hitlist_cache.hits, index_hitlist_cache.misses)
+    out += "<br />- hitlist cache verifications: %d" % \
+           index_hitlist_cache.nb_verifications
+    req.write(out)
+    # show query plan cache:
+    out = "<h3>Query plan cache</h3>"
+    out += "- plan cache usage: %d plans cached (max. %d)" % \
+           (len(query_plan_cache), CFG_WEBSEARCH_QUERY_PLAN_CACHE_SIZE)
+    out += "<br />- plan cache hits: %d, misses: %d" % \
+           (query_plan_cache.hits, query_plan_cache.misses)
+    out += "<br />- plan cache verifications: %d" % \
+           query_plan_cache.nb_verifications
+    req.write(out)
     # show field i18nname cache:
     out = "<h3>Field I18N names cache</h3>"
     out += "- fieldname table last updated: %s" % get_table_update_time('fieldname')
     out += "<br />- i18nname cache timestamp: %s" % field_i18nname_cache.timestamp
+    out += "<br />- i18nname cache verifications: %d, rebuilds: %d" % \
+           (field_i18nname_cache.nb_verifications, field_i18nname_cache.nb_rebuilds)
     out += "<br />- i18nname cache contents:"
     out += "<blockquote>"
     for field in field_i18nname_cache.cache.keys():
@@ -5622,6 +6080,8 @@ def perform_request_cache(req, action="show"):
     out = "<h3>Collection I18N names cache</h3>"
     out += "- collectionname table last updated: %s" % get_table_update_time('collectionname')
     out += "<br />- i18nname cache timestamp: %s" % collection_i18nname_cache.timestamp
+    out += "<br />- i18nname cache verifications: %d, rebuilds: %d" % \
+           (collection_i18nname_cache.nb_verifications, collection_i18nname_cache.nb_rebuilds)
     out += "<br />- i18nname cache contents:"
     out += "<blockquote>"
     for coll in collection_i18nname_cache.cache.keys():
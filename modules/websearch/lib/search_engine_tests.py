@@ -25,6 +25,7 @@ __revision__ = \
 import unittest
 
 from invenio import search_engine
+from invenio.intbitset import intbitset
 from invenio.testutils import make_test_suite, run_test_suite
 
 class TestMiscUtilityFunctions(unittest.TestCase):
@@ -258,9 +259,246 @@ class TestQueryParser(unittest.TestCase):
                     [['+', 'Ellis, J', 'author', 'a']])
 
 
+class TestIndexHitlistCache(unittest.TestCase):
+    """Test the verification of the index hitlist cache."""
+
+    def setUp(self):
+        # pylint: disable=C0103
+        """Replace the database by a list of index timestamps"""
+        self.run_sql = search_engine.run_sql
+        self.index_timestamps = [(1, '2012-01-01 00:00:00'),
+                                 (2, '2012-01-01 00:00:00')]
+        search_engine.run_sql = lambda *args, **kwargs: self.index_timestamps
+        self.cache = search_engine.IndexHitlistCache()
+        self.cache.maxsize = 10
+
+    def tearDown(self):
+        # pylint: disable=C0103
+        """Restore the database"""
+        search_engine.run_sql = self.run_sql
+
+    def test_updated_index_is_forgotten(self):
+        """search engine - forgetting the hitlists of an updated index"""
+        self.cache.verification_interval = 0
+        self.cache.verify_index_timestamps()
+        self.cache.set(('idxWORD01F', ('ellis',), '= %s'), intbitset([1]))
+        self.cache.set(('idxPHRASE02F', ('ellis',), '= %s'), intbitset([2]))
+        self.cache.verify_index_timestamps()
+        self.assertEqual(2, len(self.cache))
+        self.index_timestamps = [(1, '2012-01-01 00:00:00'),
+                                 (2, '2012-02-01 00:00:00')]
+        self.cache.verify_index_timestamps()
+        self.assertEqual([('idxWORD01F', ('ellis',), '= %s')], self.cache.keys())
+
+    def test_throttled_verification(self):
+        """search engine - verifying the index hitlists once per interval"""
+        self.cache.verification_interval = 3600
+        self.cache.verify_index_timestamps()
+        self.cache.set(('idxWORD01F', ('ellis',), '= %s'), intbitset([1]))
+        self.index_timestamps = [(1, '2012-02-01 00:00:00')]
+        self.cache.verify_index_timestamps()
+        self.assertEqual(1, len(self.cache))
+        self.cache.last_verification_time -= 3600
+        self.cache.verify_index_timestamps()
+        self.assertEqual(0, len(self.cache))
+
+
+class TestPrefetchSearchUnits(unittest.TestCase):
+    """Test fetching the hitsets of exact-match words together."""
+
+    def setUp(self):
+        # pylint: disable=C0103
+        """Replace the database by a word index table"""
+        self.saved = (search_engine.run_sql,
+                      search_engine.get_query_for_search_unit_in_bibwords,
+                      search_engine.store_index_hitlist_in_cache)
+        self.index = {}
+        self.cached = {}
+        search_engine.run_sql = self._run_sql
+        search_engine.get_query_for_search_unit_in_bibwords = \
+            lambda word, f: (None, 'idxWORD01F', '= %s', (word,), False)
+        search_engine.store_index_hitlist_in_cache = \
+            lambda table, term, match_type, hitset: self.cached.setdefault(term[0], hitset)
+
+    def tearDown(self):
+        # pylint: disable=C0103
+        """Restore the database"""
+        (search_engine.run_sql,
+         search_engine.get_query_for_search_unit_in_bibwords,
+         search_engine.store_index_hitlist_in_cache) = self.saved
+
+    def _run_sql(self, query, params):
+        """Fake run_sql, comparing the terms as the table collation does"""
+        res = []
+        for term, hitlist in self.index.items():
+            for param in params:
+                if search_engine.strip_accents(param).lower() == term:
+                    res.append((term, hitlist))
+                    break
+        return res
+
+    def _prefetch(self, words):
+        """Prefetch the hitsets of WORDS searched in titles"""
+        return search_engine.prefetch_search_units_in_bibwords(
+            [['+', word, 'title', 'w'] for word in words])
+
+    def test_missing_terms_are_not_indexed(self):
+        """search engine - prefetching words, missing from the index"""
+        self.index = {'muon': intbitset([1, 2]).fastdump()}
+        prefetched = self._prefetch(['muon', 'kaon'])
+        self.assertEqual({('muon', 'title'): intbitset([1, 2]),
+                          ('kaon', 'title'): intbitset()}, prefetched)
+        self.assertEqual(['kaon', 'muon'], sorted(self.cached.keys()))
+
+    def test_terms_spelled_alike(self):
+        """search engine - prefetching words spelled alike by the collation"""
+        self.index = {'muller': intbitset([1, 2]).fastdump()}
+        prefetched = self._prefetch(['m\xc3\xbcller', 'muller'])
+        self.assertEqual({('muller', 'title'): intbitset([1, 2])}, prefetched)
+        self.assertEqual(['muller'], self.cached.keys())
+
+
+class TestQueryPlanning(unittest.TestCase):
+    """Test the order in which basic search units are searched."""
+
+    def test_estimate_search_unit_cost(self):
+        """search engine - estimating the cost of basic search units"""
+        prefetched = {('muon', 'title'): intbitset([1, 2, 3])}
+        self.assertEqual((0, 3), search_engine.estimate_search_unit_cost('muon', 'title', 'w', prefetched))
+        self.assertEqual((4, 0), search_engine.estimate_search_unit_cost('cited:10->50', None, 'w'))
+        self.assertEqual((4, 0), search_engine.estimate_search_unit_cost('ellis', 'refersto', 'w'))
+        self.assertEqual((3, 0), search_engine.estimate_search_unit_cost('^mu', 'title', 'r'))
+        self.assertEqual((3, 0), search_engine.estimate_search_unit_cost('%dark matter%', 'title', 'a'))
+        self.assertEqual((2, 0), search_engine.estimate_search_unit_cost('dark matter', 'title', 'a'))
+
+    def test_plan_intersections_cheapest_first(self):
+        """search engine - planning intersections and exclusions"""
+        self.assertEqual([2, 3, 0, 1],
+                         search_engine.plan_search_units(['+', '-', '+', '+'],
+                                                         [(3, 0), (0, 1), (0, 5), (1, 0)]))
+
+    def test_plan_keeps_unions_in_place(self):
+        """search engine - planning does not move units across unions"""
+        self.assertEqual([1, 0, 2, 4, 3],
+                         search_engine.plan_search_units(['+', '+', '|', '-', '+'],
+                                                         [(1, 0), (0, 7), (0, 0), (0, 1), (4, 0)]))
+        self.assertEqual([0, 1, 2],
+                         search_engine.plan_search_units(['+', '|', '|'],
+                                                         [(4, 0), (0, 0), (0, 0)]))
+
+
+class TestQueryPlanCache(unittest.TestCase):
+    """Test the verification of the query plan cache."""
+
+    def setUp(self):
+        # pylint: disable=C0103
+        """Replace the database by a table update time"""
+        self.get_tables_update_time = search_engine.get_tables_update_time
+        self.update_time = '2012-01-01 00:00:00'
+        self.verifications = 0
+        def get_tables_update_time(tables):
+            """Return the test update time"""
+            self.verifications += 1
+            return self.update_time
+        search_engine.get_tables_update_time = get_tables_update_time
+        self.cache = search_engine.QueryPlanCache()
+        self.cache.maxsize = 10
+
+    def tearDown(self):
+        # pylint: disable=C0103
+        """Restore the database"""
+        search_engine.get_tables_update_time = self.get_tables_update_time
+
+    def test_throttled_verification(self):
+        """search engine - verifying the query plans once per interval"""
+        self.cache.verification_interval = 3600
+        self.cache.verify_timestamp()
+        self.cache.set(('ellis', '', '', True), ([['+', 'ellis', '', 'w']], []))
+        self.update_time = '2012-02-01 00:00:00'
+        self.cache.verify_timestamp()
+        self.assertEqual(1, len(self.cache))
+        self.assertEqual(1, self.verifications)
+        self.cache.last_verification_time -= 3600
+        self.cache.verify_timestamp()
+        self.assertEqual(0, len(self.cache))
+        self.assertEqual(2, self.verifications)
+
+
+class TestSearchResultsCacheKey(unittest.TestCase):
+    """Test the keys of the search results cache."""
+
+    def test_key_normalization(self):
+        """search engine - search results cache key normalization"""
+        self.assertEqual(search_engine.get_search_results_cache_key(None, ' ellis ', None, 0, 0, 'Atlantis Institute of Fictive Science', ['Preprints', 'Books']),
+                         search_engine.get_search_results_cache_key(None, 'ellis', '', 0, 0, 'Atlantis Institute of Fictive Science', ['Books', 'Preprints']))
+        self.assertNotEqual(search_engine.get_search_results_cache_key(None, 'ellis', '', 0, 0, 'Books', ['Books']),
+                            search_engine.get_search_results_cache_key(None, 'ellis', '', 1, 0, 'Books', ['Books']))
+
+
+class TestSearchResultsCache(unittest.TestCase):
+    """Test storing and verifying the search results cache."""
+
+    def setUp(self):
+        # pylint: disable=C0103
+        """Use a fresh cache and replace the database by a table update time"""
+        self.saved = (search_engine.get_tables_update_time,
+                      search_engine.search_results_cache,
+                      search_engine.CFG_WEBSEARCH_SEARCH_CACHE_SIZE)
+        self.update_time = '2012-01-01 00:00:00'
+        search_engine.get_tables_update_time = lambda tables: self.update_time
+        search_engine.CFG_WEBSEARCH_SEARCH_CACHE_SIZE = 10
+        search_engine.search_results_cache = search_engine.SearchResultsCache()
+        self.key = search_engine.get_search_results_cache_key(None, 'ellis', '', 0, 0, 'Books', ['Books'])
+
+    def tearDown(self):
+        # pylint: disable=C0103
+        """Restore the cache and the database"""
+        (search_engine.get_tables_update_time,
+         search_engine.search_results_cache,
+         search_engine.CFG_WEBSEARCH_SEARCH_CACHE_SIZE) = self.saved
+
+    def test_independent_copies(self):
+        """search engine - cached search results are independent copies"""
+        search_engine.get_search_results_from_cache(self.key)
+        hitset = intbitset([1, 2, 3])
+        search_engine.store_search_results_in_cache(self.key, hitset)
+        hitset.add(4)
+        cached_hitset = search_engine.get_search_results_from_cache(self.key)
+        self.assertEqual(intbitset([1, 2, 3]), cached_hitset)
+        cached_hitset.add(5)
+        self.assertEqual(intbitset([1, 2, 3]),
+                         search_engine.get_search_results_from_cache(self.key))
+
+    def test_cleared_when_tables_updated(self):
+        """search engine - search results forgotten after data updates"""
+        search_engine.search_results_cache.verification_interval = 0
+        search_engine.get_search_results_from_cache(self.key)
+        search_engine.store_search_results_in_cache(self.key, intbitset([1]))
+        self.assertEqual(intbitset([1]),
+                         search_engine.get_search_results_from_cache(self.key))
+        self.update_time = '2012-02-01 00:00:00'
+        self.assertEqual(None, search_engine.get_search_results_from_cache(self.key))
+
+    def test_throttled_verification(self):
+        """search engine - verifying the search results once per interval"""
+        search_engine.search_results_cache.verification_interval = 3600
+        search_engine.get_search_results_from_cache(self.key)
+        search_engine.store_search_results_in_cache(self.key, intbitset([1]))
+        self.update_time = '2012-02-01 00:00:00'
+        self.assertEqual(intbitset([1]),
+                         search_engine.get_search_results_from_cache(self.key))
+        search_engine.search_results_cache.last_verification_time -= 3600
+        self.assertEqual(None, search_engine.get_search_results_from_cache(self.key))
+
 TEST_SUITE = make_test_suite(TestWashQueryParameters,
                              TestQueryParser,
-                             TestMiscUtilityFunctions)
+                             TestMiscUtilityFunctions,
+                             TestIndexHitlistCache,
+                             TestPrefetchSearchUnits,
+                             TestQueryPlanning,
+                             TestQueryPlanCache,
+                             TestSearchResultsCacheKey,
+                             TestSearchResultsCache)
 
 
 if __name__ == "__main__":
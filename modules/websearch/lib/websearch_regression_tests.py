@@ -48,7 +48,8 @@ from invenio.search_engine import perform_request_search, \
     guess_primary_collection_of_a_record, guess_collection_of_a_record, \
     collection_restricted_p, get_permitted_restricted_collections, \
     search_pattern, search_unit, search_unit_in_bibrec, \
-    wash_colls, record_public_p
+    wash_colls, record_public_p, create_basic_search_units, \
+    prefetch_search_units_in_bibwords
 from invenio import search_engine_summarizer
 from invenio.search_engine_utils import get_fieldvalues
 
@@ -2070,6 +2071,23 @@ class WebSearchAuthorCountQueryTest(unittest.TestCase):
                          test_web_page_content(CFG_SITE_URL + '/search?p=50%2B&f=authorcount&of=id',
                                                expected_text="[10, 17]"))
 
+class WebSearchPrefetchedWordsTest(unittest.TestCase):
+    """Test of fetching several words of a query together."""
+
+    def test_prefetched_words_give_same_hitsets(self):
+        """websearch - prefetched word hitsets are identical to searched ones"""
+        units = create_basic_search_units(None, 'ellis muon title:higgs nonexistingword', None, of='id')
+        prefetched = prefetch_search_units_in_bibwords(units)
+        self.failUnless(prefetched)
+        for dummy, bsu_p, bsu_f, bsu_m in units:
+            self.assertEqual(search_unit(bsu_p, bsu_f, bsu_m),
+                             search_unit(bsu_p, bsu_f, bsu_m, prefetched_hitsets=prefetched))
+
+    def test_search_pattern_with_prefetched_words(self):
+        """websearch - search pattern with several words"""
+        self.assertEqual(search_pattern(p='ellis muon'),
+                         search_pattern(p='ellis') & search_pattern(p='muon'))
+
 TEST_SUITE = make_test_suite(WebSearchWebPagesAvailabilityTest,
                              WebSearchTestSearch,
                              WebSearchTestBrowse,
@@ -2109,7 +2127,8 @@ TEST_SUITE = make_test_suite(WebSearchWebPagesAvailabilityTest,
                              WebSearchTestWildcardLimit,
                              WebSearchSynonymQueryTest,
                              WebSearchWashCollectionsTest,
-                             WebSearchAuthorCountQueryTest)
+                             WebSearchAuthorCountQueryTest,
+                             WebSearchPrefetchedWordsTest)
 
 if __name__ == "__main__":
     run_test_suite(TEST_SUITE, warn_user=True)
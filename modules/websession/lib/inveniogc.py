@@ -71,6 +71,8 @@ CFG_MAX_ATIME_WEBSUBMIT_TMP_VIDEO = 3
 CFG_MAX_ATIME_RM_REFEXTRACT = 28
 # After how many days to remove obsolete bibdocfiles temporary files
 CFG_MAX_ATIME_RM_BIBDOC = 4
+# After how many days to remove the cached fulltexts that were not used
+CFG_FULLTEXT_CACHE_MAXLIFE = 30
 
 def gc_exec_command(command):
     """ Exec the command logging in appropriate way its output."""
@@ -197,6 +199,20 @@ def clean_cache():
     write_message("""%s webjournal cache file pruned out of %s.""" % (count, len(filenames)))
     write_message("""CLEANING OF OLD CACHED WEBJOURNAL FILES FINISHED""")
 
+    write_message("""CLEANING OF EXPIRED OAI RESUMPTION TOKENS STARTED""")
+    from invenio.oai_repository_server import oai_cache_gc
+    try:
+        oai_cache_gc()
+    except OSError, e:
+        write_message("Error: %s" % e)
+    write_message("""CLEANING OF EXPIRED OAI RESUMPTION TOKENS FINISHED""")
+
+    write_message("""CLEANING OF UNUSED CACHED FULLTEXTS STARTED""")
+    from invenio.bibdocfile_text_cache import text_cache_gc
+    count = text_cache_gc(CFG_FULLTEXT_CACHE_MAXLIFE)
+    write_message("""%s cached fulltext file pruned.""" % count)
+    write_message("""CLEANING OF UNUSED CACHED FULLTEXTS FINISHED""")
+
 
 def clean_bibxxx():
     """
@@ -118,6 +118,7 @@ from invenio.config import CFG_SITE_LANG, CFG_SITE_URL, \
 
 from invenio.websubmit_config import CFG_WEBSUBMIT_ICON_SUBFORMAT_RE, \
     CFG_WEBSUBMIT_DEFAULT_ICON_SUBFORMAT
+from invenio.bibdocfile_text_cache import get_pdf_text
 import invenio.template
 websubmit_templates = invenio.template.load('websubmit')
 websearch_templates = invenio.template.load('websearch')
@@ -1616,8 +1617,20 @@ class BibDoc:
             except InvenioWebSubmitFileConverterError:
                 open(os.path.join(self.basedir, '.text;%i' % version), 'w').write('')
                 return
+        text_path = os.path.join(self.basedir, '.text;%i' % version)
+        pdf_docfiles = [docfile for docfile in docfiles if docfile.get_full_path() == filename and docfile.get_superformat().lower() == '.pdf']
         try:
-            convert_file(filename, os.path.join(self.basedir, '.text;%i' % version), '.txt', perform_ocr=perform_ocr, ln=ln)
+            if perform_ocr or not pdf_docfiles:
+                convert_file(filename, text_path, '.txt', perform_ocr=perform_ocr, ln=ln)
+            else:
+                ## The text of PDFs is the canonical one, shared with
+                ## BibClassify and refextract through the text cache,
+                ## so that the same PDF is converted only once; the page
+                ## breaks are dropped, as by the converter:
+                text = get_pdf_text(filename, pdf_docfiles[0].get_checksum())
+                if text is None:
+                    raise InvenioWebSubmitFileConverterError, "pdftotext failed on %s" % filename
+                open(text_path, 'w').write(text.replace('\f', ''))
             if version == self.get_latest_version():
                 run_sql("UPDATE bibdoc SET text_extraction_date=NOW() WHERE id=%s", (self.id, ))
         except InvenioWebSubmitFileConverterError, e:
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+##
+## This file is part of Invenio.
+## Copyright (C) 2012 CERN.
+##
+## Invenio is free software; you can redistribute it and/or
+## modify it under the terms of the GNU General Public License as
+## published by the Free Software Foundation; either version 2 of the
+## License, or (at your option) any later version.
+##
+## Invenio is distributed in the hope that it will be useful, but
+## WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+## General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with Invenio; if not, write to the Free Software Foundation, Inc.,
+## 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+
+"""
+Cache of the text extracted from PDF files.
+
+All the tools reading the text of PDF files, i.e. BibDoc.extract_text()
+(used by BibIndex), BibClassify and refextract, agree on one canonical
+extraction: the output of pdftotext in its default mode, in UTF-8, with
+the page breaks.  Refextract also needs the text in raw mode (option
+-raw) to find the references; it is cached too, next to the canonical
+one.  The texts are stored in CFG_CACHEDIR/fulltext under the MD5
+checksum of the file, so that a PDF is converted only once in each mode,
+whichever tool asks first.
+As the entries are addressed by the content of the files, they never
+get out of date: a new version of a document has a new checksum.  The
+entries that were not used for a while are removed by inveniogc; the
+cache directory may also be emptied at any time.
+"""
+
+__revision__ = "$Id$"
+
+import os
+import sys
+import time
+if sys.hexversion < 0x2060000:
+    from md5 import md5
+else:
+    from hashlib import md5
+
+from invenio.config import CFG_CACHEDIR, CFG_BIBDOCFILE_TEXT_CACHE, \
+     CFG_PATH_PDFTOTEXT
+from invenio.shellutils import run_shell_command
+from invenio.snapshotutils import write_file_atomically
+
+CFG_BIBDOCFILE_TEXT_CACHE_DIR = os.path.join(CFG_CACHEDIR, 'fulltext')
+
+_BUFFER_SIZE = 1024 * 64
+
+def calculate_checksum(path):
+    """Return the MD5 checksum of the content of the file PATH, as
+    stored by BibDocFile for the files of a document."""
+    checksum = md5()
+    fd = open(path, 'rb')
+    try:
+        while True:
+            buf = fd.read(_BUFFER_SIZE)
+            if not buf:
+                break
+            checksum.update(buf)
+    finally:
+        fd.close()
+    return checksum.hexdigest()
+
+def get_text_cache_path(checksum, raw=False):
+    """Return the path of the text extracted from the PDF files having
+    the MD5 CHECKSUM, in raw mode if RAW is True."""
+    if raw:
+        filename = '%s.raw.txt' % checksum
+    else:
+        filename = '%s.txt' % checksum
+    return os.path.join(CFG_BIBDOCFILE_TEXT_CACHE_DIR, checksum[:2],
+                        filename)
+
+def load_cached_text(path):
+    """Return the text stored in the cache file PATH, or None if it is
+    not cached.  The modification time of the file is refreshed, so
+    that the garbage collector keeps the texts in use."""
+    try:
+        fd = open(path, 'rb')
+    except IOError:
+        return None
+    try:
+        text = fd.read()
+    finally:
+        fd.close()
+    try:
+        os.utime(path, None)
+    except OSError:
+        pass
+    return text
+
+def store_cached_text(path, text):
+    """Atomically write TEXT to the cache file PATH."""
+    write_file_atomically(path, text)
+
+def extract_pdf_text(path, raw=False):
+    """Return the canonical text of the PDF file PATH, i.e. the output
+    of pdftotext in UTF-8, in raw mode if RAW is True, or None if
+    pdftotext failed."""
+    if raw:
+        command = "%s -raw -q -enc UTF-8 -eol unix %s -"
+    else:
+        command = "%s -q -enc UTF-8 -eol unix %s -"
+    exit_code, text, dummy = run_shell_command(
+        command, (CFG_PATH_PDFTOTEXT, path))
+    if exit_code != 0:
+        return None
+    return text
+
+def get_pdf_text(path, checksum=None, raw=False):
+    """
+    Return the canonical text of the PDF file PATH (see
+    extract_pdf_text()), or its text in raw mode if RAW is True, as a
+    UTF-8 string, or None if it cannot be extracted.  If it is not
+    cached yet, it is extracted and stored in the cache.  CHECKSUM is the MD5 checksum of the file, when already
+    known (e.g. from BibDocFile.get_checksum()); otherwise it is
+    computed.  Without CFG_BIBDOCFILE_TEXT_CACHE, or if the cache
+    cannot be used, the text is simply extracted.
+    """
+    if not CFG_BIBDOCFILE_TEXT_CACHE:
+        return extract_pdf_text(path, raw)
+    if checksum is None:
+        try:
+            checksum = calculate_checksum(path)
+        except IOError:
+            return extract_pdf_text(path, raw)
+    cache_path = get_text_cache_path(checksum, raw)
+    text = load_cached_text(cache_path)
+    if text is None:
+        text = extract_pdf_text(path, raw)
+        if text is not None:
+            try:
+                store_cached_text(cache_path, text)
+            except EnvironmentError:
+                pass
+    return text
+
+def text_cache_gc(maxlife):
+    """Remove the texts of the cache that were not used during the
+    last MAXLIFE days, e.g. those of deleted documents, and return
+    the number of removed files."""
+    count = 0
+    try:
+        dirnames = os.listdir(CFG_BIBDOCFILE_TEXT_CACHE_DIR)
+    except OSError:
+        return count
+    oldest = time.time() - maxlife * 24 * 3600
+    for dirname in dirnames:
+        dirname = os.path.join(CFG_BIBDOCFILE_TEXT_CACHE_DIR, dirname)
+        try:
+            filenames = os.listdir(dirname)
+        except OSError:
+            continue
+        for filename in filenames:
+            filename = os.path.join(dirname, filename)
+            try:
+                if os.path.getmtime(filename) < oldest:
+                    os.remove(filename)
+                    count += 1
+            except OSError:
+                # Most probably the text was already removed
+                pass
+    return count
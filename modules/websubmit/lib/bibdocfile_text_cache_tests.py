@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+##
+## This file is part of Invenio.
+## Copyright (C) 2012 CERN.
+##
+## Invenio is free software; you can redistribute it and/or
+## modify it under the terms of the GNU General Public License as
+## published by the Free Software Foundation; either version 2 of the
+## License, or (at your option) any later version.
+##
+## Invenio is distributed in the hope that it will be useful, but
+## WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+## General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with Invenio; if not, write to the Free Software Foundation, Inc.,
+## 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+
+"""Unit tests for the cache of the extracted fulltext."""
+
+__revision__ = "$Id$"
+
+import os
+import time
+import shutil
+import tempfile
+import unittest
+
+from invenio.testutils import make_test_suite, run_test_suite
+from invenio import bibdocfile_text_cache
+from invenio.bibdocfile_text_cache import get_pdf_text, \
+     get_text_cache_path, calculate_checksum, text_cache_gc
+
+class TestTextCache(unittest.TestCase):
+    """Test storing and retrieving the extracted fulltext."""
+
+    def setUp(self):
+        # pylint: disable=C0103
+        """Initialize stuff"""
+        self.directory = tempfile.mkdtemp()
+        self.saved = (bibdocfile_text_cache.CFG_BIBDOCFILE_TEXT_CACHE_DIR,
+                      bibdocfile_text_cache.extract_pdf_text)
+        bibdocfile_text_cache.CFG_BIBDOCFILE_TEXT_CACHE_DIR = \
+            os.path.join(self.directory, 'fulltext')
+        bibdocfile_text_cache.extract_pdf_text = self._extract_text
+        self.extracted = []
+
+    def tearDown(self):
+        # pylint: disable=C0103
+        """Remove temporary files"""
+        (bibdocfile_text_cache.CFG_BIBDOCFILE_TEXT_CACHE_DIR,
+         bibdocfile_text_cache.extract_pdf_text) = self.saved
+        shutil.rmtree(self.directory)
+
+    def _write_file(self, name, content):
+        """Write CONTENT to the file NAME of the temporary directory."""
+        path = os.path.join(self.directory, name)
+        open(path, 'wb').write(content)
+        return path
+
+    def _extract_text(self, path, raw=False):
+        """Fake text extraction, recording the extracted files."""
+        self.extracted.append(path)
+        content = open(path, 'rb').read()
+        if content == 'broken':
+            return None
+        if raw:
+            return 'raw text of %s' % content
+        return 'text of %s' % content
+
+    def test_extracted_once(self):
+        """bibdocfile text cache - extracting a file only once"""
+        path = self._write_file('a.pdf', 'foo')
+        self.assertEqual('text of foo', get_pdf_text(path))
+        self.assertEqual('text of foo', get_pdf_text(path))
+        self.assertEqual([path], self.extracted)
+
+    def test_shared_by_identical_files(self):
+        """bibdocfile text cache - sharing the text of identical files"""
+        path1 = self._write_file('a.pdf', 'foo')
+        path2 = self._write_file('b.pdf', 'foo')
+        get_pdf_text(path1)
+        self.assertEqual('text of foo', get_pdf_text(path2))
+        self.assertEqual([path1], self.extracted)
+
+    def test_new_content(self):
+        """bibdocfile text cache - extracting again a modified file"""
+        path = self._write_file('a.pdf', 'foo')
+        get_pdf_text(path)
+        self._write_file('a.pdf', 'bar')
+        self.assertEqual('text of bar', get_pdf_text(path))
+        self.assertEqual([path, path], self.extracted)
+
+    def test_given_checksum(self):
+        """bibdocfile text cache - using the checksum of BibDocFile"""
+        path = self._write_file('a.pdf;1', 'foo')
+        checksum = calculate_checksum(path)
+        get_pdf_text(path, checksum)
+        self.assert_(os.path.exists(get_text_cache_path(checksum)))
+        self.assertEqual('text of foo', get_pdf_text(path))
+        self.assertEqual([path], self.extracted)
+
+    def test_raw_text(self):
+        """bibdocfile text cache - caching the raw text next to the canonical one"""
+        path = self._write_file('a.pdf', 'foo')
+        self.assertEqual('text of foo', get_pdf_text(path))
+        self.assertEqual('raw text of foo', get_pdf_text(path, raw=True))
+        self.assertEqual('raw text of foo', get_pdf_text(path, raw=True))
+        self.assertEqual('text of foo', get_pdf_text(path))
+        self.assertEqual([path, path], self.extracted)
+
+    def test_failed_extraction(self):
+        """bibdocfile text cache - not caching failed extractions"""
+        path = self._write_file('a.pdf', 'broken')
+        self.assertEqual(None, get_pdf_text(path))
+        self.assertEqual(None, get_pdf_text(path))
+        self.assertEqual([path, path], self.extracted)
+
+    def test_missing_file(self):
+        """bibdocfile text cache - extracting a file that cannot be read"""
+        path = os.path.join(self.directory, 'missing.pdf')
+        bibdocfile_text_cache.extract_pdf_text = lambda path, raw=False: None
+        self.assertEqual(None, get_pdf_text(path))
+
+    def test_garbage_collection(self):
+        """bibdocfile text cache - removing the texts not used for a while"""
+        path1 = self._write_file('a.pdf', 'foo')
+        path2 = self._write_file('b.pdf', 'bar')
+        get_pdf_text(path1)
+        get_pdf_text(path2)
+        old = time.time() - 10 * 24 * 3600
+        for path in (path1, path2):
+            os.utime(get_text_cache_path(calculate_checksum(path)), (old, old))
+        # reading a text marks it as used:
+        get_pdf_text(path2)
+        self.assertEqual(1, text_cache_gc(7))
+        self.failIf(os.path.exists(get_text_cache_path(calculate_checksum(path1))))
+        self.assertEqual('text of bar', get_pdf_text(path2))
+        self.assertEqual([path1, path2], self.extracted)
+
+    def test_garbage_collection_without_cache(self):
+        """bibdocfile text cache - collecting garbage in a missing cache"""
+        self.assertEqual(0, text_cache_gc(7))
+
+TEST_SUITE = make_test_suite(TestTextCache,)
+
+if __name__ == "__main__":
+    run_test_suite(TEST_SUITE)